@@ -1,20 +1,54 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash
 import sqlite3
-import hashlib
 import re
+import cart
+import catalog_cache
+import compression
+import credentials
+import db
+import exporter
+import identity
+import market_analysis
+import migrations
+import profiling
+import order_history
+import purchasing
+import ratings
+import request_queue
+import routing
+import search
+import seller_analytics
+import taxonomy
+import templating
 
 # Initialize Flask application
 app = Flask(__name__)
 app.secret_key = 'nittany_business_secret_key'  
 app.config['DATABASE'] = 'database.db'
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  #<- around 30 minutes
+app.config['DB_POOL_SIZE'] = 8  #<- roughly one per worker thread
+app.config['SEARCH_PAGE_SIZE'] = 24
+app.config['SEARCH_MAX_PAGE_SIZE'] = 96
+app.config['SEARCH_COUNT_CAP'] = 1000  #<- counts above this are shown as "1000+"
+app.config['ORDER_PAGE_SIZE'] = 20
+app.config['PRODUCT_PAGE_SIZE'] = 50  #<- seller dashboard listings per page
+app.config['REQUEST_PAGE_SIZE'] = 25
+app.config['REQUEST_ROUTING'] = True  #<- assign new helpdesk requests automatically
+app.config['REQUEST_ROUTING_MAX_OPEN'] = routing.MAX_OPEN
+db.init_app(app)
+compression.init_app(app)  #<- COMPRESS / COMPRESS_MIN_SIZE / COMPRESS_LEVEL; first, so its hook runs last
+credentials.init_app(app)  #<- PASSWORD_HASH_METHOD / PASSWORD_HASH_WORKERS
+identity.init_app(app)  #<- IDENTITY_CACHE_SIZE / IDENTITY_CACHE_TTL
+profiling.init_app(app)  #<- PROFILING / PROFILE_SLOW_QUERY_MS / PROFILE_CPROFILE
+catalog_cache.init_app(app)  #<- CATALOG_CACHE / CATALOG_VERSION_TTL / CATALOG_FRAGMENT_CACHE_SIZE
+db.on_connect(app, migrations.migrate)  #<- brings the schema up to date once per process
+templating.init_app(app)  #<- ASSET_MAX_AGE / TEMPLATE_PRECOMPILE / TEMPLATE_BYTECODE_CACHE_DIR
 
 #=======================Helper=======================#
 def get_db_connection():
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    # connections come from a per-process pool and stay bound to the request;
+    # conn.close() just discards uncommitted work, teardown hands it back
+    return db.get_connection(app)
 #=======================Helper=======================#
 
 #=======================LandingPage=======================#
@@ -29,99 +63,88 @@ def login():
         email = request.form['email']
         password = request.form['password']
         remember = 'remember' in request.form
-        print(f"Login attempt for email: {email}") 
+        app.logger.debug('Login attempt for %s', email)
         # validate user credentials
+        # account, role flags and profile in one query; the cache is bypassed
+        # here because the password hash is never cached
         conn = get_db_connection()
-        user = conn.execute(
-            'SELECT * FROM Users WHERE email = ?', (email,)).fetchone()
-        if user:
-            print(f"User found in database: {user['email']}")
-            # show first part of hash
-            print(f"Password hash in DB: {user['password'][:20]}...")
-        else:
-            print(f"No user found with email: {email}")
+        user = identity.lookup(conn, email)
         conn.close()
         if user is None:
             error = "Invalid email address."
-            print(f"Login failed: {error}")  
+            app.logger.info('Login failed for %s: unknown email', email)
             return render_template('login.html', error=error)
-        # calculate SHA-256 hash of the provided password for comparison
-        provided_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-        stored_hash = user['password']
-        print(f"Comparing hashes:")
-        print(f"Stored:   {stored_hash[:20]}...")
-        print(f"Provided: {provided_hash[:20]}...")
-        # verify the password using direct comparison of SHA-256 hashes
-        if provided_hash != stored_hash:
+        # salted KDF hashes verify on the bounded hashing pool; legacy SHA-256
+        # hashes still verify, and are upgraded below
+        try:
+            valid, needs_rehash = credentials.verify_password(app, user['password'], password)
+        except credentials.HasherBusy:
+            app.logger.warning('Login for %s timed out waiting for the hashing pool', email)
+            return render_template('login.html', error=credentials.BUSY_MESSAGE)
+        if not valid:
             error = "Invalid password."
-            print(f"Login failed: {error}")  
+            app.logger.info('Login failed for %s: wrong password', email)
             return render_template('login.html', error=error)
-        print(f"Login successful for {email}")  
+        if needs_rehash:
+            try:
+                new_hash = credentials.hash_password(app, password)
+            except credentials.HasherBusy:  #<- the login stands; the upgrade waits for the next one
+                new_hash = None
+            if new_hash is not None:
+                conn = get_db_connection()
+                conn.execute(
+                    'UPDATE Users SET password = ? WHERE email = ? AND password = ?',
+                    (new_hash, user['email'], user['password'])
+                )
+                conn.commit()
+                conn.close()
+                app.logger.info('Password hash upgraded to %s for %s', app.config['PASSWORD_HASH_METHOD'], email)
+        app.logger.debug('Login successful for %s', email)
         session['user_email'] = user['email']
         
         # set a longer session lifetime if "remember me" is checked
         if remember:
             session.permanent = True
             
-        # determine user type based on database records
-        conn = get_db_connection()  # get a fresh connection
-        buyer = conn.execute('SELECT * FROM Buyer WHERE email = ?', (email,)).fetchone()
-        seller = conn.execute('SELECT * FROM Sellers WHERE email = ?', (email,)).fetchone()
-        helpdesk = conn.execute('SELECT * FROM Helpdesk WHERE email = ?', (email,)).fetchone()
-        conn.close()
-        
-        if helpdesk:
-            session['user_type'] = 'helpdesk'
-            print(f"Redirecting to helpdesk_dashboard") 
-            return redirect(url_for('helpdesk_dashboard'))
-        elif buyer:
-            session['user_type'] = 'buyer'
-            print(f"Redirecting to buyer_dashboard")  
-            return redirect(url_for('buyer_dashboard'))
-        elif seller:
-            session['user_type'] = 'seller'
-            print(f"Redirecting to seller_dashboard") 
-            return redirect(url_for('seller_dashboard'))
-        else:
+        # user type was resolved by the lookup above; prime the identity cache
+        # so the dashboard doesn't read the profile row again
+        identity.cache.put(user)
+        user_type = user['user_type']
+        if user_type is None:
             return render_template('login.html', error=error)
+        session['user_type'] = user_type
+        return redirect(url_for(f'{user_type}_dashboard'))
     
     #throw error if get or form submission fails 
     return render_template('login.html', error=error)
 
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
-    print("Signup route accessed")  
-    
     if request.method == 'POST':
         try:
-            print("Processing signup POST request")  
-            print(f"Form data: {request.form}")  
-            
             #extract form data
             email = request.form['email']
             password = request.form['password']
             user_type = request.form['user_type']
             
-            print(f"Signup attempt - Email: {email}, Type: {user_type}")  
+            app.logger.debug('Signup attempt for %s as %s', email, user_type)
             
             #check if email already exists
             conn = get_db_connection()
             existing_user = conn.execute('SELECT * FROM Users WHERE email = ?', (email,)).fetchone()
             
             if existing_user:
-                print(f"Email {email} already exists in database")  
+                app.logger.debug('Signup rejected, %s is already registered', email)
                 conn.close()
                 error = "Email already registered. Please use a different email or login."
                 return render_template('signup.html', error=error)
             
-            #hash the password using SHA-256 (for consistency with existing code)
-            password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-            print(f"Password hashed: {password_hash[:20]}...")   #<- only show part of hash
+            #hash the password with the configured KDF (credentials.py)
+            password_hash = credentials.hash_password(app, password)
             
             # insert the new user
             cursor = conn.cursor()
             cursor.execute('INSERT INTO Users (email, password) VALUES (?, ?)', (email, password_hash))
-            print(f"User added to Users table: {email}")  
             
             # handle user-specific data based on type
             if user_type == 'buyer':
@@ -139,22 +162,19 @@ def signup():
                     if not zip_exists:
                         city = request.form.get('city', '')
                         state = request.form.get('state', '')
-                        print(f"Adding new zipcode: {zipcode}, {city}, {state}")  
+                        app.logger.debug('Adding new zipcode %s (%s, %s)', zipcode, city, state)
                         cursor.execute('INSERT INTO Zipcode_Info (zipcode, city, state) VALUES (?, ?, ?)', 
                                     (zipcode, city, state))
                 
                 # Create address record
                 if street_num and street_name and zipcode:
-                    print(f"Creating address record: {street_num} {street_name}, {zipcode}")  
                     cursor.execute('''
                         INSERT INTO Address (zipcode, street_num, street_name) 
                         VALUES (?, ?, ?)
                     ''', (zipcode, street_num, street_name))
                     address_id = cursor.lastrowid
-                    print(f"Created address with ID: {address_id}")  
                 
                 # Create buyer record
-                print(f"Creating buyer record: {email}, {business_name}, {address_id}")  
                 cursor.execute('''
                     INSERT INTO Buyer (email, business_name, buyer_address_id) 
                     VALUES (?, ?, ?)
@@ -168,7 +188,6 @@ def signup():
                     expire_year = request.form.get('expire_year', '')
                     security_code = request.form.get('security_code', '')
                     
-                    print(f"Adding credit card for {email}")  
                     cursor.execute('''
                         INSERT INTO Credit_Cards (credit_card_num, card_type, expire_month, 
                         expire_year, security_code, Owner_email) 
@@ -190,26 +209,23 @@ def signup():
                     if not zip_exists:
                         city = request.form.get('seller_city', '')
                         state = request.form.get('seller_state', '')
-                        print(f"Adding new zipcode: {zipcode}, {city}, {state}")  
+                        app.logger.debug('Adding new zipcode %s (%s, %s)', zipcode, city, state)
                         cursor.execute('INSERT INTO Zipcode_Info (zipcode, city, state) VALUES (?, ?, ?)', 
                                     (zipcode, city, state))
                 
                 # Create address record
                 if street_num and street_name and zipcode:
-                    print(f"Creating address record: {street_num} {street_name}, {zipcode}")  
                     cursor.execute('''
                         INSERT INTO Address (zipcode, street_num, street_name) 
                         VALUES (?, ?, ?)
                     ''', (zipcode, street_num, street_name))
                     address_id = cursor.lastrowid
-                    print(f"Created address with ID: {address_id}")  
                 
                 # Get banking info
                 bank_routing_number = request.form.get('bank_routing_number', '')
                 bank_account_number = request.form.get('bank_account_number', '')
                 
                 # Create seller record with initial balance of 0
-                print(f"Creating seller record: {email}, {business_name}, {address_id}")  
                 cursor.execute('''
                     INSERT INTO Sellers (email, business_name, business_address_id, 
                     bank_routing_number, bank_account_number, balance) 
@@ -220,21 +236,18 @@ def signup():
                 position = request.form.get('position', 'Support Staff')
                 
                 # Create helpdesk record
-                print(f"Creating helpdesk record: {email}, {position}")  
                 cursor.execute('INSERT INTO Helpdesk (email, position) VALUES (?, ?)', 
                              (email, position))
             
             # Commit the transaction
             conn.commit()
-            print(f"Successfully created account for {email} as {user_type}")  
+            app.logger.info('Created %s account for %s', user_type, email)
             conn.close()
             
             # Set session data
             session['user_email'] = email
             session['user_type'] = user_type
             
-            print(f"Setting session for {email} as {user_type}")  
-            
             # Redirect to appropriate dashboard
             if user_type == 'buyer':
                 return redirect(url_for('buyer_dashboard'))
@@ -243,8 +256,12 @@ def signup():
             elif user_type == 'helpdesk':
                 return redirect(url_for('helpdesk_dashboard'))
                 
+        except credentials.HasherBusy:
+            conn.rollback()
+            conn.close()
+            return render_template('signup.html', error=credentials.BUSY_MESSAGE)
         except Exception as e:
-            print(f"Error during signup: {str(e)}")  
+            app.logger.exception('Signup failed for %s', request.form.get('email'))
             conn.rollback()
             conn.close()
             error = f"An error occurred during signup: {str(e)}"
@@ -252,30 +269,54 @@ def signup():
     
     # If a user type was specified in the query string, pre-select that option
     user_type = request.args.get('type', 'buyer')
-    print(f"Showing signup form with preselected type: {user_type}")  
     return render_template('signup.html', selected_type=user_type)
 
 
 #=======================Buyer=======================#
-@app.route('/buyer_dashboard')
-def buyer_dashboard():
-    # Check if user is logged in and is a buyer
-    if 'user_email' not in session:
-        return redirect(url_for('login'))
-    
-    if session['user_type'] != 'buyer':
-        return redirect(url_for('dashboard'))
-    
-    # Get the current user's information
-    conn = get_db_connection()
-    
-    # Get buyer details
-    buyer = conn.execute(
-        'SELECT * FROM Buyer WHERE email = ?', 
-        (session['user_email'],)
-    ).fetchone()
+# Featured and recent listings come back from one statement. The `active`
+# CTE is the shared "active listings with rating summary" definition; it is
+# left NOT MATERIALIZED so each LIMIT 6 branch can walk its own index instead
+# of copying the whole active catalog into a temp table first.
+ACTIVE_LISTING_BLOCKS_SQL = '''
+    WITH active AS NOT MATERIALIZED (
+        SELECT pl.*, s.business_name AS seller_name,
+               lr.avg_rating AS avg_rating,
+               COALESCE(lr.rating_count, 0) AS review_count
+        FROM Product_Listings pl
+        JOIN Sellers s ON pl.Seller_Email = s.email
+        LEFT JOIN Listing_Ratings lr
+          ON lr.seller_email = pl.Seller_Email AND lr.listing_id = pl.Listing_ID
+        WHERE pl.Status = 1
+    )
+    SELECT * FROM (SELECT 'featured' AS slot, * FROM active
+                   ORDER BY avg_rating DESC, review_count DESC LIMIT 6)
+    UNION ALL
+    SELECT * FROM (SELECT 'recent' AS slot, * FROM active
+                   ORDER BY Listing_ID DESC LIMIT 6)
+'''
+
+def load_buyer_products_tab(conn, user_email):
+    # the blocks only move when some listing does, so the rows are kept until
+    # the next catalog write and the cards come from the fragment cache
+    catalog_cache.current(lambda: conn)
+    rows = catalog_cache.memoize('buyer_blocks', lambda: conn.execute(ACTIVE_LISTING_BLOCKS_SQL).fetchall())
+    return {
+        'categories': taxonomy.cache.get(conn),
+        'featured_products': [row for row in rows if row['slot'] == 'featured'],
+        'recent_products': [row for row in rows if row['slot'] == 'recent'],
+    }
+
+def load_buyer_orders_tab(conn, user_email):
+    # one page of history, newest first; ?after= is the cursor from the previous page
+    after = order_history.decode_cursor(request.args.get('after'))
+    orders, next_cursor = order_history.get_page(
+        conn, 'buyer', user_email, after, app.config['ORDER_PAGE_SIZE']
+    )
+    return {'orders': orders, 'orders_next_cursor': next_cursor, 'orders_first_page': after is None}
+
+def load_buyer_profile_tab(conn, user_email):
+    buyer = identity.cache.profile(conn, user_email, 'buyer')
     
-    # Get buyer's address
     address = None
     if buyer and buyer['buyer_address_id']:
         address = conn.execute(
@@ -286,78 +327,91 @@ def buyer_dashboard():
             (buyer['buyer_address_id'],)
         ).fetchone()
     
-    # Get buyer's payment methods
     payment_methods = conn.execute(
         'SELECT * FROM Credit_Cards WHERE Owner_email = ?',
-        (session['user_email'],)
+        (user_email,)
     ).fetchall()
     
-    # Get order history
-    orders = conn.execute(
-        '''SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price,
-              (SELECT COUNT(*) FROM Reviews r WHERE r.Order_ID = o.Order_ID) > 0 AS has_review
+    # profile stats only need counts, not the order history itself
+    stats = conn.execute(
+        '''SELECT COUNT(*) AS order_count,
+              COALESCE(SUM(EXISTS (SELECT 1 FROM Reviews r WHERE r.Order_ID = o.Order_ID)), 0) AS review_count
            FROM Orders o
-           JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
-           WHERE o.Buyer_Email = ?
-           ORDER BY o.Date DESC''',
-        (session['user_email'],)
-    ).fetchall()
-    
-    # Get all product categories
-    categories = conn.execute(
-        'SELECT category_name FROM Categories ORDER BY category_name'
-    ).fetchall()
-    
-    # Get featured products
-    featured_products = conn.execute(
-        '''SELECT pl.*, s.business_name AS seller_name,
-              (SELECT AVG(r.Rating) FROM Reviews r 
-               JOIN Orders o ON r.Order_ID = o.Order_ID
-               WHERE o.Listing_ID = pl.Listing_ID) AS avg_rating,
-              (SELECT COUNT(*) FROM Reviews r 
-               JOIN Orders o ON r.Order_ID = o.Order_ID
-               WHERE o.Listing_ID = pl.Listing_ID) AS review_count
-           FROM Product_Listings pl
-           JOIN Sellers s ON pl.Seller_Email = s.email
-           WHERE pl.Status = 1
-           ORDER BY avg_rating DESC, review_count DESC
-           LIMIT 6'''
-    ).fetchall()
+           WHERE o.Buyer_Email = ?''',
+        (user_email,)
+    ).fetchone()
     
-    # Get recent products
-    recent_products = conn.execute(
-        '''SELECT pl.*, s.business_name AS seller_name,
-              (SELECT AVG(r.Rating) FROM Reviews r 
-               JOIN Orders o ON r.Order_ID = o.Order_ID
-               WHERE o.Listing_ID = pl.Listing_ID) AS avg_rating,
-              (SELECT COUNT(*) FROM Reviews r 
-               JOIN Orders o ON r.Order_ID = o.Order_ID
-               WHERE o.Listing_ID = pl.Listing_ID) AS review_count
-           FROM Product_Listings pl
-           JOIN Sellers s ON pl.Seller_Email = s.email
-           WHERE pl.Status = 1
-           ORDER BY pl.Listing_ID DESC
-           LIMIT 6'''
-    ).fetchall()
+    return {
+        'buyer': buyer,
+        'address': address,
+        'payment_methods': payment_methods,
+        'order_count': stats['order_count'],
+        'review_count': stats['review_count'],
+    }
+
+BUYER_TAB_LOADERS = {
+    'products': load_buyer_products_tab,
+    'orders': load_buyer_orders_tab,
+    'profile': load_buyer_profile_tab,
+}
+
+@app.route('/buyer_dashboard')
+def buyer_dashboard():
+    # Check if user is logged in and is a buyer
+    if 'user_email' not in session:
+        return redirect(url_for('login'))
     
-    conn.close()
+    if session['user_type'] != 'buyer':
+        return redirect(url_for('dashboard'))
     
     # Determine active tab from query parameter or default to 'products'
     active_tab = request.args.get('tab', 'products')
+    if active_tab not in BUYER_TAB_LOADERS:
+        active_tab = 'products'
+    
+    # the products tab only shows catalog data, so a browser's copy can be
+    # revalidated from the in-memory catalog version (catalog_cache.py)
+    page = None
+    if active_tab == 'products':
+        page = catalog_cache.validators(get_db_connection, 'dashboard')
+        not_modified = catalog_cache.not_modified(page)
+        if not_modified is not None:
+            return not_modified
+    
+    # Only the visible tab's data is loaded; the others are fetched from
+    # /buyer_dashboard/tab/<tab> when the buyer opens them
+    conn = get_db_connection()
+    tab_data = BUYER_TAB_LOADERS[active_tab](conn, session['user_email'])
+    conn.close()
     
-    return render_template(
+    return catalog_cache.tag(render_template(
         'buyer_dashboard.html',
         user_email=session['user_email'],
         user_type=session['user_type'],
-        buyer=buyer,
-        address=address,
-        payment_methods=payment_methods,
-        orders=orders,
-        categories=categories,
-        featured_products=featured_products,
-        recent_products=recent_products,
-        active_tab=active_tab
+        active_tab=active_tab,
+        **tab_data
+    ), page)
+
+@app.route('/buyer_dashboard/tab/<tab>')
+def buyer_dashboard_tab(tab):
+    if 'user_email' not in session or session['user_type'] != 'buyer':
+        return {'error': 'Unauthorized'}, 401
+    
+    if tab not in BUYER_TAB_LOADERS:
+        return {'error': 'Unknown tab'}, 404
+    
+    conn = get_db_connection()
+    tab_data = BUYER_TAB_LOADERS[tab](conn, session['user_email'])
+    conn.close()
+    
+    html = render_template(
+        f'partials/buyer_{tab}_tab.html',
+        user_email=session['user_email'],
+        user_type=session['user_type'],
+        active_tab=tab,
+        **tab_data
     )
+    return {'tab': tab, 'html': html}
 
 @app.route('/product/<int:listing_id>')
 def product_detail(listing_id):
@@ -365,6 +419,12 @@ def product_detail(listing_id):
         flash('Please log in to view product details.', 'warning')
         return redirect(url_for('login'))
 
+    # answered from the in-memory listing version when the browser's copy is current
+    page = catalog_cache.validators(get_db_connection, 'product', 'listing', listing_id)
+    not_modified = catalog_cache.not_modified(page)
+    if not_modified is not None:
+        return not_modified
+
     conn = None 
     try:
         conn = get_db_connection() 
@@ -395,14 +455,8 @@ def product_detail(listing_id):
             (listing_id,)
         ).fetchall()
 
-        # Calculate Average Rating and Review Count
-        rating_data = conn.execute(
-            '''SELECT COALESCE(AVG(r.Rating), 0.0) AS average, COUNT(r.Rating) AS count
-               FROM Reviews r
-               JOIN Orders o ON r.Order_ID = o.Order_ID
-               WHERE o.Listing_ID = ?''',
-            (listing_id,)
-        ).fetchone()
+        # Average Rating, Review Count and star histogram from the precomputed summary
+        rating_data = ratings.get_summary(conn, listing_id)
 
     except Exception as e:
         flash(f'An error occurred: {e}', 'danger')
@@ -412,7 +466,7 @@ def product_detail(listing_id):
         if conn:
             conn.close()
 
-    return render_template(
+    return catalog_cache.tag(render_template(
         'product_detail.html',
         user_email=session['user_email'],
         user_type=session['user_type'],
@@ -420,7 +474,7 @@ def product_detail(listing_id):
         reviews=reviews,
         # Pass the rating_data object containing 'average' and 'count'
         rating_data=rating_data
-    )
+    ), page)
 
 @app.route('/product/search')
 def product_search():
@@ -433,94 +487,65 @@ def product_search():
     min_price = request.args.get('min_price', '')
     max_price = request.args.get('max_price', '')
     sort_by = request.args.get('sort_by', 'relevance')
+    cursor_token = request.args.get('after', '')
     
-    print(f"Search parameters: query='{query}', category='{category}', min_price='{min_price}', max_price='{max_price}', sort_by='{sort_by}'")
-    
-    conn = get_db_connection()
-    sql_query = '''
-        SELECT pl.*, s.business_name AS seller_name,
-            (SELECT AVG(r.Rating) FROM Reviews r 
-             JOIN Orders o ON r.Order_ID = o.Order_ID
-             WHERE o.Listing_ID = pl.Listing_ID) AS avg_rating,
-            (SELECT COUNT(*) FROM Reviews r 
-             JOIN Orders o ON r.Order_ID = o.Order_ID
-             WHERE o.Listing_ID = pl.Listing_ID) AS review_count
-        FROM Product_Listings pl
-        JOIN Sellers s ON pl.Seller_Email = s.email
-        WHERE pl.Status = 1
-    '''
-    
-    params = []
-    
-    # Add keyword search
-    if query:
-        sql_query += ''' AND (
-            pl.Product_Title LIKE ? OR 
-            pl.Product_Description LIKE ? OR
-            s.business_name LIKE ?
-        )'''
-        query_param = f'%{query}%'
-        params.extend([query_param, query_param, query_param])
+    # Page size is configurable but capped so one request can't pull the whole catalog
+    page_size = request.args.get('page_size', '')
+    if page_size.isdigit() and int(page_size) > 0:
+        page_size = min(int(page_size), app.config['SEARCH_MAX_PAGE_SIZE'])
+    else:
+        page_size = app.config['SEARCH_PAGE_SIZE']
     
-    # Add category filter
+    # a category's version covers its whole subtree; unfiltered results can
+    # change with any listing
     if category:
-        sql_query += ' AND pl.Category = ?'
-        params.append(category)
-    
-    # Add price range filter
-    if min_price and min_price.isdigit():
-        sql_query += ' AND pl.Product_Price >= ?'
-        params.append(float(min_price))
-    
-    if max_price and max_price.isdigit():
-        sql_query += ' AND pl.Product_Price <= ?'
-        params.append(float(max_price))
-    
-    # Add sorting
-    if sort_by == 'price_low':
-        sql_query += ' ORDER BY pl.Product_Price ASC'
-    elif sort_by == 'price_high':
-        sql_query += ' ORDER BY pl.Product_Price DESC'
-    elif sort_by == 'rating':
-        sql_query += ' ORDER BY avg_rating DESC NULLS LAST, review_count DESC'
-    elif sort_by == 'newest':
-        sql_query += ' ORDER BY pl.Listing_ID DESC'
-    else:  # Default to relevance
-        if query:
-            # For relevance, prioritize title matches, then description
-            sql_query += ''' ORDER BY 
-                CASE WHEN pl.Product_Title LIKE ? THEN 3
-                     WHEN pl.Product_Description LIKE ? THEN 2
-                     WHEN s.business_name LIKE ? THEN 1
-                     ELSE 0
-                END DESC'''
-            query_param = f'%{query}%'
-            params.extend([query_param, query_param, query_param])
-        else:
-            # If no query, order by rating
-            sql_query += ' ORDER BY avg_rating DESC NULLS LAST, review_count DESC'
+        page = catalog_cache.validators(get_db_connection, 'search', 'category', category)
+    else:
+        page = catalog_cache.validators(get_db_connection, 'search')
+    not_modified = catalog_cache.not_modified(page)
+    if not_modified is not None:
+        return not_modified
     
-    print("SQL Query:", sql_query)
-    print("Params:", params)
+    conn = get_db_connection()
+    # keyword matching and relevance ranking come from the FTS5 index (search.py);
+    # pages are keyset-based so page N costs the same as page 1
+    after = search.decode_cursor(cursor_token, sort_by)
+    sql_query, params = search.build_search_query(
+        query, category, min_price, max_price, sort_by, after=after, limit=page_size + 1
+    )
     
+    next_cursor = None
     try:
-        products = conn.execute(sql_query, params).fetchall()
-        print(f"Found {len(products)} products.")
-    except Exception as e:
-        print(f"Error executing query: {e}")
+        # one extra row tells us whether there is a next page
+        products = conn.execute(sql_query, params).fetchmany(page_size + 1)
+        if len(products) > page_size:
+            products = products[:page_size]
+            next_cursor = search.encode_cursor(sort_by, products[-1])
+    except Exception:
+        app.logger.exception('Product search failed (query=%r, sort_by=%r)', query, sort_by)
         products = []
     
+    # Cheap capped count instead of len() over the full result set
+    count_cap = app.config['SEARCH_COUNT_CAP']
+    count_query, count_params = search.build_count_query(query, category, min_price, max_price, cap=count_cap)
+    try:
+        result_count = conn.execute(count_query, count_params).fetchone()[0]
+    except Exception:
+        app.logger.exception('Product search count failed (query=%r)', query)
+        result_count = len(products)
+    result_count_capped = result_count > count_cap
+    if result_count_capped:
+        result_count = count_cap
+    
     # Get all categories for filtering
-    categories = conn.execute(
-        'SELECT category_name FROM Categories ORDER BY category_name'
-    ).fetchall()
+    categories = taxonomy.cache.get(conn)
     
     conn.close()
     
     # Pass the selected category back to the template
     selected_category = category
     
-    return render_template(
+    return catalog_cache.tag(render_template(
         'search_results.html',
         user_email=session['user_email'],
         user_type=session['user_type'],
@@ -531,8 +556,12 @@ def product_search():
         min_price=min_price,
         max_price=max_price,
         sort_by=sort_by,
-        result_count=len(products)
-    )
+        result_count=result_count,
+        result_count_capped=result_count_capped,
+        page_size=page_size,
+        next_cursor=next_cursor,
+        is_first_page=after is None
+    ), page)
 
 @app.route('/submit_review', methods=['POST'])
 def submit_review():
@@ -572,6 +601,8 @@ def submit_review():
             'UPDATE Reviews SET Rating = ?, Review_Desc = ? WHERE Order_ID = ?',
             (rating, review_text, order_id)
         )
+        ratings.apply_review(conn, order['Listing_ID'], rating, old_rating=existing_review['Rating'])
+        seller_analytics.record_review(conn, order['Seller_Email'], rating, old_rating=existing_review['Rating'])
         flash('Your review has been updated!')
     else:
         # Create new review
@@ -579,8 +610,15 @@ def submit_review():
             'INSERT INTO Reviews (Order_ID, Rating, Review_Desc) VALUES (?, ?, ?)',
             (order_id, rating, review_text)
         )
+        ratings.apply_review(conn, order['Listing_ID'], rating)
+        seller_analytics.record_review(conn, order['Seller_Email'], rating)
         flash('Thank you for your review!')
     
+    # the helpdesk market report's rating figures are now out of date, and so
+    # is every cached page showing this listing's rating
+    market_analysis.bump_reviews(conn)
+    catalog_cache.bump(conn, [order['Listing_ID']])
+    
     conn.commit()
     conn.close()
     
@@ -679,11 +717,16 @@ def update_profile():
                 (user_email,)
             ).fetchone()
             
-            current_hash = hashlib.sha256(current_password.encode('utf-8')).hexdigest()
+            try:
+                valid = user is not None and credentials.verify_password(app, user['password'], current_password)[0]
+                new_hash = credentials.hash_password(app, new_password) if valid else None
+            except credentials.HasherBusy:
+                conn.close()
+                flash(credentials.BUSY_MESSAGE)
+                return redirect(url_for('buyer_dashboard', tab='profile'))
             
-            if user and user['password'] == current_hash:
+            if valid:
                 # Update password
-                new_hash = hashlib.sha256(new_password.encode('utf-8')).hexdigest()
                 conn.execute(
                     'UPDATE Users SET password = ? WHERE email = ?',
                     (new_hash, user_email)
@@ -696,6 +739,7 @@ def update_profile():
         
         conn.commit()
         conn.close()
+        identity.cache.invalidate(user_email)
         flash('Profile updated successfully!')
         return redirect(url_for('buyer_dashboard', tab='profile'))
     
@@ -741,11 +785,16 @@ def update_helpdesk_profile():
             (user_email,)
         ).fetchone()
         
-        current_hash = hashlib.sha256(current_password.encode('utf-8')).hexdigest()
+        try:
+            valid = user is not None and credentials.verify_password(app, user['password'], current_password)[0]
+            new_hash = credentials.hash_password(app, new_password) if valid else None
+        except credentials.HasherBusy:
+            conn.close()
+            flash(credentials.BUSY_MESSAGE)
+            return redirect(url_for('helpdesk_dashboard', tab='profile'))
         
-        if user and user['password'] == current_hash:
+        if valid:
             # Update password
-            new_hash = hashlib.sha256(new_password.encode('utf-8')).hexdigest()
             conn.execute(
                 'UPDATE Users SET password = ? WHERE email = ?',
                 (new_hash, user_email)
@@ -758,6 +807,7 @@ def update_helpdesk_profile():
     
     conn.commit()
     conn.close()
+    identity.cache.invalidate(user_email)
     
     return redirect(url_for('helpdesk_dashboard', tab='profile'))
 
@@ -775,7 +825,7 @@ def view_order(order_id):
         order = conn.execute(
             '''SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price,
                   s.business_name AS seller_name, s.email AS seller_email,
-                  (SELECT COUNT(*) FROM Reviews r WHERE r.Order_ID = o.Order_ID) > 0 AS has_review
+                  EXISTS (SELECT 1 FROM Reviews r WHERE r.Order_ID = o.Order_ID) AS has_review
                FROM Orders o
                JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
                JOIN Sellers s ON pl.Seller_Email = s.email
@@ -786,7 +836,7 @@ def view_order(order_id):
         order = conn.execute(
             '''SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price,
                   b.business_name AS buyer_name, b.email AS buyer_email,
-                  (SELECT COUNT(*) FROM Reviews r WHERE r.Order_ID = o.Order_ID) > 0 AS has_review
+                  EXISTS (SELECT 1 FROM Reviews r WHERE r.Order_ID = o.Order_ID) AS has_review
                FROM Orders o
                JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
                JOIN Buyer b ON o.Buyer_Email = b.email
@@ -798,7 +848,7 @@ def view_order(order_id):
             '''SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price,
                   s.business_name AS seller_name, s.email AS seller_email,
                   b.business_name AS buyer_name, b.email AS buyer_email,
-                  (SELECT COUNT(*) FROM Reviews r WHERE r.Order_ID = o.Order_ID) > 0 AS has_review
+                  EXISTS (SELECT 1 FROM Reviews r WHERE r.Order_ID = o.Order_ID) AS has_review
                FROM Orders o
                JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
                JOIN Sellers s ON pl.Seller_Email = s.email
@@ -959,13 +1009,92 @@ def add_to_cart():
         return redirect(url_for('login'))
     
     listing_id = request.form.get('listing_id')
+    quantity = request.form.get('quantity', '1')
     
-    if not listing_id:
+    if not listing_id or not listing_id.isdigit() or not quantity.isdigit():
         flash('Invalid product selection')
         return redirect(url_for('buyer_dashboard'))
     
-    # For simplicity, we'll implement direct purchase rather than a cart system
-    return redirect(url_for('checkout', listing_id=listing_id))
+    # "Buy Now" still goes straight to the single-product checkout
+    if request.form.get('action') == 'buy_now':
+        return redirect(url_for('checkout', listing_id=listing_id))
+    
+    conn = get_db_connection()
+    try:
+        cart.add_item(conn, session['user_email'], int(listing_id), int(quantity))
+    except cart.CartError as e:
+        conn.close()
+        flash(str(e))
+        return redirect(request.referrer or url_for('buyer_dashboard'))
+    conn.commit()
+    conn.close()
+    
+    flash('Added to your cart')
+    return redirect(url_for('view_cart'))
+
+@app.route('/cart')
+def view_cart():
+    if 'user_email' not in session or session['user_type'] != 'buyer':
+        return redirect(url_for('login'))
+    
+    conn = get_db_connection()
+    items = cart.get_items(conn, session['user_email'])
+    payment_methods = conn.execute(
+        'SELECT * FROM Credit_Cards WHERE Owner_email = ?',
+        (session['user_email'],)
+    ).fetchall()
+    conn.close()
+    
+    total = sum(float(item['Product_Price'] or 0) * item['quantity'] for item in items)
+    
+    return render_template(
+        'cart.html',
+        user_email=session['user_email'],
+        user_type=session['user_type'],
+        items=items,
+        total=total,
+        payment_methods=payment_methods
+    )
+
+@app.route('/cart/update', methods=['POST'])
+def update_cart():
+    if 'user_email' not in session or session['user_type'] != 'buyer':
+        return redirect(url_for('login'))
+    
+    listing_id = request.form.get('listing_id', '')
+    quantity = request.form.get('quantity', '0')
+    if not listing_id.isdigit() or not quantity.lstrip('-').isdigit():
+        flash('Invalid cart update')
+        return redirect(url_for('view_cart'))
+    
+    conn = get_db_connection()
+    cart.set_quantity(conn, session['user_email'], int(listing_id), int(quantity))
+    conn.commit()
+    conn.close()
+    
+    return redirect(url_for('view_cart'))
+
+@app.route('/cart/place_order', methods=['POST'])
+def place_cart_order():
+    if 'user_email' not in session or session['user_type'] != 'buyer':
+        return redirect(url_for('login'))
+    
+    if not request.form.get('payment_method'):
+        flash('Please select a payment method')
+        return redirect(url_for('view_cart'))
+    
+    # every line is bought in one transaction, or none is (purchasing.py)
+    conn = get_db_connection()
+    try:
+        order_ids = purchasing.place_cart_order(conn, session['user_email'])
+    except purchasing.CheckoutError as e:
+        conn.close()
+        flash(str(e))
+        return redirect(url_for('view_cart'))
+    conn.close()
+    
+    flash(f'Order placed successfully! ({len(order_ids)} items)')
+    return redirect(url_for('buyer_dashboard', tab='orders'))
 
 @app.route('/checkout/<int:listing_id>', methods=['GET', 'POST'])
 def checkout(listing_id):
@@ -1022,37 +1151,15 @@ def checkout(listing_id):
                 payment_methods=payment_methods
             )
         
-        # Create order
-        cursor = conn.cursor()
-        
-        # Calculate the total payment amount
-        payment_amount = float(product['Product_Price']) * int(quantity)
-        
-        cursor.execute(
-            '''INSERT INTO Orders (Seller_Email, Listing_ID, Buyer_Email, Date, Quantity, Payment)
-               VALUES (?, ?, ?, date('now'), ?, ?)''',
-            (product['Seller_Email'], listing_id, session['user_email'], quantity, payment_amount)
-        )
-        
-        order_id = cursor.lastrowid
-        
-        # Update product quantity
-        new_quantity = product['Quantity'] - int(quantity)
-        new_status = 1 if new_quantity > 0 else 2  # Use numeric status: 1 for active, 2 for sold out
-        
-        cursor.execute(
-            'UPDATE Product_Listings SET Quantity = ?, Status = ? WHERE Listing_ID = ?',
-            (new_quantity, new_status, listing_id)
-        )
-        
-        # Update seller balance
-        total_amount = product['Product_Price'] * int(quantity)
-        cursor.execute(
-            'UPDATE Sellers SET balance = balance + ? WHERE email = ?',
-            (total_amount, product['Seller_Email'])
-        )
+        # Stock check, decrement, order row and seller credit commit together
+        # (purchasing.py); a concurrent buyer can't oversell the listing
+        try:
+            purchasing.place_order(conn, session['user_email'], listing_id, int(quantity))
+        except purchasing.CheckoutError as e:
+            conn.close()
+            flash(str(e))
+            return redirect(url_for('checkout', listing_id=listing_id))
         
-        conn.commit()
         conn.close()
         
         flash('Order placed successfully!')
@@ -1071,24 +1178,70 @@ def checkout(listing_id):
 #=======================Buyer=======================#
 
 #=======================Seller========================#
-@app.route('/seller_dashboard')
-def seller_dashboard():
-    # Check if user is logged in and is a seller
-    if 'user_email' not in session:
-        return redirect(url_for('login'))
-    
-    if session['user_type'] != 'seller':
-        return redirect(url_for('dashboard'))
-    
-    # Get the current user's information
-    conn = get_db_connection()
-    
-    # Get seller details
-    seller = conn.execute(
-        'SELECT * FROM Sellers WHERE email = ?', 
-        (session['user_email'],)
+def load_seller_summary(conn, user_email):
+    # the cards above the tabs, shown whichever tab is open; status is stored
+    # as text ('0', '1' or '2'), so active listings are Status = '1'
+    counts = conn.execute(
+        '''SELECT COUNT(*) AS product_count,
+              COALESCE(SUM(Status = '1'), 0) AS active_product_count
+           FROM Product_Listings
+           WHERE Seller_Email = ?''',
+        (user_email,)
     ).fetchone()
     
+    # Totals come from the rollups (seller_analytics.py), one row per seller
+    totals = seller_analytics.get_totals(conn, user_email)
+    return {
+        'product_count': counts['product_count'],
+        'active_product_count': counts['active_product_count'],
+        'order_count': totals['orders'],
+        'total_revenue': totals['revenue'],
+        'avg_rating': totals['avg_rating'],
+        'review_count': totals['review_count'],
+    }
+
+def load_seller_products_tab(conn, user_email):
+    # one page of listings, newest first; ?after= is the last Listing_ID of the
+    # previous page, and the primary key (seller_email, listing_id) serves the order
+    after = request.args.get('after', type=int)
+    limit = app.config['PRODUCT_PAGE_SIZE']
+    sql = 'SELECT * FROM Product_Listings WHERE Seller_Email = ?'
+    params = [user_email]
+    if after is not None:
+        sql += ' AND Listing_ID < ?'
+        params.append(after)
+    products = conn.execute(sql + ' ORDER BY Listing_ID DESC LIMIT ?', params + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = products[-1]['Listing_ID']
+    return {'products': products, 'products_next_cursor': next_cursor, 'products_first_page': after is None}
+
+def load_seller_orders_tab(conn, user_email):
+    # One page of orders for seller's products, newest first
+    after = order_history.decode_cursor(request.args.get('after'))
+    orders, next_cursor = order_history.get_page(
+        conn, 'seller', user_email, after, app.config['ORDER_PAGE_SIZE']
+    )
+    return {'orders': orders, 'orders_next_cursor': next_cursor, 'orders_first_page': after is None}
+
+def load_seller_analytics_tab(conn, user_email):
+    # last 12 months and best sellers, both bounded reads
+    return {
+        'sales_series': seller_analytics.get_series(conn, user_email, 'month', 12),
+        'top_listings': seller_analytics.get_top_listings(conn, user_email),
+    }
+
+def load_seller_profile_tab(conn, user_email):
+    # Get seller details; the balance moves with every sale, so it isn't cached
+    seller = identity.cache.profile(conn, user_email, 'seller')
+    if seller:
+        balance = conn.execute(
+            'SELECT balance FROM Sellers WHERE email = ?',
+            (user_email,)
+        ).fetchone()
+        seller = dict(seller, balance=balance[0] if balance else 0)
+    
     # Get seller's address
     address = None
     if seller and seller['business_address_id']:
@@ -1099,74 +1252,109 @@ def seller_dashboard():
                WHERE a.address_id = ?''', 
             (seller['business_address_id'],)
         ).fetchone()
+    return {'seller': seller, 'address': address}
+
+SELLER_TAB_LOADERS = {
+    'products': load_seller_products_tab,
+    'orders': load_seller_orders_tab,
+    'analytics': load_seller_analytics_tab,
+    'profile': load_seller_profile_tab,
+}
+
+@app.route('/seller_dashboard')
+def seller_dashboard():
+    # Check if user is logged in and is a seller
+    if 'user_email' not in session:
+        return redirect(url_for('login'))
     
-    # Get seller's products
-    products = conn.execute(
-        '''SELECT * FROM Product_Listings 
-           WHERE Seller_Email = ?
-           ORDER BY Listing_ID DESC''',
-        (session['user_email'],)
-    ).fetchall()
-    
-    # Count products by status
-    product_count = len(products)
-    active_product_count = sum(1 for p in products if p['Status'] == 1)
+    if session['user_type'] != 'seller':
+        return redirect(url_for('dashboard'))
     
-    # Get orders for seller's products
-    orders = conn.execute(
-        '''SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price, b.email as buyer_email
-           FROM Orders o
-           JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
-           JOIN Buyer b ON o.Buyer_Email = b.email
-           WHERE o.Seller_Email = ?
-           ORDER BY o.Date DESC''',
-        (session['user_email'],)
-    ).fetchall()
+    # Determine active tab from query parameter or default to 'products'
+    active_tab = request.args.get('tab', 'products')
+    if active_tab not in SELLER_TAB_LOADERS:
+        active_tab = 'products'
     
-    order_count = len(orders)
+    # Only the summary and the visible tab are loaded; the others are fetched
+    # from /seller_dashboard/tab/<tab> when the seller opens them
+    conn = get_db_connection()
+    summary = load_seller_summary(conn, session['user_email'])
+    tab_data = SELLER_TAB_LOADERS[active_tab](conn, session['user_email'])
+    conn.close()
     
-    # Calculate total revenue
-    total_revenue = sum(float(o['Product_Price']) * int(o['Quantity']) for o in orders)
+    return render_template(
+        'seller_dashboard.html',
+        user_email=session['user_email'],
+        user_type=session['user_type'],
+        active_tab=active_tab,
+        **summary,
+        **tab_data
+    )
+
+@app.route('/seller_dashboard/tab/<tab>')
+def seller_dashboard_tab(tab):
+    if 'user_email' not in session or session['user_type'] != 'seller':
+        return {'error': 'Unauthorized'}, 401
     
-    # Calculate average rating for this seller
-    avg_rating_result = conn.execute(
-        '''SELECT AVG(r.Rating) as avg_rating, COUNT(r.Rating) as review_count
-           FROM Reviews r
-           JOIN Orders o ON r.Order_ID = o.Order_ID
-           WHERE o.Seller_Email = ?''',
-        (session['user_email'],)
-    ).fetchone()
+    if tab not in SELLER_TAB_LOADERS:
+        return {'error': 'Unknown tab'}, 404
     
-    avg_rating = avg_rating_result['avg_rating'] if avg_rating_result and avg_rating_result['avg_rating'] is not None else None
-    review_count = avg_rating_result['review_count'] if avg_rating_result else 0
+    # the profile tab repeats the summary counts, so every tab gets them
+    conn = get_db_connection()
+    summary = load_seller_summary(conn, session['user_email'])
+    tab_data = SELLER_TAB_LOADERS[tab](conn, session['user_email'])
+    conn.close()
     
-    # Get all categories for the product form
-    categories = conn.execute(
-        'SELECT category_name FROM Categories ORDER BY category_name'
-    ).fetchall()
+    html = render_template(
+        f'partials/seller_{tab}_tab.html',
+        user_email=session['user_email'],
+        user_type=session['user_type'],
+        active_tab=tab,
+        **summary,
+        **tab_data
+    )
+    return {'tab': tab, 'html': html}
+
+@app.route('/seller/category_options')
+def seller_category_options():
+    if 'user_email' not in session or session['user_type'] != 'seller':
+        return {'error': 'Unauthorized'}, 401
     
+    # The product forms' category list; it's the same for every seller, so the
+    # options are rendered once per taxonomy version and fetched when a form opens
+    conn = get_db_connection()
+    categories = taxonomy.cache.get(conn)
     conn.close()
     
-    # Determine active tab from query parameter or default to 'products'
-    active_tab = request.args.get('tab', 'products')
+    def render_options():
+        return render_template('partials/category_options.html', categories=categories)
     
-    return render_template(
-        'seller_dashboard.html',
-        user_email=session['user_email'],
-        user_type=session['user_type'],
-        seller=seller,
-        address=address,
-        products=products,
-        orders=orders,
-        categories=categories,
-        product_count=product_count,
-        active_product_count=active_product_count,
-        order_count=order_count,
-        total_revenue=total_revenue,
-        avg_rating=avg_rating,
-        review_count=review_count,
-        active_tab=active_tab
+    if categories.version is None:
+        return {'html': render_options()}
+    return {'html': catalog_cache.fragments.get(('category_options', categories.version), render_options)}
+
+@app.route('/seller/analytics')
+def seller_analytics_series():
+    if 'user_email' not in session or session['user_type'] != 'seller':
+        return {'error': 'Unauthorized'}, 401
+    
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in ('day', 'month'):
+        return {'error': 'granularity must be day or month'}, 400
+    periods = request.args.get('periods', '30' if granularity == 'day' else '12')
+    listing_id = request.args.get('listing_id')
+    if not periods.isdigit() or (listing_id and not listing_id.isdigit()):
+        return {'error': 'Invalid parameters'}, 400
+    
+    conn = get_db_connection()
+    series = seller_analytics.get_series(
+        conn, session['user_email'], granularity, min(int(periods), 366),
+        listing_id=int(listing_id) if listing_id else None
     )
+    totals = seller_analytics.get_totals(conn, session['user_email'])
+    conn.close()
+    
+    return {'granularity': granularity, 'totals': totals, 'series': series}
 
 @app.route('/seller/product/<int:listing_id>')
 def get_product(listing_id):
@@ -1221,12 +1409,20 @@ def add_product():
     
     # Insert product
     conn = get_db_connection()
-    conn.execute(
+    cursor = conn.execute(
         '''INSERT INTO Product_Listings 
            (Seller_Email, Listing_ID, Category, Product_Title, Product_Name, Product_Description, Quantity, Product_Price, Status) 
            VALUES (?, (SELECT COALESCE(MAX(Listing_ID), 0) + 1 FROM Product_Listings), ?, ?, ?, ?, ?, ?, ?)''',
         (session['user_email'], category, product_title, product_name, product_description, quantity, product_price, status)
     )
+    listing_id = conn.execute(
+        'SELECT Listing_ID FROM Product_Listings WHERE rowid = ?',
+        (cursor.lastrowid,)
+    ).fetchone()[0]
+    
+    # Keep the search index and cached catalog pages in sync
+    search.index_listing(conn, listing_id)
+    catalog_cache.bump(conn, [listing_id])
     
     conn.commit()
     conn.close()
@@ -1280,6 +1476,11 @@ def update_product():
         (product_title, product_description, category, product_price, quantity, status, listing_id, session['user_email'])
     )
     
+    # Keep the search index and cached catalog pages in sync (the old
+    # category's pages too, if it moved)
+    search.index_listing(conn, listing_id)
+    catalog_cache.bump(conn, [listing_id], [product['Category']])
+    
     conn.commit()
     conn.close()
     
@@ -1310,6 +1511,7 @@ def activate_product(listing_id):
             'UPDATE Product_Listings SET Status = 1 WHERE Listing_ID = ?',
             (listing_id,)
         )
+        catalog_cache.bump(conn, [listing_id])
         flash('Product activated successfully!')
     else:
         flash('Cannot activate product with zero quantity.')
@@ -1342,6 +1544,7 @@ def deactivate_product(listing_id):
         'UPDATE Product_Listings SET Status = 0 WHERE Listing_ID = ?',
         (listing_id,)
     )
+    catalog_cache.bump(conn, [listing_id])
     
     conn.commit()
     conn.close()
@@ -1442,11 +1645,16 @@ def update_seller_profile():
             (session['user_email'],)
         ).fetchone()
         
-        current_hash = hashlib.sha256(current_password.encode('utf-8')).hexdigest()
+        try:
+            valid = user is not None and credentials.verify_password(app, user['password'], current_password)[0]
+            new_hash = credentials.hash_password(app, new_password) if valid else None
+        except credentials.HasherBusy:
+            conn.close()
+            flash(credentials.BUSY_MESSAGE)
+            return redirect(url_for('seller_dashboard', tab='profile'))
         
-        if user and user['password'] == current_hash:
+        if valid:
             # Update password
-            new_hash = hashlib.sha256(new_password.encode('utf-8')).hexdigest()
             conn.execute(
                 'UPDATE Users SET password = ? WHERE email = ?',
                 (new_hash, session['user_email'])
@@ -1457,8 +1665,14 @@ def update_seller_profile():
             flash('Current password is incorrect!')
             return redirect(url_for('seller_dashboard', tab='profile'))
     
+    # Business name is searchable and on every card, so re-index this
+    # seller's listings and retire their cached pages
+    search.index_seller(conn, session['user_email'])
+    catalog_cache.bump_seller(conn, session['user_email'])
+    
     conn.commit()
     conn.close()
+    identity.cache.invalidate(session['user_email'])
     
     flash('Profile updated successfully!')
     return redirect(url_for('seller_dashboard', tab='profile'))
@@ -1479,46 +1693,19 @@ def helpdesk_dashboard():
     conn = get_db_connection()
     
     # Get helpdesk staff details
-    helpdesk = conn.execute(
-        'SELECT * FROM Helpdesk WHERE email = ?', 
-        (session['user_email'],)
-    ).fetchone()
-    
-    # Get unassigned requests (assigned to helpdeskteam@nittybiz.com)
-    unassigned_requests = conn.execute(
-        '''SELECT * FROM Requests
-           WHERE helpdesk_staff_email = 'helpdeskteam@nittybiz.com'
-           AND request_status = 0
-           ORDER BY request_id DESC'''
-    ).fetchall()
-    
-    # Get assigned requests (assigned to current staff)
-    assigned_requests = conn.execute(
-        '''SELECT * FROM Requests
-           WHERE helpdesk_staff_email = ?
-           AND request_status = 1
-           ORDER BY request_id DESC''',
-        (session['user_email'],)
-    ).fetchall()
-    
-    # Get completed requests
-    completed_requests = conn.execute(
-        '''SELECT * FROM Requests
-           WHERE helpdesk_staff_email = ?
-           AND request_status = 2
-           ORDER BY request_id DESC''',
-        (session['user_email'],)
-    ).fetchall()
+    helpdesk = identity.cache.profile(conn, session['user_email'], 'helpdesk')
+    
+    # Only the visible tab is loaded, one page at a time; ?after= is the last
+    # request_id of the previous page
+    queue_page, queue_next_after = [], None
+    after = request.args.get('after', type=int)
+    if active_tab in request_queue.TABS:
+        queue_page, queue_next_after = request_queue.get_page(
+            conn, active_tab, session['user_email'], after, app.config['REQUEST_PAGE_SIZE']
+        )
     
-    # Count requests
-    unassigned_count = len(unassigned_requests)
-    assigned_count = len(assigned_requests)
-    completed_count = conn.execute(
-        '''SELECT COUNT(*) FROM Requests
-           WHERE helpdesk_staff_email = ?
-           AND request_status = 2''',
-        (session['user_email'],)
-    ).fetchone()[0]
+    # Summary cards come from the trigger-maintained counts
+    counts = request_queue.get_counts(conn, session['user_email'])
     
     conn.close()
     
@@ -1527,12 +1714,14 @@ def helpdesk_dashboard():
         user_email=session['user_email'],
         user_type=session['user_type'],
         position=helpdesk['position'] if helpdesk else '',
-        unassigned_requests=unassigned_requests,
-        assigned_requests=assigned_requests,
-        completed_requests=completed_requests,
-        unassigned_count=unassigned_count,
-        assigned_count=assigned_count,
-        completed_count=completed_count,
+        unassigned_requests=queue_page if active_tab == 'unassigned' else [],
+        assigned_requests=queue_page if active_tab == 'assigned' else [],
+        completed_requests=queue_page if active_tab == 'completed' else [],
+        unassigned_count=counts['unassigned'],
+        assigned_count=counts['assigned'],
+        completed_count=counts['completed'],
+        requests_next_after=queue_next_after,
+        requests_first_page=after is None,
         active_tab=active_tab
     )
 
@@ -1555,9 +1744,14 @@ def view_request(request_id):
         return redirect(url_for('helpdesk_dashboard'))
     
     # Get all categories for category form
-    categories = conn.execute(
-        'SELECT * FROM Categories ORDER BY category_name'
-    ).fetchall()
+    categories = taxonomy.cache.get(conn)
+    
+    # Market analysis tickets get the precomputed marketplace report; only
+    # sections whose data changed since the last view are recomputed, and the
+    # quantiles are left to `python market_analysis.py refresh`
+    market_report = None
+    if routing.normalize_type(request['request_type']) == 'marketanalysis':
+        market_report = market_analysis.get_report(conn)
     
     conn.close()
     
@@ -1566,7 +1760,8 @@ def view_request(request_id):
         user_email=session['user_email'],
         user_type=session['user_type'],
         request=request,
-        categories=categories
+        categories=categories,
+        market_report=market_report
     )
 
 @app.route('/claim_request/<int:request_id>')
@@ -1576,34 +1771,28 @@ def claim_request(request_id):
     
     conn = get_db_connection()
     
-    # Check if request exists and is unassigned
-    request = conn.execute(
-        '''SELECT * FROM Requests 
-           WHERE request_id = ? 
-           AND helpdesk_staff_email = 'helpdeskteam@nittybiz.com'
-           AND request_status = 0''',
-        (request_id,)
-    ).fetchone()
+    # One conditional UPDATE: only matches while the request is still in the
+    # shared pool, so two staff claiming at once can't both get it
+    claimed = request_queue.claim(conn, request_id, session['user_email'])
     
-    if not request:
+    if not claimed:
         conn.close()
         flash('Request not found or already assigned')
         return redirect(url_for('helpdesk_dashboard'))
     
-    # Assign request to current staff member
-    conn.execute(
-        '''UPDATE Requests 
-           SET helpdesk_staff_email = ?, request_status = 1
-           WHERE request_id = ?''',
-        (session['user_email'], request_id)
-    )
-    
     conn.commit()
     conn.close()
     
     flash('Request successfully claimed')
     return redirect(url_for('helpdesk_dashboard', tab='assigned'))
 
+def pull_next_request(conn):
+    # with routing on, finishing a request frees a slot, so the oldest request
+    # waiting in the pool is handed over in the same transaction
+    if not app.config['REQUEST_ROUTING']:
+        return None
+    return routing.pull(conn, session['user_email'], app.config['REQUEST_ROUTING_MAX_OPEN'])
+
 @app.route('/complete_request/<int:request_id>', methods=['GET', 'POST'])
 def complete_request(request_id):
     if 'user_email' not in session or session['user_type'] != 'helpdesk':
@@ -1647,24 +1836,31 @@ def complete_request(request_id):
             (category_name, parent_category)
         )
         
+        # Rebuild the subtree index search filters on, and mark every
+        # worker's cached category list as stale
+        taxonomy.rebuild_hierarchy(conn)
+        taxonomy.bump_version(conn)
+        catalog_cache.invalidate(conn)  #<- category lists are on every catalog page
+        
         # Mark request as completed
         conn.execute(
             'UPDATE Requests SET request_status = 2 WHERE request_id = ?',
             (request_id,)
         )
+        next_request = pull_next_request(conn)
         
         conn.commit()
         conn.close()
         
         flash('Category added and request marked as completed')
+        if next_request:
+            flash(f"Request #REQ-{next_request['request_id']} has been assigned to you")
         return redirect(url_for('helpdesk_dashboard', tab='completed'))
     
     # For GET requests, show form to complete the request
     if helpdesk_request['request_type'] == 'Add New Category':
         # Get all categories for parent selection
-        categories = conn.execute(
-            'SELECT * FROM Categories ORDER BY category_name'
-        ).fetchall()
+        categories = taxonomy.cache.get(conn)
         
         conn.close()
         
@@ -1680,11 +1876,14 @@ def complete_request(request_id):
         'UPDATE Requests SET request_status = 2 WHERE request_id = ?',
         (request_id,)
     )
+    next_request = pull_next_request(conn)
     
     conn.commit()
     conn.close()
     
     flash('Request marked as completed')
+    if next_request:
+        flash(f"Request #REQ-{next_request['request_id']} has been assigned to you")
     return redirect(url_for('helpdesk_dashboard', tab='completed'))
 
 @app.route('/submit_request', methods=['GET', 'POST'])
@@ -1702,15 +1901,25 @@ def submit_request():
         
         conn = get_db_connection()
         
-        # Create new request
-        conn.execute(
-            '''INSERT INTO Requests 
-               (sender_email, helpdesk_staff_email, request_type, request_desc, request_status) 
-               VALUES (?, 'helpdeskteam@nittybiz.com', ?, ?, 0)''',
-            (session['user_email'], request_type, request_desc)
-        )
-        
-        conn.commit()
+        # Create the request and hand it to the least loaded staff member who
+        # handles this request type; it falls back to the shared pool when
+        # routing is off or everyone is at capacity
+        if app.config['REQUEST_ROUTING']:
+            try:
+                routing.submit(conn, session['user_email'], request_type, request_desc,
+                               app.config['REQUEST_ROUTING_MAX_OPEN'])
+            except db.DatabaseBusy:
+                conn.close()
+                flash('The helpdesk is busy right now, please try again')
+                return render_template('submit_request.html', user_email=session['user_email'], user_type=session['user_type'])
+        else:
+            conn.execute(
+                '''INSERT INTO Requests 
+                   (sender_email, helpdesk_staff_email, request_type, request_desc, request_status) 
+                   VALUES (?, 'helpdeskteam@nittybiz.com', ?, ?, 0)''',
+                (session['user_email'], request_type, request_desc)
+            )
+            conn.commit()
         conn.close()
         
         flash('Your request has been submitted')
@@ -1763,7 +1972,7 @@ def create_helpdesk_user():
                 return render_template('create_helpdesk_user.html', error=error, user_email=session['user_email'], user_type=session['user_type'])
 
             # Hash the password
-            password_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            password_hash = credentials.hash_password(app, password)
 
             # Insert into Users table
             cursor.execute('INSERT INTO Users (email, password) VALUES (?, ?)', (email, password_hash))
@@ -1775,6 +1984,9 @@ def create_helpdesk_user():
             flash(f"Helpdesk user '{email}' created successfully!", "success")
             return redirect(url_for('helpdesk_dashboard')) # Redirect back to dashboard
 
+        except credentials.HasherBusy:
+            conn.rollback()
+            return render_template('create_helpdesk_user.html', error=credentials.BUSY_MESSAGE, user_email=session['user_email'], user_type=session['user_type'])
         except sqlite3.Error as e:
             if conn:
                 conn.rollback() # Rollback changes on error
@@ -1797,6 +2009,80 @@ def create_helpdesk_user():
 
 
 #=======================AllThree========================#
+@app.route('/db_pool_stats')
+def db_pool_stats():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    # checkouts/hits/waits let us size DB_POOL_SIZE against the worker count
+    return db.get_pool(app).stats()
+
+@app.route('/category_cache_stats')
+def category_cache_stats():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    return taxonomy.cache.stats()
+
+@app.route('/catalog_cache_stats')
+def catalog_cache_stats():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    return dict(catalog_cache.stats(), enabled=app.config['CATALOG_CACHE'])
+
+@app.route('/routing_stats')
+def routing_stats():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    conn = get_db_connection()
+    staff = routing.staff_load(conn)
+    conn.close()
+    return {'enabled': app.config['REQUEST_ROUTING'], 'max_open': app.config['REQUEST_ROUTING_MAX_OPEN'], 'staff': staff}
+
+@app.route('/identity_cache_stats')
+def identity_cache_stats():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    return identity.cache.stats()
+
+@app.route('/metrics')
+def metrics():
+    if 'user_email' not in session or session['user_type'] != 'helpdesk':
+        return {'error': 'Unauthorized'}, 401
+    # per-route latency / SQL / template histograms and the slowest statements
+    if request.args.get('format') == 'prometheus':
+        return Response(profiling.metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return profiling.metrics.snapshot(top=request.args.get('top', 50, type=int))
+
+@app.route('/export/<dataset>')
+def export_data(dataset):
+    if 'user_email' not in session or session['user_type'] not in ('seller', 'helpdesk'):
+        return {'error': 'Unauthorized'}, 401
+    
+    seller = request.args.get('seller') or None
+    if session['user_type'] == 'seller':
+        # sellers only ever get their own orders and listings
+        if dataset == 'requests':
+            return {'error': 'Unauthorized'}, 401
+        seller = session['user_email']
+    
+    fmt = request.args.get('format', 'csv')
+    try:
+        chunks = exporter.stream(
+            app.config['DATABASE'], dataset, fmt,
+            seller=seller,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            status=request.args.get('status')
+        )
+    except exporter.ExportError as e:
+        return {'error': str(e)}, 400
+    
+    # streamed from a read-only snapshot, not the pooled request connection
+    return Response(
+        chunks,
+        mimetype=exporter.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={exporter.filename(dataset, fmt)}'}
+    )
+
 @app.route('/logout')
 def logout():
     session.clear()
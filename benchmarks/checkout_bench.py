@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+import purchasing
+
+# Hammers one listing with concurrent buyers and compares the old
+# read-check-write checkout with purchasing.place_order().
+#
+#   python benchmarks/checkout_bench.py [--workers 16] [--stock 200]
+#                                       [--attempts 40] [--processes]
+#
+# Every worker keeps buying one unit until it has made --attempts tries.
+# "oversold" is units sold beyond the starting stock; "lost updates" is how
+# far the final stock is from (starting stock - units sold).
+
+BUSY_TIMEOUT = 5000
+
+
+def _connect(database):
+    conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT / 1000.0)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT}')
+    return conn
+
+
+def legacy_checkout(conn, buyer_email, listing_id, quantity):
+    """The pre-purchasing.py checkout POST path, kept for comparison."""
+    product = conn.execute(
+        'SELECT * FROM Product_Listings WHERE Listing_ID = ? AND Status = 1',
+        (listing_id,)
+    ).fetchone()
+    if not product or quantity > product['Quantity']:
+        return False
+    cursor = conn.cursor()
+    payment_amount = float(product['Product_Price']) * quantity
+    cursor.execute(
+        '''INSERT INTO Orders (Seller_Email, Listing_ID, Buyer_Email, Date, Quantity, Payment)
+           VALUES (?, ?, ?, date('now'), ?, ?)''',
+        (product['Seller_Email'], listing_id, buyer_email, quantity, payment_amount)
+    )
+    new_quantity = product['Quantity'] - quantity
+    cursor.execute(
+        'UPDATE Product_Listings SET Quantity = ?, Status = ? WHERE Listing_ID = ?',
+        (new_quantity, 1 if new_quantity > 0 else 2, listing_id)
+    )
+    cursor.execute(
+        'UPDATE Sellers SET balance = balance + ? WHERE email = ?',
+        (payment_amount, product['Seller_Email'])
+    )
+    conn.commit()
+    return True
+
+
+def atomic_checkout(conn, buyer_email, listing_id, quantity):
+    try:
+        purchasing.place_order(conn, buyer_email, listing_id, quantity)
+        return True
+    except purchasing.CheckoutError:
+        return False
+
+
+ENGINES = {'legacy': legacy_checkout, 'atomic': atomic_checkout}
+
+
+def _worker(engine, database, buyer_email, listing_id, attempts, results):
+    conn = _connect(database)
+    counts = {'ok': 0, 'rejected': 0, 'errors': 0}
+    for _ in range(attempts):
+        try:
+            counts['ok' if ENGINES[engine](conn, buyer_email, listing_id, 1) else 'rejected'] += 1
+        except sqlite3.Error:
+            counts['errors'] += 1
+            if conn.in_transaction:
+                conn.rollback()
+    conn.close()
+    if isinstance(results, list):
+        results.append(counts)
+    else:
+        results.put(counts)
+
+
+def _prepare(source, stock):
+    tmp = tempfile.mkdtemp(prefix='checkout_bench_')
+    database = os.path.join(tmp, 'bench.db')
+    shutil.copy(source, database)
+    conn = _connect(database)
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrations.migrate(conn)
+    listing = conn.execute(
+        "SELECT Listing_ID FROM Product_Listings WHERE Status = 1 ORDER BY Listing_ID LIMIT 1"
+    ).fetchone()[0]
+    buyer = conn.execute('SELECT email FROM Buyer LIMIT 1').fetchone()[0]
+    conn.execute('UPDATE Product_Listings SET Quantity = ?, Status = 1 WHERE Listing_ID = ?', (stock, listing))
+    conn.commit()
+    conn.close()
+    return tmp, database, listing, buyer
+
+
+def run(engine, source, workers, stock, attempts, processes):
+    tmp, database, listing, buyer = _prepare(source, stock)
+    conn = _connect(database)
+    last_order = conn.execute('SELECT COALESCE(MAX(Order_ID), 0) FROM Orders').fetchone()[0]
+    conn.close()
+
+    if processes:
+        results = multiprocessing.Queue()
+        runners = [multiprocessing.Process(target=_worker, args=(engine, database, buyer, listing, attempts, results))
+                   for _ in range(workers)]
+    else:
+        results = []
+        runners = [threading.Thread(target=_worker, args=(engine, database, buyer, listing, attempts, results))
+                   for _ in range(workers)]
+
+    started = time.perf_counter()
+    for runner in runners:
+        runner.start()
+    counts = [results.get() for _ in runners] if processes else None
+    for runner in runners:
+        runner.join()
+    elapsed = time.perf_counter() - started
+    counts = counts or results
+
+    conn = _connect(database)
+    sold = conn.execute(
+        'SELECT COALESCE(SUM(Quantity), 0) FROM Orders WHERE Listing_ID = ? AND Order_ID > ?',
+        (listing, last_order)
+    ).fetchone()[0]
+    final = conn.execute('SELECT Quantity FROM Product_Listings WHERE Listing_ID = ?', (listing,)).fetchone()[0]
+    conn.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    ok = sum(c['ok'] for c in counts)
+    return {
+        'engine': engine,
+        'orders': ok,
+        'rejected': sum(c['rejected'] for c in counts),
+        'errors': sum(c['errors'] for c in counts),
+        'orders_per_sec': ok / elapsed if elapsed else 0.0,
+        'elapsed': elapsed,
+        'oversold': max(0, sold - stock),
+        'lost_updates': abs((stock - sold) - final),
+        'final_stock': final,
+    }
+
+
+def main(args):
+    def option(name, default):
+        return type(default)(args[args.index(name) + 1]) if name in args else default
+
+    workers = option('--workers', 16)
+    stock = option('--stock', 200)
+    attempts = option('--attempts', 40)
+    processes = '--processes' in args
+    source = option('--db', 'database.db')
+
+    mode = 'processes' if processes else 'threads'
+    print(f'{workers} {mode} x {attempts} attempts on one listing with {stock} units in stock\n')
+    print(f"{'engine':<8} {'orders':>7} {'rejected':>9} {'errors':>7} {'orders/s':>9} {'oversold':>9} {'lost upd':>9} {'final':>6}")
+    for engine in ENGINES:
+        r = run(engine, source, workers, stock, attempts, processes)
+        print(f"{r['engine']:<8} {r['orders']:>7} {r['rejected']:>9} {r['errors']:>7} "
+              f"{r['orders_per_sec']:>9.1f} {r['oversold']:>9} {r['lost_updates']:>9} {r['final_stock']:>6}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
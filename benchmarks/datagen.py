@@ -0,0 +1,485 @@
+import argparse
+import array
+import datetime
+import hashlib
+import itertools
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash
+
+import bulk_import
+import catalog_cache
+import credentials
+import market_analysis
+import migrations
+import ratings
+import request_queue
+import search
+import seller_analytics
+import taxonomy
+
+# Deterministic synthetic data at production scale.
+#
+#   python benchmarks/datagen.py --out /tmp/bench.db [--preset small|medium|large]
+#       [--sellers N] [--buyers N] [--listings N] [--orders N] [--requests N] [--staff N]
+#       [--review-rate 0.3] [--zipf 1.1] [--seller-alpha 1.2]
+#       [--category-depth 3] [--category-fanout 3] [--seed 1] [--source database.db] [--digest]
+#
+# The checked-in rows are kept and every table gets referentially consistent
+# rows appended, skewed the way a real marketplace is:
+#
+#   Categories        a tree DEPTH levels deep (FANOUT children per node) under
+#                     each existing leaf category; listings land on the
+#                     leaves below their template's category
+#   Sellers           listings per seller follow a power law (Pareto weights,
+#                     --seller-alpha): a few sellers own a large share
+#   Product_Listings  titles, descriptions and prices come from the real
+#                     catalog (prices jittered); ids are contiguous per seller
+#   Orders            listing popularity is Zipf-distributed (--zipf) and buyer
+#                     activity mildly so; order volume grows over time and
+#                     dates follow the order id
+#   Reviews           each listing has its own review propensity (Beta, mean
+#                     --review-rate) and quality; ratings scatter around it
+#   Buyer / Credit_Cards / Address / Users / Helpdesk / Requests / Cart_Items
+#                     consistent with the above; addresses use existing zipcodes
+#
+# Everything is drawn from one random.Random(seed) in a fixed order, so the
+# same arguments produce identical rows (--digest prints a hash of them to
+# check). Generated accounts are <role><n>@bench.nittybiz.com with password
+# PASSWORD; benchmarks/load_test.py logs in with it.
+#
+# Rows go through executemany in CHUNK-sized batches, one transaction per
+# table, with bulk_import's pragmas. Secondary indexes on the loaded tables
+# are dropped first and recreated afterwards (one sorted build instead of
+# millions of random index inserts), then the derived tables are rebuilt once.
+
+PRESETS = {
+    'small': dict(sellers=1000, buyers=5000, listings=10000, orders=50000, requests=500, staff=20),
+    'medium': dict(sellers=10000, buyers=50000, listings=100000, orders=1000000, requests=5000, staff=50),
+    'large': dict(sellers=100000, buyers=500000, listings=1000000, orders=10000000, requests=50000,
+                  staff=200),
+}
+
+PASSWORD = 'benchmark'
+EMAIL_DOMAIN = 'bench.nittybiz.com'
+CHUNK = 50000
+
+FIRST_DAY = datetime.date(2015, 1, 1)
+LAST_DAY = datetime.date(2025, 4, 30)
+
+ZIPF_S = 1.1  #<- listing popularity exponent
+BUYER_ZIPF_S = 0.6  #<- buyer activity exponent
+SELLER_ALPHA = 1.2  #<- Pareto shape for seller sizes; lower is more skewed
+CATEGORY_DEPTH = 3
+CATEGORY_FANOUT = 3
+CART_RATE = 0.05  #<- buyers with something in their cart
+
+LOADED_TABLES = ('Users', 'Address', 'Sellers', 'Buyer', 'Credit_Cards', 'Helpdesk', 'Categories',
+                 'Product_Listings', 'Orders', 'Reviews', 'Requests', 'Cart_Items')
+STATUSES = ('1',) * 95 + ('0',) * 3 + ('2',) * 2  #<- active / inactive / sold out
+CARD_TYPES = ('Visa', 'Master', 'Discover', 'American Express')
+REVIEW_TEXTS = {1: 'Bad', 2: 'Not great', 3: 'Not Bad', 4: 'Good', 5: 'Excellent'}
+REQUEST_TYPES = ('ChangeID', 'Add New Category', 'MarketAnalysis', 'Technical Support')
+POSITIONS = ('IT Support Specialist', 'Systems Administrator', 'DBA', 'Technical Support')
+TIERS = ('Series', 'Line', 'Range', 'Edition', 'Model')  #<- category name word per depth
+STREETS = ('Main St', 'College Ave', 'Atherton St', 'Park Ave', 'Beaver Ave', 'Pugh St', 'Allen St')
+BUSINESS_WORDS = ('Nittany', 'Valley', 'Summit', 'Keystone', 'Lion', 'Harbor', 'Maple', 'Union',
+                  'Golden', 'Urban', 'Heritage', 'Modern')
+BUSINESS_KINDS = ('Goods', 'Supply', 'Market', 'Traders', 'Outlet', 'Shop', 'Depot', 'Works')
+
+
+def email(role, n):
+    return f'{role}{n:07d}@{EMAIL_DOMAIN}'
+
+
+def password_hash(seed):
+    """The werkzeug scrypt hash of PASSWORD with a salt derived from the seed, so
+    reruns are byte-identical. One hash serves every generated account."""
+    method = credentials.DEFAULT_METHOD  #<- 'scrypt:n:r:p'
+    n, r, p = (int(x) for x in method.split(':')[1:])
+    salt = hashlib.sha256(f'datagen-{seed}'.encode()).hexdigest()[:16]
+    digest = hashlib.scrypt(PASSWORD.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=132 * n * r * p)
+    stored = f'{method}${salt}${digest.hex()}'
+    assert check_password_hash(stored, PASSWORD)
+    return stored
+
+
+def cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def zipf_weights(count, s):
+    return [1.0 / (rank ** s) for rank in range(1, count + 1)]
+
+
+#=======================Writer=======================#
+class Writer:
+    """Inserts rows in chunks, one transaction per call, optionally hashing them."""
+
+    def __init__(self, conn, digest=False, log=print):
+        self.conn = conn
+        self.hasher = hashlib.sha256() if digest else None
+        self.log = log
+        self.counts = {}
+
+    def _feed(self, batch):
+        if self.hasher is not None:
+            for row in batch:
+                self.hasher.update(repr(row).encode())
+
+    def batches(self, table, batches):
+        """Write an iterable of batches, each a list of (table, sql, rows); child
+        tables (Reviews) ride along with the rows they belong to."""
+        started = time.perf_counter()
+        for batch in batches:
+            for name, statement, rows in batch:
+                self._feed(rows)
+                self.conn.executemany(statement, rows)
+                self.counts[name] = self.counts.get(name, 0) + len(rows)
+        self.conn.commit()
+        self.log(f'{table:<17} {self.counts.get(table, 0):>10} rows {time.perf_counter() - started:>7.1f}s')
+
+    def rows(self, table, sql, rows):
+        def chunked():
+            iterator = iter(rows)
+            while True:
+                batch = list(itertools.islice(iterator, CHUNK))
+                if not batch:
+                    return
+                yield [(table, sql, batch)]
+        self.batches(table, chunked())
+
+    def digest(self):
+        return self.hasher.hexdigest() if self.hasher is not None else None
+#=======================Writer=======================#
+
+
+#=======================Generators=======================#
+def business_name(rng):
+    return f'{rng.choice(BUSINESS_WORDS)} {rng.choice(BUSINESS_WORDS)} {rng.choice(BUSINESS_KINDS)}'
+
+
+def category_tree(conn, depth, fanout):
+    """New Categories rows below every current leaf, and leaf lists per original category."""
+    parents = dict(conn.execute('SELECT category_name, parent_category FROM Categories ORDER BY category_name'))
+    has_children = set(parents.values())
+    rows, leaves = [], {}
+    for root in sorted(parents):
+        if root in has_children:
+            continue
+        level = [root]
+        for d in range(depth):
+            children = []
+            for node in level:
+                for i in range(1, fanout + 1):
+                    name = f'{node} {TIERS[d % len(TIERS)]} {i}'
+                    rows.append((node, name))
+                    children.append(name)
+            level = children
+        leaves[root] = level
+    return rows, leaves
+
+
+def address_rows(rng, count, zipcodes, ids):
+    for _ in range(count):
+        address_id = f'{rng.getrandbits(128):032x}'
+        ids.append(address_id)
+        yield (address_id, rng.choice(zipcodes), rng.randint(1, 9999), rng.choice(STREETS))
+
+
+def seller_rows(rng, count, addresses):
+    for n in range(count):
+        yield (email('s', n), business_name(rng), addresses[n],
+               f'{rng.randint(0, 9999):04d}-{rng.randint(0, 9999):04d}-{rng.randint(0, 9)}',
+               f'{rng.randint(10000000, 99999999)}', 0.0)
+
+
+def buyer_rows(rng, count, addresses):
+    for n in range(count):
+        yield (email('b', n), business_name(rng), addresses[n])
+
+
+def card_rows(rng, count, first_card):
+    number = first_card
+    for n in range(count):
+        for _ in range(rng.choices((1, 2, 3), weights=(70, 20, 10))[0]):
+            yield (str(number), rng.choice(CARD_TYPES), rng.randint(1, 12),
+                   rng.randint(2026, 2032), f'{rng.randint(0, 999):03d}', email('b', n))
+            number += 1
+
+
+def staff_rows(rng, count):
+    for n in range(count):
+        yield (email('h', n), rng.choice(POSITIONS))
+
+
+def seller_sizes(rng, sellers, listings, alpha):
+    """Listings per seller: Pareto weights, every seller gets at least one if possible."""
+    weights = [rng.paretovariate(alpha) for _ in range(sellers)]
+    base = 1 if listings >= sellers else 0
+    owners = rng.choices(range(sellers), cum_weights=cumulative(weights), k=listings - base * sellers)
+    sizes = [base] * sellers
+    for owner in owners:
+        sizes[owner] += 1
+    return sizes
+
+
+def listing_rows(rng, sizes, templates, leaves, first_id, review_b, listing):
+    """Listings grouped by seller; fills the per-listing arrays in ``listing``."""
+    listing_id = first_id
+    for seller, size in enumerate(sizes):
+        seller_email = email('s', seller)
+        for _ in range(size):
+            category, title, name, description, price = rng.choice(templates)
+            if category in leaves:
+                category = rng.choice(leaves[category])
+            price = round(max(1.0, price * rng.uniform(0.7, 1.3)), 2)
+            status = rng.choice(STATUSES)
+            listing['seller'].append(seller)
+            listing['price'].append(price)
+            listing['active'].append(status == '1')
+            listing['review_p'].append(rng.betavariate(2.0, review_b))
+            listing['quality'].append(min(5.0, max(1.0, rng.gauss(4.0, 0.6))))
+            yield (seller_email, listing_id, category, title, name, description,
+                   rng.randint(0, 500), price, status)
+            listing_id += 1
+
+
+def order_batches(rng, count, buyers, listing, first_listing, first_order, zipf_s):
+    """Orders with their reviews, CHUNK orders at a time."""
+    listings = len(listing['seller'])
+    # popularity rank -> listing: a shuffled permutation so popular listings
+    # are spread across sellers and categories
+    ranked = list(range(listings))
+    rng.shuffle(ranked)
+    listing_cw = cumulative(zipf_weights(listings, zipf_s))
+    buyer_order = list(range(buyers))
+    rng.shuffle(buyer_order)
+    buyer_cw = cumulative(zipf_weights(buyers, BUYER_ZIPF_S))
+    span = (LAST_DAY - FIRST_DAY).days
+    days = [(FIRST_DAY + datetime.timedelta(days=d)).isoformat() for d in range(span + 1)]
+    sellers = {}
+    order_sql = '''INSERT INTO Orders (order_id, seller_email, listing_id, buyer_email, date,
+                   quantity, payment) VALUES (?, ?, ?, ?, ?, ?, ?)'''
+    review_sql = 'INSERT INTO Reviews (order_id, review_desc, rating) VALUES (?, ?, ?)'
+    n = 0
+    while n < count:
+        size = min(CHUNK, count - n)
+        picks = rng.choices(ranked, cum_weights=listing_cw, k=size)
+        who = rng.choices(buyer_order, cum_weights=buyer_cw, k=size)
+        quantities = rng.choices((1, 2, 3, 4, 5), weights=(60, 25, 10, 3, 2), k=size)
+        orders, reviews = [], []
+        for i, quantity, buyer in zip(picks, quantities, who):
+            order_id = first_order + n
+            # volume grows linearly over time: the k-th order is at sqrt(k / count) of the span
+            day = days[int(span * ((n + 0.5) / count) ** 0.5)]
+            seller = listing['seller'][i]
+            seller_email = sellers.get(seller) or sellers.setdefault(seller, email('s', seller))
+            orders.append((order_id, seller_email, first_listing + i, email('b', buyer), day, quantity,
+                           round(listing['price'][i] * quantity, 2)))
+            if rng.random() < listing['review_p'][i]:
+                rating = min(5, max(1, round(rng.gauss(listing['quality'][i], 1.0))))
+                reviews.append((order_id, REVIEW_TEXTS[rating], rating))
+            n += 1
+        yield [('Orders', order_sql, orders), ('Reviews', review_sql, reviews)]
+
+
+def request_rows(rng, count, buyers, sellers, staff, first_request):
+    for n in range(count):
+        request_type = rng.choice(REQUEST_TYPES)
+        sender = email('b', rng.randrange(buyers)) if rng.random() < 0.8 or not sellers \
+            else email('s', rng.randrange(sellers))
+        roll = rng.random()
+        if roll < 0.05:
+            owner, status = request_queue.POOL_EMAIL, request_queue.UNASSIGNED
+        else:
+            owner = rng.choice(staff)
+            status = request_queue.ASSIGNED if roll < 0.1 else request_queue.COMPLETED
+        yield (first_request + n, sender, owner, request_type, f'Generated {request_type} request', status)
+
+
+def cart_rows(rng, buyers, listing, first_listing):
+    active = [i for i, ok in enumerate(listing['active']) if ok]
+    if not active:
+        return
+    added_at = f'{LAST_DAY.isoformat()} 12:00:00'
+    for n in range(buyers):
+        if rng.random() >= CART_RATE:
+            continue
+        for i in sorted(set(rng.choices(active, k=rng.randint(1, 3)))):
+            yield (email('b', n), first_listing + i, rng.randint(1, 3), added_at)
+#=======================Generators=======================#
+
+
+def _secondary_indexes(conn):
+    return conn.execute(
+        f'''SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+              AND tbl_name IN ({', '.join('?' * len(LOADED_TABLES))})
+            ORDER BY name''',
+        LOADED_TABLES
+    ).fetchall()
+
+
+def generate(conn, sellers, buyers, listings, orders, requests=0, staff=0, review_rate=0.3,
+             zipf_s=ZIPF_S, seller_alpha=SELLER_ALPHA, category_depth=CATEGORY_DEPTH,
+             category_fanout=CATEGORY_FANOUT, seed=1, digest=False, log=print):
+    """Append the synthetic rows to ``conn`` and rebuild the derived tables.
+
+    Returns (row counts per table, digest or None).
+    """
+    rng = random.Random(seed)
+    writer = Writer(conn, digest, log)
+    previous = bulk_import._set_pragmas(conn, bulk_import.BULK_PRAGMAS)
+    indexes = _secondary_indexes(conn)
+    try:
+        for name, _ in indexes:
+            conn.execute(f'DROP INDEX "{name}"')
+        conn.commit()
+
+        zipcodes = [row[0] for row in conn.execute('SELECT zipcode FROM Zipcode_Info ORDER BY zipcode')]
+        templates = [tuple(row) for row in conn.execute(
+            '''SELECT category, product_title, product_name, product_description, product_price
+               FROM Product_Listings ORDER BY listing_id'''
+        )]
+        first_listing = conn.execute('SELECT COALESCE(MAX(listing_id), 0) + 1 FROM Product_Listings').fetchone()[0]
+        first_order = conn.execute('SELECT COALESCE(MAX(order_id), 0) + 1 FROM Orders').fetchone()[0]
+        first_request = conn.execute('SELECT COALESCE(MAX(request_id), 0) + 1 FROM Requests').fetchone()[0]
+        first_card = 9000000000000000 + conn.execute('SELECT COUNT(*) FROM Credit_Cards').fetchone()[0]
+
+        # one hash for every generated account: hashing millions of passwords
+        # with a real KDF would take longer than the rest of the run
+        password = password_hash(seed)
+        writer.rows('Users', 'INSERT INTO Users (email, password) VALUES (?, ?)',
+                    ((email(role, n), password) for role, total in (('h', staff), ('s', sellers), ('b', buyers))
+                     for n in range(total)))
+        writer.rows('Helpdesk', 'INSERT INTO Helpdesk (email, position) VALUES (?, ?)', staff_rows(rng, staff))
+
+        category_rows, leaves = category_tree(conn, category_depth, category_fanout)
+        writer.rows('Categories', 'INSERT INTO Categories (parent_category, category_name) VALUES (?, ?)',
+                    category_rows)
+
+        seller_addresses, buyer_addresses = [], []
+        address_sql = 'INSERT INTO Address (address_ID, zipcode, street_num, street_name) VALUES (?, ?, ?, ?)'
+        writer.rows('Address', address_sql, address_rows(rng, sellers, zipcodes, seller_addresses))
+        writer.rows('Address', address_sql, address_rows(rng, buyers, zipcodes, buyer_addresses))
+        writer.rows('Sellers', '''INSERT INTO Sellers (email, business_name, business_address_id,
+                                  bank_routing_number, bank_account_number, balance) VALUES (?, ?, ?, ?, ?, ?)''',
+                    seller_rows(rng, sellers, seller_addresses))
+        writer.rows('Buyer', 'INSERT INTO Buyer (email, business_name, buyer_address_id) VALUES (?, ?, ?)',
+                    buyer_rows(rng, buyers, buyer_addresses))
+        writer.rows('Credit_Cards', '''INSERT INTO Credit_Cards (credit_card_num, card_type, expire_month,
+                                       expire_year, security_code, owner_email) VALUES (?, ?, ?, ?, ?, ?)''',
+                    card_rows(rng, buyers, first_card))
+        del seller_addresses, buyer_addresses
+
+        # per-listing attributes the orders need, kept in compact arrays
+        review_b = 2.0 / min(max(review_rate, 0.01), 0.99) - 2.0  #<- Beta(2, b) has mean review_rate
+        listing = {'seller': array.array('l'), 'price': array.array('d'), 'active': array.array('b'),
+                   'review_p': array.array('d'), 'quality': array.array('d')}
+        sizes = seller_sizes(rng, sellers, listings, seller_alpha) if sellers else []
+        writer.rows('Product_Listings', '''INSERT INTO Product_Listings (seller_email, listing_id, category,
+                                           product_title, product_name, product_description, quantity,
+                                           product_price, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    listing_rows(rng, sizes, templates, leaves, first_listing, review_b, listing))
+        if orders and listing['seller'] and buyers:
+            writer.batches('Orders',
+                           order_batches(rng, orders, buyers, listing, first_listing, first_order, zipf_s))
+            log(f"{'Reviews':<17} {writer.counts.get('Reviews', 0):>10} rows")
+        staff_emails = [email('h', n) for n in range(staff)] or [row[0] for row in conn.execute(
+            'SELECT email FROM Helpdesk WHERE email != ? ORDER BY email', (request_queue.POOL_EMAIL,)
+        )]
+        if requests and buyers and staff_emails:
+            writer.rows('Requests', '''INSERT INTO Requests (request_id, sender_email, helpdesk_staff_email,
+                                       request_type, request_desc, request_status) VALUES (?, ?, ?, ?, ?, ?)''',
+                        request_rows(rng, requests, buyers, sellers, staff_emails, first_request))
+        writer.rows('Cart_Items', 'INSERT INTO Cart_Items (buyer_email, listing_id, quantity, added_at) VALUES (?, ?, ?, ?)',
+                    cart_rows(rng, buyers, listing, first_listing))
+
+        started = time.perf_counter()
+        for name, sql in indexes:
+            conn.execute(sql)
+        # seller balances follow their generated sales
+        conn.execute(
+            f'''UPDATE Sellers SET balance = COALESCE(
+                   (SELECT SUM(payment) FROM Orders o WHERE o.seller_email = Sellers.email), 0)
+                WHERE email LIKE '%@{EMAIL_DOMAIN}' '''
+        )
+        conn.commit()
+        log(f"{'indexes, balances':<17} {'':>10}      {time.perf_counter() - started:>7.1f}s")
+
+        started = time.perf_counter()
+        for rebuild in (taxonomy.rebuild_hierarchy, taxonomy.bump_version, search.rebuild, ratings.rebuild,
+                        seller_analytics.rebuild, request_queue.rebuild, market_analysis.invalidate,
+                        catalog_cache.invalidate):
+            rebuild(conn)
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+        log(f"{'derived tables':<17} {'':>10}      {time.perf_counter() - started:>7.1f}s")
+    except BaseException:
+        conn.rollback()
+        for name, sql in indexes:  #<- leave the schema as it was, even on a failed run
+            conn.execute(sql.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+        conn.commit()
+        raise
+    finally:
+        bulk_import._set_pragmas(conn, previous)
+    return writer.counts, writer.digest()
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Generate a scaled-up copy of the database for benchmarks.')
+    parser.add_argument('--out', required=True, help='database file to write (overwritten)')
+    parser.add_argument('--source', default='database.db')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    for name in ('sellers', 'buyers', 'listings', 'orders', 'requests', 'staff'):
+        parser.add_argument(f'--{name}', type=int, help=f'override the preset number of {name}')
+    parser.add_argument('--review-rate', type=float, default=0.3, help='mean fraction of orders with a review')
+    parser.add_argument('--zipf', type=float, default=ZIPF_S, help='listing popularity exponent')
+    parser.add_argument('--seller-alpha', type=float, default=SELLER_ALPHA, help='Pareto shape of seller sizes')
+    parser.add_argument('--category-depth', type=int, default=CATEGORY_DEPTH)
+    parser.add_argument('--category-fanout', type=int, default=CATEGORY_FANOUT)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--digest', action='store_true', help='print a SHA-256 of the generated rows')
+    opts = parser.parse_args(args)
+
+    sizes = dict(PRESETS[opts.preset])
+    for name in sizes:
+        if getattr(opts, name) is not None:
+            sizes[name] = getattr(opts, name)
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(opts.out + suffix):
+            os.remove(opts.out + suffix)
+    shutil.copy(opts.source, opts.out)
+    conn = sqlite3.connect(opts.out)
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+
+    started = time.perf_counter()
+    print(f"Generating {', '.join(f'{v} {k}' for k, v in sizes.items())} (seed {opts.seed}) into {opts.out}")
+    counts, digest = generate(
+        conn, review_rate=opts.review_rate, zipf_s=opts.zipf, seller_alpha=opts.seller_alpha,
+        category_depth=opts.category_depth, category_fanout=opts.category_fanout,
+        seed=opts.seed, digest=opts.digest, **sizes
+    )
+    conn.close()
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    print(f'{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s); log in as '
+          f"{email('b', 0)} / {email('s', 0)} / {email('h', 0)} with password '{PASSWORD}'")
+    if digest:
+        print(f'digest {digest}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
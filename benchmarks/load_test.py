@@ -0,0 +1,328 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+import credentials
+import request_queue
+
+# End-to-end load test: scripted user journeys through the Flask app.
+#
+#   python benchmarks/load_test.py [--db database.db] [--journeys 200] [--concurrency 4]
+#       [--seed 1] [--baseline benchmarks/baseline.json] [--save-baseline FILE]
+#       [--tolerance 1.5]
+#
+# Runs against a copy of --db (build a big one with benchmarks/datagen.py)
+# through Flask's test client, one client per journey, --concurrency
+# journeys at a time. The journeys are mixed by MIX:
+#
+#   buyer     login -> dashboard -> search -> product -> checkout (GET, POST)
+#             -> orders tab -> review -> logout
+#   seller    login -> dashboard -> analytics -> logout
+#   helpdesk  login -> assigned tab -> claim from the pool if nothing is
+#             assigned -> view request -> complete -> completed tab -> logout
+#
+# Per route it reports p50/p95/p99 latency, requests per second over the run,
+# and SQL statements and SQL time per request (from profiling.py's /metrics
+# counters). --save-baseline writes the numbers as JSON; --baseline compares
+# against such a file and exits 1 when a route's p95 grew by more than
+# --tolerance times (and MIN_DELTA_MS, on routes with MIN_SAMPLES requests)
+# or it issues more statements per request than before.
+
+MIX = {'buyer': 7, 'seller': 2, 'helpdesk': 1}
+PASSWORD = 'benchmark'
+USERS_PER_ROLE = 50
+OK = (200, 302)
+MIN_SAMPLES = 50  #<- routes with fewer requests are too noisy to judge latency on
+MIN_DELTA_MS = 5.0
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+#=======================Setup=======================#
+def prepare(source, directory, journeys, seed):
+    """Copy the database and pick the accounts, listings and search terms the journeys use."""
+    database = os.path.join(directory, 'load_test.db')
+    shutil.copy(source, database)
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    rng = random.Random(seed)
+
+    buyers = [row[0] for row in conn.execute(
+        'SELECT owner_email FROM Credit_Cards GROUP BY owner_email ORDER BY owner_email LIMIT ?',
+        (USERS_PER_ROLE,)
+    )]
+    sellers = [row[0] for row in conn.execute(
+        '''SELECT seller_email FROM Product_Listings WHERE status = '1'
+           GROUP BY seller_email ORDER BY COUNT(*) DESC, seller_email LIMIT ?''',
+        (USERS_PER_ROLE,)
+    )]
+    staff = [row[0] for row in conn.execute(
+        'SELECT email FROM Helpdesk WHERE email != ? ORDER BY email', (request_queue.POOL_EMAIL,)
+    )]
+    listings = [row[0] for row in conn.execute(
+        "SELECT listing_id FROM Product_Listings WHERE status = '1' AND quantity > 0 ORDER BY listing_id"
+    )]
+    listings = rng.sample(listings, min(len(listings), 2000))
+    words = sorted({w.lower() for row in conn.execute(
+        "SELECT product_name FROM Product_Listings WHERE listing_id IN (%s)" % ','.join('?' * min(len(listings), 500)),
+        listings[:500]
+    ) for w in str(row[0]).split() if len(w) > 3})
+
+    # known password for the accounts we log in as, hashed like a real one
+    password = generate_password_hash(PASSWORD, credentials.DEFAULT_METHOD)
+    conn.executemany('UPDATE Users SET password = ? WHERE email = ?',
+                     [(password, e) for e in buyers + sellers + staff])
+    # something in the pool for every helpdesk journey to claim
+    sender = buyers[0] if buyers else staff[0]
+    conn.executemany(
+        '''INSERT INTO Requests (sender_email, helpdesk_staff_email, request_type, request_desc, request_status)
+           VALUES (?, ?, 'ChangeID', 'load test', ?)''',
+        [(sender, request_queue.POOL_EMAIL, request_queue.UNASSIGNED)] * journeys
+    )
+    conn.commit()
+    conn.close()
+    return database, {'buyer': buyers, 'seller': sellers, 'helpdesk': staff,
+                      'listings': listings, 'words': words or ['a']}
+#=======================Setup=======================#
+
+
+#=======================Journeys=======================#
+class Journey:
+    """One logged-in session; step() times a request and files it under its endpoint."""
+
+    def __init__(self, app, results, lookup):
+        self.client = app.test_client()
+        self.urls = app.url_map.bind('localhost')
+        self.results = results
+        self.lookup = lookup
+
+    def step(self, method, url, **kw):
+        endpoint = self.urls.match(url, method.upper())[0]  #<- same names as /metrics uses
+        started = time.perf_counter()
+        response = getattr(self.client, method)(url, **kw)
+        elapsed = time.perf_counter() - started
+        self.results.append((endpoint, elapsed, response.status_code in OK))
+        return response
+
+    def login(self, email):
+        self.step('post', '/login', data={'email': email, 'password': PASSWORD})
+
+    def logout(self):
+        self.step('get', '/logout')
+
+
+def buyer_journey(journey, email, data, rng):
+    journey.login(email)
+    journey.step('get', '/buyer_dashboard')
+    journey.step('get', '/product/search', query_string={'query': rng.choice(data['words'])})
+    listing_id = rng.choice(data['listings'])
+    journey.step('get', f'/product/{listing_id}')
+    journey.step('get', f'/checkout/{listing_id}')
+    card = journey.lookup('SELECT credit_card_num FROM Credit_Cards WHERE owner_email = ? LIMIT 1', email)
+    journey.step('post', f'/checkout/{listing_id}',
+                 data={'quantity': '1', 'payment_method': card or ''})
+    journey.step('get', '/buyer_dashboard', query_string={'tab': 'orders'})
+    order_id = journey.lookup(
+        '''SELECT MAX(o.order_id) FROM Orders o
+           WHERE o.buyer_email = ? AND NOT EXISTS (SELECT 1 FROM Reviews r WHERE r.order_id = o.order_id)''',
+        email
+    )
+    if order_id:
+        journey.step('post', '/submit_review',
+                     data={'order_id': order_id, 'rating': str(rng.randint(1, 5)), 'review_text': 'load test'})
+    journey.logout()
+
+
+def seller_journey(journey, email, data, rng):
+    journey.login(email)
+    journey.step('get', '/seller_dashboard')
+    journey.step('get', '/seller/analytics',
+                 query_string={'granularity': rng.choice(('day', 'month'))})
+    journey.logout()
+
+
+def helpdesk_journey(journey, email, data, rng):
+    journey.login(email)
+    journey.step('get', '/helpdesk_dashboard', query_string={'tab': 'assigned'})
+    assigned = '''SELECT MIN(request_id) FROM Requests
+                  WHERE helpdesk_staff_email = ? AND request_status = ? AND request_type != 'Add New Category' '''
+    request_id = journey.lookup(assigned, email, request_queue.ASSIGNED)
+    if request_id is None:
+        pooled = journey.lookup(
+            'SELECT MIN(request_id) FROM Requests WHERE helpdesk_staff_email = ? AND request_status = ?',
+            request_queue.POOL_EMAIL, request_queue.UNASSIGNED
+        )
+        if pooled is not None:
+            journey.step('get', f'/claim_request/{pooled}')
+            request_id = journey.lookup(assigned, email, request_queue.ASSIGNED)
+    if request_id is not None:
+        journey.step('get', f'/view_request/{request_id}')
+        journey.step('get', f'/complete_request/{request_id}')
+    journey.step('get', '/helpdesk_dashboard', query_string={'tab': 'completed'})
+    journey.logout()
+
+
+JOURNEYS = {'buyer': buyer_journey, 'seller': seller_journey, 'helpdesk': helpdesk_journey}
+#=======================Journeys=======================#
+
+
+def run(app, database, data, journeys, concurrency, seed):
+    """Run ``journeys`` journeys on ``concurrency`` threads. Returns (results, seconds)."""
+    roles = [role for role, weight in MIX.items() for _ in range(weight) if data[role]]
+    plan = collections.deque((i, roles[i % len(roles)]) for i in range(journeys))
+    results = []
+    local = threading.local()
+    errors = []
+
+    def lookup(sql, *params):
+        if not hasattr(local, 'conn'):
+            local.conn = sqlite3.connect(database, timeout=30)
+        row = local.conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    def worker():
+        while True:
+            try:
+                i, role = plan.popleft()
+            except IndexError:
+                break
+            rng = random.Random(seed * 1000003 + i)
+            users = data[role]
+            try:
+                JOURNEYS[role](Journey(app, results, lookup), users[i % len(users)], data, rng)
+            except Exception as e:  #<- keep going; a broken journey is reported, not fatal
+                errors.append(f'{role} journey {i}: {e!r}')
+        if hasattr(local, 'conn'):
+            local.conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started, errors
+
+
+def summarize(results, seconds, snapshot):
+    by_route = collections.defaultdict(list)
+    failed = collections.Counter()
+    for endpoint, elapsed, ok in results:
+        by_route[endpoint].append(elapsed)
+        if not ok:
+            failed[endpoint] += 1
+    routes = {}
+    for endpoint, timings in sorted(by_route.items()):
+        server = snapshot['routes'].get(endpoint, {})
+        statements = server.get('sql_statements', {})
+        sql_seconds = server.get('sql_seconds', {})
+        served = statements.get('count') or 0
+        routes[endpoint] = {
+            'requests': len(timings),
+            'failed': failed[endpoint],
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'rps': round(len(timings) / seconds, 2) if seconds else 0.0,
+            'sql_per_request': round(statements.get('sum', 0) / served, 2) if served else 0.0,
+            'sql_ms_per_request': round(sql_seconds.get('sum', 0) / served * 1000, 3) if served else 0.0,
+        }
+    return {'requests': len(results), 'seconds': round(seconds, 3),
+            'rps': round(len(results) / seconds, 2) if seconds else 0.0, 'routes': routes}
+
+
+def compare(summary, baseline, tolerance):
+    """Routes that got slower than ``tolerance`` x the baseline p95 or issue more SQL."""
+    regressions = []
+    for endpoint, now in summary['routes'].items():
+        before = baseline.get('routes', {}).get(endpoint)
+        if not before:
+            continue
+        if (now['requests'] >= MIN_SAMPLES and now['p95_ms'] > before['p95_ms'] * tolerance
+                and now['p95_ms'] - before['p95_ms'] > MIN_DELTA_MS):
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if now['sql_per_request'] > before['sql_per_request'] + 0.5:
+            regressions.append(f"{endpoint}: {before['sql_per_request']:.1f} -> "
+                               f"{now['sql_per_request']:.1f} statements per request")
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Load-test the app with scripted user journeys.')
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--journeys', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', help='JSON from --save-baseline to compare against')
+    parser.add_argument('--save-baseline', help='write this run as a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed p95 growth over the baseline')
+    parser.add_argument('--verbose', action='store_true', help="show the app's log (slow queries etc.)")
+    opts = parser.parse_args(args)
+
+    import app as appmod
+    import profiling
+    app = appmod.app
+    if not opts.verbose:
+        app.logger.setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database, data = prepare(opts.db, directory, opts.journeys, opts.seed)
+        app.config['DATABASE'] = database
+        app.config['DB_POOL_SIZE'] = max(app.config['DB_POOL_SIZE'], opts.concurrency)
+        # warm-up: schema check, caches and templates, then measure from zero
+        run(app, database, data, len(MIX), 1, opts.seed + 1)
+        profiling.metrics.reset()
+        results, seconds, errors = run(app, database, data, opts.journeys, opts.concurrency, opts.seed)
+        summary = summarize(results, seconds, profiling.metrics.snapshot())
+        counts = {table: sqlite3.connect(database).execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('Sellers', 'Buyer', 'Product_Listings', 'Orders')}
+        app.extensions['db_pool'].close_all()
+
+    summary['meta'] = {'db': opts.db, 'rows': counts, 'journeys': opts.journeys,
+                       'concurrency': opts.concurrency, 'seed': opts.seed}
+    print(f"{opts.journeys} journeys on {opts.concurrency} threads against {opts.db} "
+          f"({', '.join(f'{v} {k}' for k, v in counts.items())})")
+    print(f"\n{'route':<24} {'reqs':>6} {'fail':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'req/s':>7} {'sql/req':>8} {'sql ms':>7}")
+    for endpoint, r in summary['routes'].items():
+        print(f"{endpoint:<24} {r['requests']:>6} {r['failed']:>5} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['rps']:>7.1f} {r['sql_per_request']:>8.1f} {r['sql_ms_per_request']:>7.2f}")
+    print(f"\n{summary['requests']} requests in {summary['seconds']:.1f}s, {summary['rps']:.1f} req/s")
+    for error in errors[:10]:
+        print('error:', error)
+
+    if opts.save_baseline:
+        with open(opts.save_baseline, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        print(f'Baseline written to {opts.save_baseline}')
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            regressions = compare(summary, json.load(f), opts.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            return 1
+        print(f'No regressions against {opts.baseline}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import credentials
+
+# Logins per second at each password hashing cost.
+#
+#   python benchmarks/password_bench.py [--threads 8] [--workers 2] [--logins 40]
+#       [--methods scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2:sha256:600000]
+#
+# --threads request threads log in concurrently through one Hasher whose
+# pool has --workers hashing threads, which is how the app runs them. Each
+# row reports throughput and per-login latency (queueing included).
+
+DEFAULT_METHODS = [
+    'legacy-sha256',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+]
+
+PASSWORD = 'correct horse battery staple'
+
+
+def run(method, threads, workers, logins):
+    hasher = credentials.Hasher(credentials.DEFAULT_METHOD if method == 'legacy-sha256' else method,
+                                workers=workers)
+    if method == 'legacy-sha256':
+        stored = hashlib.sha256(PASSWORD.encode('utf-8')).hexdigest()
+    else:
+        stored = hasher.hash(PASSWORD)
+
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, logins // threads)
+
+    def worker():
+        mine = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            ok, _ = hasher.verify(stored, PASSWORD)
+            assert ok
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    runners = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    latencies.sort()
+    return {
+        'method': method,
+        'logins': len(latencies),
+        'logins_per_sec': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+    }
+
+
+def main(args):
+    def option(name, default):
+        return type(default)(args[args.index(name) + 1]) if name in args else default
+
+    threads = option('--threads', 8)
+    workers = option('--workers', 2)
+    logins = option('--logins', 40)
+    methods = option('--methods', ','.join(DEFAULT_METHODS)).split(',')
+
+    print(f'{threads} request threads, {workers} hashing workers, {logins} logins per method '
+          f'({os.cpu_count()} CPUs)\n')
+    print(f"{'method':<24} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for method in methods:
+        r = run(method, threads, workers, logins)
+        print(f"{r['method']:<24} {r['logins_per_sec']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
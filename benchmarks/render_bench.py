@@ -0,0 +1,145 @@
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import load_test
+
+# Render time and response size of the dashboards and catalog pages.
+#
+#   python benchmarks/render_bench.py [--db database.db] [--repeat 30]
+#       [--save FILE] [--compare FILE]
+#
+# Logs in one buyer, seller and helpdesk account on a copy of --db (the
+# accounts load_test.py would use) and requests each page in PAGES:
+#
+#   cold ms        the first request for the page in a fresh process, which
+#                  includes compiling its template unless that was done at
+#                  startup
+#   p50 ms         median of --repeat further requests
+#   tmpl ms        mean time inside render_template (profiling.py's counters)
+#   html KB        the response body
+#   first KB       html plus the local CSS/JS it links, i.e. a first visit
+#   repeat KB      what a repeat visit downloads once those are cached
+#
+# Startup time (importing app.py, which precompiles templates when enabled)
+# is printed first. --save writes the numbers as JSON and --compare prints
+# them next to a saved run, e.g. one taken before a template change.
+
+PAGES = [
+    ('buyer', '/buyer_dashboard?tab=products'),
+    ('buyer', '/buyer_dashboard?tab=orders'),
+    ('buyer', '/buyer_dashboard?tab=profile'),
+    ('buyer', '/product/search'),
+    ('buyer', '/product/{listing}'),
+    ('seller', '/seller_dashboard?tab=products'),
+    ('seller', '/seller_dashboard?tab=orders'),
+    ('seller', '/seller_dashboard?tab=analytics'),
+    ('seller', '/seller_dashboard?tab=profile'),
+    ('helpdesk', '/helpdesk_dashboard'),
+]
+
+ASSET_PATTERN = re.compile(r'''<(?:link[^>]+href|script[^>]+src)=["'](/static/[^"']+)["']''')
+
+
+def measure(app, clients, listing, repeat):
+    import profiling
+    urls = app.url_map.bind('localhost')
+    pages = [(role, url.format(listing=listing)) for role, url in PAGES]
+
+    cold = {}
+    for role, url in pages:  #<- first hit of every page before any repeats
+        started = time.perf_counter()
+        response = clients[role].get(url)
+        cold[url] = time.perf_counter() - started
+        assert response.status_code == 200, (url, response.status_code)
+
+    results = {}
+    for role, url in pages:
+        client = clients[role]
+        endpoint = urls.match(url.split('?')[0])[0]
+        profiling.metrics.reset()
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            times.append(time.perf_counter() - started)
+        template = profiling.metrics.snapshot()['routes'][endpoint]['template_seconds']
+        html = len(response.data)
+        assets = sum(len(client.get(path).data) for path in
+                     dict.fromkeys(ASSET_PATTERN.findall(response.get_data(as_text=True))))
+        results[url] = {
+            'cold_ms': round(cold[url] * 1000, 2),
+            'p50_ms': round(statistics.median(times) * 1000, 2),
+            'template_ms': round(template['sum'] / template['count'] * 1000, 2) if template['count'] else None,
+            'html_bytes': html,
+            'first_view_bytes': html + assets,
+            'repeat_view_bytes': html,
+        }
+    return results
+
+
+def report(summary, before=None):
+    print(f"startup {summary['startup_ms']:.0f} ms" +
+          (f" (was {before['startup_ms']:.0f} ms)" if before else ''))
+    print(f"\n{'page':<34} {'cold ms':>8} {'p50 ms':>8} {'tmpl ms':>8} {'html KB':>8} "
+          f"{'first KB':>9} {'repeat KB':>10}")
+    for url, r in summary['pages'].items():
+        print(f"{url:<34} {r['cold_ms']:>8.2f} {r['p50_ms']:>8.2f} {r['template_ms'] or 0:>8.2f} "
+              f"{r['html_bytes'] / 1024:>8.1f} {r['first_view_bytes'] / 1024:>9.1f} "
+              f"{r['repeat_view_bytes'] / 1024:>10.1f}")
+        old = (before or {}).get('pages', {}).get(url)
+        if old:
+            print(f"{'  before':<34} {old['cold_ms']:>8.2f} {old['p50_ms']:>8.2f} {old['template_ms'] or 0:>8.2f} "
+                  f"{old['html_bytes'] / 1024:>8.1f} {old['first_view_bytes'] / 1024:>9.1f} "
+                  f"{old['repeat_view_bytes'] / 1024:>10.1f}")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Measure page render time and response size.')
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--save', help='write the numbers to this JSON file')
+    parser.add_argument('--compare', help='JSON from --save to print alongside')
+    opts = parser.parse_args(args)
+
+    started = time.perf_counter()
+    import app as appmod
+    startup = time.perf_counter() - started
+    app = appmod.app
+    app.logger.setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database, data = load_test.prepare(opts.db, directory, 1, 1)
+        app.config['DATABASE'] = database
+        clients = {}
+        for role in ('buyer', 'seller', 'helpdesk'):
+            clients[role] = app.test_client()
+            response = clients[role].post('/login', data={'email': data[role][0], 'password': load_test.PASSWORD})
+            assert response.status_code == 302, (role, response.status_code)
+        pages = measure(app, clients, data['listings'][0], opts.repeat)
+        app.extensions['db_pool'].close_all()
+
+    summary = {'startup_ms': round(startup * 1000, 1), 'pages': pages,
+               'meta': {'db': opts.db, 'repeat': opts.repeat}}
+    before = None
+    if opts.compare:
+        with open(opts.compare) as f:
+            before = json.load(f)
+    report(summary, before)
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        print(f'\nWritten to {opts.save}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
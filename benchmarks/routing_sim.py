@@ -0,0 +1,246 @@
+import argparse
+import collections
+import csv
+import heapq
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+import request_queue
+import routing
+
+# Replays Requests.csv-style helpdesk traffic against a copy of the database
+# and compares manual claiming from the shared pool with routing.submit().
+#
+#   python benchmarks/routing_sim.py [--requests 2000] [--rate 20] [--poll 5]
+#       [--think 0.5] [--max-open 1] [--seed 1] [--db database.db] [--csv Requests.csv]
+#
+# Time is simulated (minutes); the SQL is real. Requests arrive as a Poisson
+# stream at --rate per hour with the request type mix of --csv, and each
+# type takes an exponentially distributed time to handle (SERVICE_MINUTES).
+#
+#   pool    every request lands on the pool account. Idle staff look at the
+#           unassigned tab every --poll minutes, pick the oldest request and
+#           claim it --think minutes later; if someone else got there first
+#           the claim fails ("conflicts") and they look again.
+#   routed  routing.submit() assigns each request as it is written; staff
+#           work through their own queue oldest first. Requests routing left
+#           in the pool (everyone at --max-open) are handed out by
+#           routing.pull() as each staff member finishes one.
+#
+# "wait" is arrival to the start of handling, "resolve" is arrival to done.
+
+SERVICE_MINUTES = {
+    'changeid': 10,
+    'addnewcategory': 15,
+    'addcategory': 15,
+    'marketanalysis': 45,
+    'technicalsupport': 20,
+}
+DEFAULT_SERVICE = 20
+
+POOL_OLDEST_SQL = '''
+    SELECT request_id FROM Requests
+    WHERE helpdesk_staff_email = ? AND request_status = ?
+    ORDER BY request_id LIMIT 1
+'''
+
+
+def load_mix(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        types = [row['request_type'] for row in csv.DictReader(f) if row.get('request_type')]
+    return types or list(SERVICE_MINUTES)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def prepare(source, directory):
+    database = os.path.join(directory, 'routing_sim.db')
+    shutil.copy(source, database)
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn)
+    conn.execute('DELETE FROM Requests')  #<- the triggers zero Request_Queue_Counts as rows go
+    conn.execute('DELETE FROM Helpdesk_Routing')
+    conn.commit()
+    staff = [row[0] for row in conn.execute(
+        'SELECT email FROM Helpdesk WHERE email != ? ORDER BY email', (request_queue.POOL_EMAIL,)
+    )]
+    sender = conn.execute('SELECT email FROM Users LIMIT 1').fetchone()[0]
+    return conn, staff, sender
+
+
+def simulate(conn, staff, sender, strategy, arrivals, opts):
+    rng = random.Random(opts.seed + 1)
+    events, seq = [], 0
+
+    def schedule(at, kind, *payload):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (at, seq, kind, payload))
+
+    arrived, started = {}, {}
+    waits, resolves, submit_ms = [], [], []
+    own = {email: collections.deque() for email in staff}  #<- routed requests not yet started
+    busy = {email: False for email in staff}
+    polling = {email: False for email in staff}
+    handled = collections.Counter()
+    conflicts = 0
+
+    for at, request_type in arrivals:
+        schedule(at, 'arrive', request_type)
+    for i, email in enumerate(staff):
+        schedule(i * opts.poll / len(staff), 'poll', email)  #<- staggered first look
+
+    def start(email, request_id, request_type, now):
+        busy[email] = True
+        started[request_id] = now
+        waits.append(now - arrived[request_id])
+        mean = SERVICE_MINUTES.get(routing.normalize_type(request_type), DEFAULT_SERVICE)
+        schedule(now + rng.expovariate(1.0 / mean), 'done', email, request_id)
+
+    def next_own(email, now):
+        if own[email]:
+            request_id, request_type = own[email].popleft()
+            start(email, request_id, request_type, now)
+            return True
+        return False
+
+    now = 0.0
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+
+        if kind == 'arrive':
+            (request_type,) = payload
+            started_at = time.perf_counter()
+            if strategy == 'routed':
+                request_id, email = routing.submit(conn, sender, request_type, 'simulated', opts.max_open)
+            else:
+                request_id = conn.execute(
+                    '''INSERT INTO Requests
+                       (sender_email, helpdesk_staff_email, request_type, request_desc, request_status)
+                       VALUES (?, ?, ?, 'simulated', ?) RETURNING request_id''',
+                    (sender, request_queue.POOL_EMAIL, request_type, request_queue.UNASSIGNED)
+                ).fetchone()[0]
+                conn.commit()
+                email = None
+            submit_ms.append((time.perf_counter() - started_at) * 1000)
+            arrived[request_id] = now
+            if email:
+                own[email].append((request_id, request_type))
+                if not busy[email]:
+                    next_own(email, now)
+
+        elif kind == 'poll':
+            (email,) = payload
+            polling[email] = False
+            if busy[email] or next_own(email, now):
+                continue
+            row = conn.execute(POOL_OLDEST_SQL, (request_queue.POOL_EMAIL, request_queue.UNASSIGNED)).fetchone()
+            if row is None:
+                polling[email] = True
+                schedule(now + opts.poll, 'poll', email)
+            else:
+                busy[email] = True  #<- reading the request before claiming it
+                schedule(now + opts.think, 'claim', email, row[0])
+
+        elif kind == 'claim':
+            email, request_id = payload
+            claimed = request_queue.claim(conn, request_id, email)
+            conn.commit()
+            busy[email] = False
+            if claimed is None:
+                conflicts += 1
+                schedule(now, 'poll', email)
+            else:
+                start(email, request_id, claimed['request_type'], now)
+
+        elif kind == 'done':
+            email, request_id = payload
+            conn.execute(
+                'UPDATE Requests SET request_status = ? WHERE request_id = ?',
+                (request_queue.COMPLETED, request_id)
+            )
+            conn.commit()
+            busy[email] = False
+            handled[email] += 1
+            resolves.append(now - arrived[request_id])
+            if next_own(email, now):
+                continue
+            if strategy == 'routed':
+                pulled = routing.pull(conn, email, opts.max_open)
+                conn.commit()
+                if pulled is not None:
+                    start(email, pulled['request_id'], pulled['request_type'], now)
+                    continue
+            if not polling[email]:
+                schedule(now, 'poll', email)
+
+        if not events or all(k == 'poll' for _, _, k, _ in events):
+            if len(resolves) == len(arrivals):
+                break
+
+    loads = [handled[email] for email in staff]
+    return {
+        'strategy': strategy,
+        'requests': len(resolves),
+        'makespan_h': now / 60,
+        'wait_p50': percentile(waits, 50),
+        'wait_p95': percentile(waits, 95),
+        'wait_p99': percentile(waits, 99),
+        'resolve_p95': percentile(resolves, 95),
+        'conflicts': conflicts,
+        'load_min': min(loads) if loads else 0,
+        'load_max': max(loads) if loads else 0,
+        'submit_ms_p99': percentile(submit_ms, 99),
+    }
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Simulate helpdesk request routing.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=20.0, help='arrivals per hour')
+    parser.add_argument('--poll', type=float, default=5.0, help='minutes between unassigned-tab checks')
+    parser.add_argument('--think', type=float, default=0.5, help='minutes from seeing a request to claiming it')
+    parser.add_argument('--max-open', type=int, default=routing.MAX_OPEN)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--csv', default='Requests.csv')
+    opts = parser.parse_args(args)
+
+    mix = load_mix(opts.csv)
+    rng = random.Random(opts.seed)
+    at, arrivals = 0.0, []
+    for _ in range(opts.requests):
+        at += rng.expovariate(opts.rate / 60.0)
+        arrivals.append((at, rng.choice(mix)))
+
+    print(f'{opts.requests} requests at {opts.rate:g}/h, type mix from {opts.csv}: '
+          + ', '.join(f'{t} {n}' for t, n in collections.Counter(mix).most_common()))
+    print(f"\n{'strategy':<8} {'wait p50':>9} {'p95':>8} {'p99':>8} {'resolve p95':>12} "
+          f"{'conflicts':>9} {'per staff':>10} {'submit p99':>11} {'hours':>6}")
+    with tempfile.TemporaryDirectory() as directory:
+        for strategy in ('pool', 'routed'):
+            conn, staff, sender = prepare(opts.db, directory)
+            r = simulate(conn, staff, sender, strategy, arrivals, opts)
+            conn.close()
+            print(f"{r['strategy']:<8} {r['wait_p50']:>8.1f}m {r['wait_p95']:>7.1f}m {r['wait_p99']:>7.1f}m "
+                  f"{r['resolve_p95']:>11.1f}m {r['conflicts']:>9} {r['load_min']:>4}-{r['load_max']:<5} "
+                  f"{r['submit_ms_p99']:>9.2f}ms {r['makespan_h']:>6.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,112 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ratings
+import search
+
+# Compares the old LIKE-based /product/search query with the FTS5 index at
+# several multiples of the checked-in catalog.
+#
+#   python benchmarks/search_bench.py [--scales 10,100,1000] [--repeat 20]
+
+QUERIES = ['tv', 'apple watch', 'mixing bowl', 'samsung galaxy', 'bodysuit', 'zzz no match', '!!!']
+
+
+def legacy_like_query(query):
+    """The pre-FTS search query, kept verbatim for comparison."""
+    sql = '''
+        SELECT pl.*, s.business_name AS seller_name,
+            lr.avg_rating AS avg_rating,
+            COALESCE(lr.rating_count, 0) AS review_count
+        FROM Product_Listings pl
+        JOIN Sellers s ON pl.Seller_Email = s.email
+        LEFT JOIN Listing_Ratings lr
+          ON lr.seller_email = pl.Seller_Email AND lr.listing_id = pl.Listing_ID
+        WHERE pl.Status = 1
+        AND (
+            pl.Product_Title LIKE ? OR
+            pl.Product_Description LIKE ? OR
+            s.business_name LIKE ?
+        ) ORDER BY
+            CASE WHEN pl.Product_Title LIKE ? THEN 3
+                 WHEN pl.Product_Description LIKE ? THEN 2
+                 WHEN s.business_name LIKE ? THEN 1
+                 ELSE 0
+            END DESC'''
+    param = f'%{query}%'
+    return sql, [param] * 6
+
+
+def scale_listings(conn, factor):
+    """Duplicate every listing `factor - 1` more times under new listing ids."""
+    if factor <= 1:
+        return
+    max_id = conn.execute('SELECT MAX(listing_id) FROM Product_Listings').fetchone()[0]
+    conn.execute('''
+        INSERT INTO Product_Listings
+            (seller_email, listing_id, category, product_title, product_name,
+             product_description, quantity, product_price, status)
+        WITH RECURSIVE copies(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM copies WHERE n < ?)
+        SELECT seller_email, listing_id + n * ?, category, product_title, product_name,
+               product_description, quantity, product_price, status
+        FROM Product_Listings, copies
+    ''', (factor - 1, max_id))
+    conn.commit()
+
+
+def time_query(conn, sql, params, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(conn.execute(sql, params).fetchall())
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, rows
+
+
+def run(source, scales, repeat):
+    print(f"{'scale':>6} {'listings':>9} {'query':<22} {'LIKE ms':>9} {'FTS ms':>9} {'speedup':>8} {'LIKE rows':>9} {'FTS rows':>9}")
+    for factor in scales:
+        workdir = tempfile.mkdtemp()
+        path = os.path.join(workdir, 'bench.db')
+        shutil.copy(source, path)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        scale_listings(conn, factor)
+        conn.executescript(ratings.SCHEMA)
+        ratings.rebuild(conn)
+        conn.executescript('DROP TABLE IF EXISTS Listing_Search;' + search.SCHEMA)
+        search.rebuild(conn)
+        conn.commit()
+        listings = conn.execute('SELECT COUNT(*) FROM Product_Listings').fetchone()[0]
+
+        for query in QUERIES:
+            like_ms, like_rows = time_query(conn, *legacy_like_query(query), repeat)
+            fts_ms, fts_rows = time_query(conn, *search.build_search_query(query), repeat)
+            print(f'{factor:>6} {listings:>9} {query:<22} {like_ms:>9.2f} {fts_ms:>9.2f} '
+                  f'{like_ms / fts_ms if fts_ms else 0:>7.1f}x {like_rows:>9} {fts_rows:>9}')
+        conn.close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    scales = [10, 100, 1000]
+    repeat = 20
+    database = 'database.db'
+    args = sys.argv[1:]
+    while args:
+        arg = args.pop(0)
+        if arg == '--scales':
+            scales = [int(x) for x in args.pop(0).split(',')]
+        elif arg == '--repeat':
+            repeat = int(args.pop(0))
+        else:
+            database = arg
+    run(database, scales, repeat)
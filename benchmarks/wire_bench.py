@@ -0,0 +1,169 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test
+import render_bench
+
+# Bytes on the wire and time to first byte per route, by content encoding.
+#
+#   python benchmarks/wire_bench.py [--db database.db] [--repeat 20] [--build]
+#       [--save FILE]
+#
+# Serves a copy of --db on a local port with werkzeug's threaded server and
+# logs in one buyer, seller and helpdesk account (the accounts load_test.py
+# would use). Each route below, plus every local CSS/JS file the pages link,
+# is requested --repeat times per encoding: identity (no Accept-Encoding),
+# gzip, and br when the brotli package is installed. For each it reports
+#
+#   KB       status line, headers and body as received, i.e. on the wire
+#   TTFB ms  median time from sending the request to having the response
+#            headers, on a fresh connection
+#
+# and then, per page, the bytes of a first view (page and assets) and a
+# repeat view (page only, assets cached). --build runs
+# `python templating.py build` first, so assets are served from their hashed
+# names with the precompressed copies; without it they are sent as they are.
+
+EXTRA_ROUTES = [
+    ('buyer', '/buyer_dashboard/tab/orders'),
+    ('seller', '/seller_dashboard/tab/products'),
+    ('seller', '/seller/category_options'),
+]
+
+
+def fetch(port, path, cookie, accept=None):
+    """Return (status, headers, wire bytes, ttfb seconds) for one GET on a new connection."""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Cookie': cookie}
+    if accept:
+        headers['Accept-Encoding'] = accept
+    started = time.perf_counter()
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()  #<- returns once the status line and headers are in
+    ttfb = time.perf_counter() - started
+    body = response.read()
+    conn.close()
+    head = len(f'HTTP/1.1 {response.status} {response.reason}\r\n') + 2
+    head += sum(len(name) + len(value) + 4 for name, value in response.getheaders())
+    return response.status, dict(response.getheaders()), head + len(body), ttfb, body
+
+
+def login(port, email):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/login', body=f'email={email}&password={load_test.PASSWORD}',
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    assert response.status == 302, (email, response.status)
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def measure(port, cookies, listing, encodings, repeat):
+    pages = [(role, url.format(listing=listing)) for role, url in render_bench.PAGES]
+    routes = pages + EXTRA_ROUTES
+    assets = {}  #<- page -> the local CSS/JS it links
+    results = {}
+    for role, url in routes:
+        results[url] = {}
+        for name, accept in encodings:
+            sizes, times = [], []
+            for _ in range(repeat):
+                status, headers, size, ttfb, body = fetch(port, url, cookies[role], accept)
+                assert status == 200, (url, status)
+                sizes.append(size)
+                times.append(ttfb)
+            results[url][name] = {'bytes': statistics.median(sizes),
+                                  'ttfb_ms': round(statistics.median(times) * 1000, 2),
+                                  'encoding': headers.get('Content-Encoding', 'identity')}
+            if name == 'identity' and (role, url) in pages:
+                assets[url] = list(dict.fromkeys(render_bench.ASSET_PATTERN.findall(body.decode('utf-8'))))
+    for url in dict.fromkeys(path for linked in assets.values() for path in linked):
+        results[url] = {}
+        for name, accept in encodings:
+            status, headers, size, ttfb, _ = fetch(port, url, cookies['buyer'], accept)
+            assert status == 200, (url, status)
+            results[url][name] = {'bytes': size, 'ttfb_ms': round(ttfb * 1000, 2),
+                                  'encoding': headers.get('Content-Encoding', 'identity')}
+    views = {}
+    for url, linked in assets.items():
+        views[url] = {name: {'first_view_bytes': results[url][name]['bytes'] +
+                             sum(results[path][name]['bytes'] for path in linked),
+                             'repeat_view_bytes': results[url][name]['bytes']}
+                      for name, _ in encodings}
+    return results, views
+
+
+def report(results, views, encodings):
+    names = [name for name, _ in encodings]
+    print(f"{'route':<52}" + ''.join(f'{name + " KB":>12}' for name in names) +
+          ''.join(f'{name + " TTFB":>14}' for name in names))
+    for url, row in results.items():
+        label = url if len(url) <= 51 else url[:48] + '...'
+        print(f'{label:<52}' + ''.join(f"{row[name]['bytes'] / 1024:>12.1f}" for name in names) +
+              ''.join(f"{row[name]['ttfb_ms']:>14.2f}" for name in names))
+    print(f"\n{'page view':<52}" + ''.join(f'{name + " first":>16}{name + " repeat":>16}' for name in names))
+    for url, row in views.items():
+        print(f'{url:<52}' + ''.join(f"{row[name]['first_view_bytes'] / 1024:>16.1f}"
+                                     f"{row[name]['repeat_view_bytes'] / 1024:>16.1f}" for name in names))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Measure bytes on the wire and time to first byte per route.')
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--build', action='store_true', help='build hashed, precompressed static files first')
+    parser.add_argument('--save', help='write the numbers to this JSON file')
+    opts = parser.parse_args(args)
+
+    import compression
+    import templating
+    if opts.build:
+        templating.build(os.path.join(os.path.dirname(os.path.abspath(templating.__file__)), 'static'))
+    import app as appmod
+    from werkzeug.serving import make_server
+    app = appmod.app
+    app.logger.setLevel(logging.ERROR)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    encodings = [('identity', None), ('gzip', 'gzip')]
+    if compression.brotli is not None:
+        encodings.append(('br', 'br, gzip'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        database, data = load_test.prepare(opts.db, directory, 1, 1)
+        app.config['DATABASE'] = database
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            cookies = {role: login(server.server_port, data[role][0]) for role in ('buyer', 'seller', 'helpdesk')}
+            results, views = measure(server.server_port, cookies, data['listings'][0], encodings, opts.repeat)
+        finally:
+            server.shutdown()
+            app.extensions['db_pool'].close_all()
+
+    report(results, views, encodings)
+    if compression.brotli is None:
+        print('\nbrotli is not installed, so br was not measured')
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump({'routes': results, 'views': views,
+                       'meta': {'db': opts.db, 'repeat': opts.repeat, 'build': opts.build}},
+                      f, indent=2, sort_keys=True)
+        print(f'\nWritten to {opts.save}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
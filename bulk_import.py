@@ -0,0 +1,366 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import catalog_cache
+import market_analysis
+import ratings
+import request_queue
+import search
+import seller_analytics
+import taxonomy
+
+# Bulk loader for CSV / JSONL exports of the app's tables.
+#
+#   python bulk_import.py Product_Listings listings.csv [--db database.db]
+#       [--format csv|jsonl] [--mode replace|insert|ignore]
+#       [--chunk-size 10000] [--commit-every 200000] [--resume] [--no-rebuild]
+#
+# Rows are streamed in chunks through executemany() inside large
+# transactions, with the connection's pragmas switched to bulk-load settings
+# for the duration. Column names and types come from the table itself, so
+# any header order works and every table is handled the same way.
+#
+# Rows that fail conversion or constraints are written, with the reason, to
+# <file>.errors.jsonl instead of stopping the load. After every commit the
+# position is saved to <file>.checkpoint.json; --resume continues from there
+# if the input file hasn't changed.
+
+TABLES = (
+    'Users', 'Buyer', 'Sellers', 'Helpdesk', 'Address', 'Zipcode_Info', 'Categories',
+    'Product_Listings', 'Orders', 'Reviews', 'Credit_Cards', 'Requests',
+)
+
+# Derived tables to rebuild once a load touches their source tables
+REBUILDS = {
+    'Sellers': [search.rebuild, catalog_cache.invalidate],
+    'Categories': [taxonomy.rebuild_hierarchy, taxonomy.bump_version, search.rebuild,
+                   market_analysis.invalidate, catalog_cache.invalidate],
+    'Product_Listings': [search.rebuild, ratings.rebuild, market_analysis.invalidate, catalog_cache.invalidate],
+    'Orders': [ratings.rebuild, seller_analytics.rebuild, market_analysis.invalidate, catalog_cache.invalidate],
+    'Reviews': [ratings.rebuild, seller_analytics.rebuild, market_analysis.invalidate, catalog_cache.invalidate],
+    'Requests': [request_queue.rebuild],  #<- REPLACE's implicit deletes skip the count triggers
+}
+
+BULK_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -262144,  #<- 256 MiB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'OFF',  #<- rows may arrive before the rows they reference
+}
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_COMMIT_EVERY = 200000
+
+
+class BulkImportError(Exception):
+    pass
+
+
+class RowError(ValueError):
+    pass
+
+
+def _columns(conn, table):
+    """[(name, type affinity, required)] for every column of the table."""
+    columns = []
+    for _, name, decl_type, notnull, default, pk in conn.execute(f'PRAGMA table_info("{table}")'):
+        decl_type = (decl_type or '').upper()
+        if 'INT' in decl_type:
+            kind = int
+        elif any(t in decl_type for t in ('REAL', 'FLOA', 'DOUB')):
+            kind = float
+        else:
+            kind = str
+        # an INTEGER PRIMARY KEY can be left out and assigned by SQLite
+        rowid_alias = pk and kind is int and decl_type == 'INTEGER'
+        required = bool((notnull and default is None) or (pk and not rowid_alias))
+        columns.append((name, kind, required))
+    if not columns:
+        raise BulkImportError(f'Table {table} does not exist')
+    return columns
+
+
+def _convert(value, kind):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '' and kind is not str:
+            return None
+    if kind is int:
+        try:
+            return int(value)
+        except ValueError:
+            number = float(value)
+            if not number.is_integer():
+                raise
+            return int(number)
+    if kind is float:
+        return float(value)
+    return str(value)
+
+
+class _Converter:
+    """Maps one input record (dict) onto the table's column order."""
+
+    def __init__(self, columns, fieldnames):
+        by_lower = {name.lower(): (name, kind, required) for name, kind, required in columns}
+        unknown = [f for f in fieldnames if f.strip().lower() not in by_lower]
+        if unknown:
+            raise BulkImportError(f"Unknown column(s): {', '.join(unknown)}")
+        present = {f.strip().lower(): f for f in fieldnames}
+        missing = [name for name, _, required in columns if required and name.lower() not in present]
+        if missing:
+            raise BulkImportError(f"Missing required column(s): {', '.join(missing)}")
+        # only the columns the input actually has, so table defaults still apply
+        self.columns = [by_lower[key] for key in present]
+        self.keys = list(present.values())
+
+    def __call__(self, record):
+        row = []
+        for key, (name, kind, required) in zip(self.keys, self.columns):
+            try:
+                value = _convert(record.get(key), kind)
+            except (TypeError, ValueError):
+                raise RowError(f'{name}: expected {kind.__name__}, got {record.get(key)!r}')
+            if value is None and required:
+                raise RowError(f'{name} is required')
+            row.append(value)
+        return row
+
+
+def _records(path, fmt):
+    """Yield (line number, record dict) and expose the field names first."""
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            yield reader.fieldnames or []
+            for record in reader:
+                yield reader.line_num, record
+    else:
+        with open(path, encoding='utf-8') as f:
+            first = None
+            for line_num, line in enumerate(f, 1):
+                if line.strip():
+                    first = (line_num, json.loads(line))
+                    break
+            yield list(first[1].keys()) if first else []
+            if first:
+                yield first
+            for line_num, line in enumerate(f, first[0] + 1 if first else 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError as e:
+                    yield line_num, RowError(f'invalid JSON: {e}')
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def _load_checkpoint(path, table, source):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('table') != table or checkpoint.get('source') != _fingerprint(source):
+        print(f'Ignoring {path}: it was written for a different table or version of the file.')
+        return None
+    return checkpoint
+
+
+def _save_checkpoint(path, checkpoint):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)  #<- never leaves a half-written checkpoint behind
+
+
+def _set_pragmas(conn, pragmas):
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = conn.execute(f'PRAGMA {name}').fetchone()[0]
+        conn.execute(f'PRAGMA {name} = {value}')
+    return previous
+
+
+def _insert_chunk(conn, sql, chunk, errors):
+    """executemany the chunk; on a constraint failure, retry row by row to find the bad ones."""
+    conn.execute('SAVEPOINT bulk_chunk')
+    try:
+        conn.executemany(sql, [row for _, row, _ in chunk])
+        conn.execute('RELEASE bulk_chunk')
+        return len(chunk)
+    except sqlite3.IntegrityError:
+        conn.execute('ROLLBACK TO bulk_chunk')
+    loaded = 0
+    for line_num, row, record in chunk:
+        try:
+            conn.execute(sql, row)
+            loaded += 1
+        except sqlite3.IntegrityError as e:
+            errors.append((line_num, str(e), record))
+    conn.execute('RELEASE bulk_chunk')
+    return loaded
+
+
+def import_file(conn, table, path, fmt=None, mode='replace', chunk_size=DEFAULT_CHUNK_SIZE,
+                commit_every=DEFAULT_COMMIT_EVERY, resume=False, rebuild=True, verbose=True):
+    """Load one CSV/JSONL file into `table`. Returns a stats dict."""
+    if table not in TABLES:
+        raise BulkImportError(f"Unknown table {table}; expected one of {', '.join(TABLES)}")
+    fmt = fmt or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    verb = {'replace': 'INSERT OR REPLACE', 'insert': 'INSERT', 'ignore': 'INSERT OR IGNORE'}[mode]
+    checkpoint_path = path + '.checkpoint.json'
+    errors_path = path + '.errors.jsonl'
+
+    checkpoint = _load_checkpoint(checkpoint_path, table, path) if resume else None
+    skip = checkpoint['records'] if checkpoint else 0
+    stats = {
+        'table': table,
+        'records': skip,
+        'loaded': checkpoint['loaded'] if checkpoint else 0,
+        'errors': checkpoint['errors'] if checkpoint else 0,
+    }
+
+    records = _records(path, fmt)
+    convert = _Converter(_columns(conn, table), next(records))
+    sql = (f'{verb} INTO "{table}" ({", ".join(name for name, _, _ in convert.columns)}) '
+           f'VALUES ({", ".join("?" * len(convert.columns))})')
+
+    if conn.in_transaction:
+        conn.commit()
+    previous = _set_pragmas(conn, BULK_PRAGMAS)
+    started = time.perf_counter()
+    loaded_this_run = 0
+    error_file = open(errors_path, 'a' if checkpoint else 'w', encoding='utf-8')
+    try:
+        chunk, errors, since_commit = [], [], 0
+        conn.execute('BEGIN')
+
+        def flush():
+            nonlocal chunk, errors
+            loaded = _insert_chunk(conn, sql, chunk, errors) if chunk else 0
+            for line_num, reason, record in errors:
+                error_file.write(json.dumps({'line': line_num, 'error': reason, 'row': record}, default=str) + '\n')
+            stats['loaded'] += loaded
+            stats['errors'] += len(errors)
+            chunk, errors = [], []
+            return loaded
+
+        def commit():
+            conn.commit()
+            error_file.flush()
+            _save_checkpoint(checkpoint_path, {
+                'table': table, 'source': _fingerprint(path), 'records': stats['records'],
+                'loaded': stats['loaded'], 'errors': stats['errors'],
+            })
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"  {stats['records']:>10} records  {stats['loaded']:>10} loaded  "
+                      f"{stats['errors']:>7} errors  {loaded_this_run / elapsed if elapsed else 0:>9.0f} rows/s")
+            conn.execute('BEGIN')
+
+        for position, item in enumerate(records):
+            if position < skip:
+                continue
+            line_num, record = item
+            stats['records'] += 1
+            if isinstance(record, RowError):
+                errors.append((line_num, str(record), None))
+            elif not isinstance(record, dict):
+                errors.append((line_num, 'expected a JSON object', record))
+            else:
+                try:
+                    chunk.append((line_num, convert(record), record))
+                except RowError as e:
+                    errors.append((line_num, str(e), record))
+            if len(chunk) + len(errors) >= chunk_size:
+                since_commit += len(chunk) + len(errors)
+                loaded_this_run += flush()
+                if since_commit >= commit_every:
+                    commit()
+                    since_commit = 0
+
+        loaded_this_run += flush()
+        conn.commit()
+        stats['load_time'] = time.perf_counter() - started
+
+        if rebuild and loaded_this_run and _has_derived_tables(conn):
+            for func in REBUILDS.get(table, []):
+                func(conn)
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        error_file.close()
+        _set_pragmas(conn, previous)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)  #<- finished; a later --resume starts over
+    if not stats['errors'] and os.path.exists(errors_path):
+        os.remove(errors_path)
+
+    # foreign keys were off during the load; report what doesn't line up
+    stats['fk_violations'] = len(conn.execute(f'PRAGMA foreign_key_check("{table}")').fetchall())
+    stats['elapsed'] = time.perf_counter() - started
+    stats['rows_per_sec'] = loaded_this_run / stats['load_time'] if stats['load_time'] else 0.0
+    return stats
+
+
+def _has_derived_tables(conn):
+    # derived tables only exist once migrations have run on this database
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name IN ('Listing_Search', 'Listing_Ratings', 'Category_Closure', 'Seller_Sales_Totals')"
+    ).fetchone()[0] == 4
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Bulk load CSV/JSONL rows into a NittanyBusiness table.')
+    parser.add_argument('table', choices=TABLES)
+    parser.add_argument('path')
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--mode', choices=('replace', 'insert', 'ignore'), default='replace')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--commit-every', type=int, default=DEFAULT_COMMIT_EVERY)
+    parser.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    parser.add_argument('--no-rebuild', action='store_true', help='skip rebuilding search/rating/rollup tables')
+    opts = parser.parse_args(args)
+
+    conn = sqlite3.connect(opts.db)
+    try:
+        stats = import_file(
+            conn, opts.table, opts.path, fmt=opts.format, mode=opts.mode,
+            chunk_size=opts.chunk_size, commit_every=opts.commit_every,
+            resume=opts.resume, rebuild=not opts.no_rebuild
+        )
+    except BulkImportError as e:
+        print(f'Error: {e}')
+        return 1
+    finally:
+        conn.close()
+
+    print(f"Loaded {stats['loaded']} of {stats['records']} records into {stats['table']} "
+          f"in {stats['load_time']:.2f}s ({stats['rows_per_sec']:.0f} rows/s), "
+          f"{stats['elapsed']:.2f}s including derived table rebuilds.")
+    if stats['errors']:
+        print(f"{stats['errors']} rows were rejected; see {opts.path}.errors.jsonl")
+    if stats['fk_violations']:
+        print(f"Warning: {stats['fk_violations']} rows reference missing parent rows "
+              f"(PRAGMA foreign_key_check(\"{stats['table']}\")).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
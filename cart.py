@@ -0,0 +1,94 @@
+# Server-side shopping carts, one row per (buyer, listing).
+#
+# Carts live in the database rather than the session cookie so they survive
+# logins on other devices and can be checked out as a single transaction by
+# purchasing.place_cart_order().
+
+MAX_LINES = 50
+MAX_QUANTITY = 999
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Cart_Items (
+    buyer_email TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    added_at TEXT NOT NULL DEFAULT (datetime('now')),
+    PRIMARY KEY (buyer_email, listing_id)
+) WITHOUT ROWID;
+'''
+
+
+class CartError(Exception):
+    """The cart change was refused; str(e) is safe to flash to the buyer."""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+
+def add_item(conn, buyer_email, listing_id, quantity=1):
+    """Add `quantity` of a listing, merging with a line already in the cart."""
+    quantity = int(quantity)
+    if quantity < 1:
+        raise CartError('Quantity must be at least 1')
+    listing = conn.execute(
+        'SELECT Quantity FROM Product_Listings WHERE Listing_ID = ? AND Status = 1',
+        (listing_id,)
+    ).fetchone()
+    if listing is None or listing[0] < 1:
+        raise CartError('Product not available for purchase')
+    lines = conn.execute(
+        'SELECT COUNT(*) FROM Cart_Items WHERE buyer_email = ? AND listing_id != ?',
+        (buyer_email, listing_id)
+    ).fetchone()[0]
+    if lines >= MAX_LINES:
+        raise CartError(f'Your cart can hold at most {MAX_LINES} products')
+    # capped at the stock on hand now; checkout re-checks it atomically
+    conn.execute(
+        '''INSERT INTO Cart_Items (buyer_email, listing_id, quantity) VALUES (?, ?, MIN(?, ?))
+           ON CONFLICT(buyer_email, listing_id) DO UPDATE SET
+               quantity = MIN(quantity + excluded.quantity, ?)''',
+        (buyer_email, listing_id, quantity, listing[0], min(listing[0], MAX_QUANTITY))
+    )
+
+
+def set_quantity(conn, buyer_email, listing_id, quantity):
+    """Change a line's quantity; zero or less removes it."""
+    quantity = int(quantity)
+    if quantity <= 0:
+        remove_item(conn, buyer_email, listing_id)
+        return
+    conn.execute(
+        'UPDATE Cart_Items SET quantity = ? WHERE buyer_email = ? AND listing_id = ?',
+        (min(quantity, MAX_QUANTITY), buyer_email, listing_id)
+    )
+
+
+def remove_item(conn, buyer_email, listing_id):
+    conn.execute(
+        'DELETE FROM Cart_Items WHERE buyer_email = ? AND listing_id = ?',
+        (buyer_email, listing_id)
+    )
+
+
+def clear(conn, buyer_email):
+    conn.execute('DELETE FROM Cart_Items WHERE buyer_email = ?', (buyer_email,))
+
+
+def get_items(conn, buyer_email):
+    """Cart lines joined with their listings, in the order they were added.
+
+    `available` is false for lines whose listing was sold out or removed
+    since it was added; place_cart_order() will refuse those.
+    """
+    return conn.execute(
+        '''SELECT c.listing_id, c.quantity, pl.Product_Title, pl.Product_Price,
+                  pl.Quantity AS in_stock, pl.Seller_Email, s.business_name AS seller_name,
+                  (pl.Status = 1 AND pl.Quantity >= c.quantity) AS available
+           FROM Cart_Items c
+           LEFT JOIN Product_Listings pl ON pl.Listing_ID = c.listing_id
+           LEFT JOIN Sellers s ON s.email = pl.Seller_Email
+           WHERE c.buyer_email = ?
+           ORDER BY c.added_at, c.listing_id''',
+        (buyer_email,)
+    ).fetchall()
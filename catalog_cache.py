@@ -0,0 +1,466 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, has_request_context, make_response, request, session
+from markupsafe import Markup
+
+# HTTP caching for the catalog pages: versions, validators and card fragments.
+#
+# Every write that changes what a shopper sees of a listing (add / update /
+# activate / deactivate, a purchase, a review, a seller renaming their
+# business) calls bump() in its own transaction. bump() takes the next value
+# of the 'catalog' counter in Cache_Versions and stamps it, with the time,
+# on the listing's row in Catalog_Versions and on the rows of its category
+# and every ancestor category. A second counter, 'catalog_epoch', is bumped
+# by invalidate() for changes made outside the app (bulk imports, new
+# categories) and is part of every token, so it retires them all at once.
+#
+# Each worker keeps the version map in memory (CatalogVersions) and syncs it
+# at most every CATALOG_VERSION_TTL seconds: one primary-key read of the two
+# counters, plus the rows stamped since the last sync. In between, pages are
+# validated purely from memory, so a conditional request that still matches
+# is answered 304 without touching SQLite:
+#
+#   product_detail    the listing's version
+#   product_search    the category's version when filtered by one (it covers
+#                     the whole subtree), otherwise the catalog counter
+#   buyer_dashboard   the catalog counter (products tab only)
+#
+# ETags are weak and also cover the user (pages show who is logged in) and
+# the query string. Pages are sent `private, no-cache`, so browsers keep them
+# but revalidate on every view; a page carrying flashed messages gets no
+# validators at all. Another worker's write can take up to the TTL to show.
+#
+# Product cards are rendered once per (variant, listing, version) and kept
+# in an LRU of HTML fragments (CATALOG_FRAGMENT_CACHE_SIZE); the buyer
+# dashboard's featured / recent rows are kept there too, keyed by the
+# catalog counter.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Catalog_Versions (
+    kind TEXT NOT NULL,  -- 'listing' or 'category'
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    changed_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_catalog_versions_version ON Catalog_Versions(version);
+INSERT OR IGNORE INTO Cache_Versions (name, version) VALUES ('catalog', 0);
+INSERT OR IGNORE INTO Cache_Versions (name, version) VALUES ('catalog_epoch', 0);
+'''
+
+VERSION_KEY = 'catalog'
+EPOCH_KEY = 'catalog_epoch'
+CARD_TEMPLATE = 'partials/product_card.html'
+MAX_VARIABLES = 500  #<- listing ids per IN (...) list
+
+# a listing change shows up in its category and in every category above it;
+# {changed} selects the categories themselves
+ANCESTORS_SQL = '''
+    WITH changed(category) AS ({changed})
+    SELECT category FROM changed
+    UNION
+    SELECT cc.ancestor FROM changed JOIN Category_Closure cc ON cc.descendant = changed.category
+'''
+LISTING_CATEGORIES_SQL = '''
+    SELECT Category FROM Product_Listings WHERE Listing_ID IN ({ids})
+    UNION SELECT value FROM json_each(?)
+'''
+SELLER_CATEGORIES_SQL = 'SELECT DISTINCT Category FROM Product_Listings WHERE Seller_Email = ?'
+CHANGED_SINCE_SQL = '''
+    SELECT kind, key, version, changed_at FROM Catalog_Versions
+    WHERE version > ? AND version <= ?
+    ORDER BY version DESC LIMIT ?
+'''
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+#=======================Bumping=======================#
+def _next_version(conn):
+    row = conn.execute(
+        'UPDATE Cache_Versions SET version = version + 1 WHERE name = ? RETURNING version',
+        (VERSION_KEY,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _stamp(conn, keys, version, now):
+    conn.executemany(
+        '''INSERT INTO Catalog_Versions (kind, key, version, changed_at) VALUES (?, ?, ?, ?)
+           ON CONFLICT (kind, key) DO UPDATE SET
+               version = excluded.version, changed_at = excluded.changed_at''',
+        [(kind, str(key), version, now) for kind, key in keys]
+    )
+
+
+def _with_ancestors(conn, sql, params):
+    rows = conn.execute(ANCESTORS_SQL.format(changed=sql), params)
+    return {row[0] for row in rows if row[0] is not None}
+
+
+def bump(conn, listing_ids=(), categories=()):
+    """Give listings, their categories (and any extra ``categories``) a new version.
+
+    Call inside the write's transaction, after the write, so the categories
+    read are the listings' new ones; pass a listing's old category when it
+    moved. Doesn't commit. Returns the new catalog version.
+    """
+    version = _next_version(conn)
+    if version is None:  #<- schema not migrated yet
+        return None
+    ids = sorted({int(listing_id) for listing_id in listing_ids})
+    extra = sorted(set(categories))
+    keys = [('listing', listing_id) for listing_id in ids]
+    names = set()
+    for i in range(0, max(len(ids), len(extra)), MAX_VARIABLES):
+        chunk, more = ids[i:i + MAX_VARIABLES], extra[i:i + MAX_VARIABLES]
+        names |= _with_ancestors(
+            conn,
+            LISTING_CATEGORIES_SQL.format(ids=', '.join('?' * len(chunk))),
+            chunk + [json.dumps(more)]
+        )
+    _stamp(conn, keys + [('category', name) for name in names], version, time.time())
+    _changed()
+    return version
+
+
+def bump_seller(conn, seller_email):
+    """New versions for every listing of one seller (their business name is on each card)."""
+    version = _next_version(conn)
+    if version is None:
+        return None
+    now = time.time()
+    conn.execute(
+        '''INSERT INTO Catalog_Versions (kind, key, version, changed_at)
+           SELECT 'listing', CAST(Listing_ID AS TEXT), ?, ? FROM Product_Listings WHERE Seller_Email = ?
+           ON CONFLICT (kind, key) DO UPDATE SET
+               version = excluded.version, changed_at = excluded.changed_at''',
+        (version, now, seller_email)
+    )
+    names = _with_ancestors(conn, SELLER_CATEGORIES_SQL, (seller_email,))
+    _stamp(conn, [('category', name) for name in names], version, now)
+    _changed()
+    return version
+
+
+def invalidate(conn):
+    """Retire every cached page and fragment, in every worker. Doesn't commit."""
+    conn.execute('UPDATE Cache_Versions SET version = version + 1 WHERE name = ?', (EPOCH_KEY,))
+    _changed()
+
+
+def _changed():
+    # this worker sees its own writes on the next request, not after the TTL
+    versions.expire()
+    if has_request_context():
+        g.catalog_changed = True
+#=======================Bumping=======================#
+
+
+#=======================CatalogVersions=======================#
+class Snapshot:
+    """One consistent, immutable view of the version map; read without locking."""
+
+    __slots__ = ('seq', 'epoch', 'floor', 'floor_time', 'changed_at', 'epoch_seen', 'entries')
+
+    def __init__(self, seq=0, epoch=0, floor=0, floor_time=None, changed_at=None, epoch_seen=None,
+                 entries=None):
+        self.seq = seq
+        self.epoch = epoch
+        self.floor = floor  #<- every key missing from entries has a version <= floor
+        self.floor_time = floor_time
+        self.changed_at = changed_at  #<- when the catalog counter last moved
+        self.epoch_seen = epoch_seen  #<- when this worker first saw the current epoch
+        self.entries = entries if entries is not None else {}  #<- (kind, key) -> (version, changed_at)
+
+    def version(self, kind, key):
+        """(version, changed_at) of a listing or category; never-changed keys report the floor."""
+        return self.entries.get((kind, str(key)), (self.floor, self.floor_time))
+
+    def token(self, kind=None, key=None):
+        """Changes whenever the key (or, with no key, anything in the catalog) changes."""
+        if kind is None:
+            return f'{self.epoch}.{self.seq}'
+        return f'{self.epoch}.{self.version(kind, key)[0]}'
+
+    def last_modified(self, kind=None, key=None):
+        changed = self.changed_at if kind is None else self.version(kind, key)[1]
+        return max(changed or 0, self.epoch_seen or 0) or None
+
+
+class CatalogVersions:
+
+    def __init__(self, ttl=1.0, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._synced_at = 0.0
+        self.fresh = 0
+        self.syncs = 0
+        self.evictions = 0
+
+    def configure(self, ttl, max_entries):
+        with self._lock:
+            self.ttl = ttl
+            self.max_entries = max_entries
+            self._synced_at = 0.0
+
+    def expire(self):
+        self._synced_at = 0.0
+
+    def current(self, connect):
+        """The version map, synced from SQLite first if it's older than the TTL.
+
+        ``connect`` is only called when a sync is due.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._synced_at < self.ttl:
+            self.fresh += 1
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._synced_at < self.ttl:
+                self.fresh += 1
+                return self._snapshot
+            self._synced_at = time.monotonic()  #<- before reading, so a bump during the sync expires it
+            self._snapshot = self._sync(connect(), self._snapshot)
+            self.syncs += 1
+            return self._snapshot
+
+    def _sync(self, conn, old):
+        counters = dict(conn.execute(
+            'SELECT name, version FROM Cache_Versions WHERE name IN (?, ?)', (VERSION_KEY, EPOCH_KEY)
+        ).fetchall())
+        seq, epoch = counters.get(VERSION_KEY, 0), counters.get(EPOCH_KEY, 0)
+        if old is None or seq < old.seq:  #<- first sync, or the database was replaced
+            old = Snapshot()
+        epoch_seen = old.epoch_seen if old.epoch_seen and epoch == old.epoch else time.time()
+        if seq == old.seq:
+            return Snapshot(seq, epoch, old.floor, old.floor_time, old.changed_at, epoch_seen, old.entries)
+
+        rows = conn.execute(CHANGED_SINCE_SQL, (old.seq, seq, self.max_entries)).fetchall()
+        entries = dict(old.entries)  #<- copy on write: requests may be reading the old one
+        floor, floor_time = old.floor, old.floor_time
+        if len(rows) == self.max_entries:
+            # only the newest rows fit; anything older reports the floor
+            entries = {}
+            floor, floor_time = rows[-1][2], rows[-1][3]
+        for kind, key, version, changed_at in rows:
+            entries[(kind, key)] = (version, changed_at)
+        changed_at = max((row[3] for row in rows), default=old.changed_at)
+        if len(entries) > self.max_entries:
+            keep = sorted(entries.items(), key=lambda item: item[1][0], reverse=True)
+            dropped = keep[self.max_entries * 3 // 4:]
+            floor, floor_time = max((floor, floor_time), dropped[0][1], key=lambda v: v[0])
+            entries = dict(keep[:self.max_entries * 3 // 4])
+            self.evictions += len(dropped)
+        return Snapshot(seq, epoch, floor, floor_time, changed_at, epoch_seen, entries)
+
+    def stats(self):
+        snapshot = self._snapshot or Snapshot()
+        return {
+            'version': snapshot.seq,
+            'epoch': snapshot.epoch,
+            'floor': snapshot.floor,
+            'entries': len(snapshot.entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'fresh_reads': self.fresh,
+            'syncs': self.syncs,
+            'evictions': self.evictions,
+        }
+#=======================CatalogVersions=======================#
+
+
+#=======================FragmentCache=======================#
+class FragmentCache:
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  #<- key -> value, oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, build):
+        """The cached value for ``key``, calling build() to make it on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = build()  #<- outside the lock; two threads may both build a cold key
+        if self.maxsize:
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                self._trim()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+#=======================FragmentCache=======================#
+
+
+versions = CatalogVersions()
+fragments = FragmentCache()
+_responses = {'tagged': 0, 'not_modified': 0}
+_salt = {'templates': ''}
+
+
+#=======================Pages=======================#
+def current(connect):
+    """This request's snapshot (synced if due), or None with caching turned off."""
+    if not current_app.config['CATALOG_CACHE']:
+        return None
+    if 'catalog_snapshot' not in g:
+        g.catalog_snapshot = versions.current(connect)
+    return g.catalog_snapshot
+
+
+def validators(connect, route, kind=None, key=None):
+    """(etag, last_modified) for the current request's page, or None when it mustn't be cached.
+
+    The page is assumed to depend on one listing / category (``kind``, ``key``)
+    or, with no key, on the whole catalog.
+    """
+    snapshot = current(connect)
+    if snapshot is None or '_flashes' in session:
+        return None
+    digest = hashlib.blake2b(
+        repr((_salt['templates'], snapshot.token(kind, key), session.get('user_email'),
+              session.get('user_type'), request.full_path)).encode(),
+        digest_size=10
+    ).hexdigest()
+    return f'{route}-{digest}', snapshot.last_modified(kind, key)
+
+
+def not_modified(page):
+    """A 304 response if the client's copy still matches ``page``'s validators, else None."""
+    if page is None:
+        return None
+    etag, last_modified = page
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(etag):
+            return None
+    elif request.if_modified_since is None or last_modified is None:
+        return None
+    # Last-Modified only has whole seconds: a change later in the same second
+    # would look unmodified, so a date that recent never validates
+    elif last_modified > time.time() - 1 or int(last_modified) > request.if_modified_since.timestamp():
+        return None
+    _responses['not_modified'] += 1
+    return tag(('', 304), page)
+
+
+def tag(response, page):
+    """Attach ``page``'s validators to a view's return value; always sets Cache-Control."""
+    response = make_response(response)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if page is not None:
+        etag, last_modified = page
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = int(last_modified)
+        if response.status_code == 200:
+            _responses['tagged'] += 1
+    return response
+
+
+def product_card(product, variant='block'):
+    """Jinja global: one product card's HTML, from the fragment cache when possible.
+
+    Cards only show listing data (title, price, seller, rating), never the
+    viewer, so one rendering serves everyone until the listing's version moves.
+    """
+    def render():
+        return Markup(current_app.jinja_env.get_template(CARD_TEMPLATE).render(product=product, variant=variant))
+
+    snapshot = g.get('catalog_snapshot')
+    if snapshot is None:
+        return render()
+    listing_id = product['Listing_ID']
+    return fragments.get(('card', variant, listing_id, snapshot.token('listing', listing_id)), render)
+
+
+def memoize(name, build, kind=None, key=None):
+    """Keep build()'s result in the fragment cache until (kind, key) changes. Needs current() first."""
+    snapshot = g.get('catalog_snapshot')
+    if snapshot is None:
+        return build()
+    return fragments.get((name, snapshot.token(kind, key)), build)
+
+
+def stats():
+    return {
+        'responses': dict(_responses),
+        'versions': versions.stats(),
+        'fragments': fragments.stats(),
+    }
+#=======================Pages=======================#
+
+
+def _templates_digest(app):
+    # pages cached by browsers must not validate against an older deploy's templates
+    digest = hashlib.blake2b(digest_size=8)
+    root = os.path.join(app.root_path, app.template_folder)
+    for folder, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            with open(os.path.join(folder, name), 'rb') as f:
+                digest.update(name.encode() + f.read())
+    return digest.hexdigest()
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set caching defaults on ``app.config``, size the caches and register the card helper."""
+    app.config.setdefault('CATALOG_CACHE', True)
+    app.config.setdefault('CATALOG_VERSION_TTL', 1.0)  #<- seconds another worker's write may go unseen
+    app.config.setdefault('CATALOG_VERSION_MAX', 100000)
+    app.config.setdefault('CATALOG_FRAGMENT_CACHE_SIZE', 4096)
+    _salt['templates'] = _templates_digest(app)
+    versions.configure(app.config['CATALOG_VERSION_TTL'], app.config['CATALOG_VERSION_MAX'])
+    fragments.configure(app.config['CATALOG_FRAGMENT_CACHE_SIZE'])
+    app.jinja_env.globals['product_card'] = product_card
+
+    @app.teardown_request
+    def _expire_after_write(exc):
+        # the commit has happened by now; a sync that raced the write
+        # transaction may have missed it, so look again next request
+        if g.pop('catalog_changed', False):
+            versions.expire()
+#=======================Flask binding=======================#
@@ -0,0 +1,136 @@
+import gzip
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  #<- optional; without it every client gets gzip
+    brotli = None
+
+# Response compression.
+#
+# Pages, JSON and other text responses are compressed after the view has
+# run, with brotli when it is installed and the client accepts it, otherwise
+# gzip. Bodies under COMPRESS_MIN_SIZE bytes are sent as they are (the
+# framing costs more than it saves and they fit in one packet anyway), as
+# are responses that already have a Content-Encoding, streamed responses
+# (the exports) and files sent straight from disk.
+#
+# Static files are never compressed per request. `python templating.py build`
+# writes .br and .gz copies next to the built files, and the static route
+# sends the best copy the client accepts, with its own ETag, so the work is
+# done once per deploy at the highest compression level.
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+})
+
+MIN_SIZE = 1024  #<- bytes; see COMPRESS_MIN_SIZE
+BUILD_GZIP_LEVEL = 9
+BUILD_BROTLI_QUALITY = 11
+
+
+def compress(data, encoding, level):
+    """``data`` encoded as ``encoding`` ('br' or 'gzip') at ``level``."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)  #<- mtime=0: same input, same bytes
+
+
+def precompress(path, min_size=MIN_SIZE):
+    """Write path.br (if brotli is installed) and path.gz beside ``path``. Returns the files written.
+
+    Variants that would not be smaller than the original are skipped, so the
+    static route falls back to it.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return []
+    written = []
+    for encoding in ENCODINGS:
+        level = BUILD_BROTLI_QUALITY if encoding == 'br' else BUILD_GZIP_LEVEL
+        body = compress(data, encoding, level)
+        if len(body) >= len(data):
+            continue
+        target = path + SUFFIXES[encoding]
+        with open(target + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(target + '.tmp', target)
+        written.append(target)
+    return written
+
+
+def is_compressible(path):
+    mimetype, _ = mimetypes.guess_type(path)
+    return mimetype in COMPRESSIBLE
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set compression defaults on ``app.config``, compress responses and serve precompressed static files.
+
+    Call it before the other extensions: after_request hooks run in reverse
+    order of registration, so this one then sees each response last.
+    """
+    app.config.setdefault('COMPRESS', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', MIN_SIZE)  #<- bytes; smaller bodies go out as they are
+    app.config.setdefault('COMPRESS_LEVEL', 6)  #<- gzip, 1-9
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)  #<- 0-11; per-request work, so well below the build's 11
+
+    @app.after_request
+    def _compress_response(response):
+        if not app.config['COMPRESS']:
+            return response
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+        level = app.config['COMPRESS_BROTLI_QUALITY'] if encoding == 'br' else app.config['COMPRESS_LEVEL']
+        body = compress(data, encoding, level)
+        if len(body) >= len(data):
+            return response
+        response.set_data(body)  #<- also fixes Content-Length
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:  #<- a strong validator names exact bytes, and these changed
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+    def static_file(filename):
+        # a precompressed copy written by the build, if there is one the client takes
+        folder = app.static_folder
+        path = safe_join(folder, filename)
+        available = [encoding for encoding in ENCODINGS
+                     if path is not None and os.path.isfile(path + SUFFIXES[encoding])]
+        if not available or not app.config['COMPRESS']:
+            return send_from_directory(folder, filename)
+        encoding = request.accept_encodings.best_match(available)
+        if encoding is None:
+            response = send_from_directory(folder, filename)
+        else:
+            mimetype, _ = mimetypes.guess_type(filename)
+            response = send_from_directory(folder, filename + SUFFIXES[encoding],
+                                           mimetype=mimetype or 'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if app.static_folder:
+        app.view_functions['static'] = static_file
+#=======================Flask binding=======================#
@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Password hashing and verification.
+#
+# New hashes use a configurable werkzeug method, which carries its own cost
+# parameters and salt in the stored string ("scrypt:32768:8:1$salt$hash").
+# Accounts created before this still hold an unsalted SHA-256 hex digest;
+# those verify through the legacy path and report needs_rehash so login can
+# upgrade them in place.
+#
+# KDF work runs on a small bounded thread pool. hashlib's scrypt/pbkdf2
+# release the GIL, so without a cap a burst of logins would put every
+# request thread onto the CPU at once; with it, at most PASSWORD_HASH_WORKERS
+# hashes run concurrently and the rest queue. A caller that waits longer
+# than PASSWORD_HASH_TIMEOUT gets HasherBusy, which the views turn into a
+# "try again" message rather than a 500.
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+BUSY_MESSAGE = 'The server is busy right now, please try again in a moment.'
+
+
+class HasherBusy(Exception):
+    """The hashing pool didn't get to a password within the timeout."""
+
+
+def method_prefix(method):
+    """The method string werkzeug stores for ``method``, with its defaults filled in.
+
+    'scrypt' is stored as 'scrypt:32768:8:1' and 'pbkdf2' as
+    'pbkdf2:sha256:<iterations>'; raises ValueError for any other method.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2' and len(args) <= 2:
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Invalid hash method {method!r}')
+
+
+#=======================Hasher=======================#
+class Hasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=2, timeout=30.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._prefix = method_prefix(method)  #<- also rejects an unknown method at startup
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'failed': 0, 'legacy': 0, 'busy': 0}
+
+    def _run(self, func, *args):
+        future = self._pool.submit(func, *args)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()  #<- frees the slot if it is still queued; a running hash finishes on its own
+            self._count('busy')
+            raise HasherBusy('Password hashing timed out') from None
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def hash(self, password):
+        """Return a salted hash of ``password`` with the configured method."""
+        self._count('hashed')
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        """Return (ok, needs_rehash). Comparison is constant-time on both paths."""
+        if not stored:
+            return False, False
+        if _LEGACY_SHA256.match(stored):
+            self._count('legacy')
+            provided = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            ok = hmac.compare_digest(provided, stored)
+            self._count('verified' if ok else 'failed')
+            return ok, ok
+        try:
+            ok = self._run(check_password_hash, stored, password)
+        except ValueError:  #<- unknown or malformed method in the stored string
+            ok = False
+        self._count('verified' if ok else 'failed')
+        return ok, ok and self.needs_rehash(stored)
+
+    def needs_rehash(self, stored):
+        """True when ``stored`` wasn't made with the current method and cost."""
+        if _LEGACY_SHA256.match(stored):
+            return True
+        return stored.split('$', 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['method'] = self.method
+        stats['workers'] = self.workers
+        return stats
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+#=======================Hasher=======================#
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set hashing defaults on ``app.config``."""
+    app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 30.0)
+    app.extensions['password_hasher'] = None
+
+
+def get_hasher(app):
+    hasher = app.extensions.get('password_hasher')
+    if (hasher is None or hasher.method != app.config['PASSWORD_HASH_METHOD']
+            or hasher.workers != app.config['PASSWORD_HASH_WORKERS']):
+        if hasher is not None:
+            hasher.shutdown()
+        hasher = Hasher(
+            app.config['PASSWORD_HASH_METHOD'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+        )
+        app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def hash_password(app, password):
+    """Hash ``password`` on the app's hasher. Raises HasherBusy on timeout."""
+    return get_hasher(app).hash(password)
+
+
+def verify_password(app, stored, password):
+    """(ok, needs_rehash) for ``password`` against ``stored``. Raises HasherBusy on timeout."""
+    return get_hasher(app).verify(stored, password)
+#=======================Flask binding=======================#
@@ -0,0 +1,387 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from flask import g
+
+
+#=======================PooledConnection=======================#
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time and row count to a recorder.
+
+    SQLite does most of a query's work while rows are being stepped through,
+    so fetch time is added to the statement's entry as well as execute time.
+    """
+
+    _entry = None
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self._entry[1] += time.perf_counter() - started
+
+    def execute(self, sql, parameters=()):
+        self._entry = self.connection.recorder.statement(sql)
+        self._timed(sqlite3.Cursor.execute, sql, parameters)
+        if self.rowcount > 0:  #<- INSERT/UPDATE/DELETE; -1 for queries
+            self._entry[2] += self.rowcount
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._entry = self.connection.recorder.statement(sql)
+        self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+        if self.rowcount > 0:
+            self._entry[2] += self.rowcount
+        return self
+
+    def fetchone(self):
+        row = self._timed(sqlite3.Cursor.fetchone) if self._entry else sqlite3.Cursor.fetchone(self)
+        if row is not None and self._entry:
+            self._entry[2] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        args = () if size is None else (size,)
+        rows = self._timed(sqlite3.Cursor.fetchmany, *args) if self._entry else sqlite3.Cursor.fetchmany(self, *args)
+        if self._entry:
+            self._entry[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(sqlite3.Cursor.fetchall) if self._entry else sqlite3.Cursor.fetchall(self)
+        if self._entry:
+            self._entry[2] += len(rows)
+        return rows
+
+    def __next__(self):
+        if not self._entry:
+            return sqlite3.Cursor.__next__(self)
+        row = self._timed(sqlite3.Cursor.__next__)
+        self._entry[2] += 1
+        return row
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that goes back to its pool instead of closing.
+
+    Routes still call ``conn.close()`` when they are done; for a pooled
+    connection that only rolls back whatever was left uncommitted (which is
+    what a real close would have done) and the actual release happens in the
+    app-context teardown.
+
+    While ``recorder`` is set (see profiling.py) statements run through
+    TimedCursor; otherwise they take the plain sqlite3 path.
+    """
+
+    recorder = None
+
+    def cursor(self, factory=None):
+        if factory is None and self.recorder is not None:
+            factory = TimedCursor
+        return sqlite3.Connection.cursor(self, factory or sqlite3.Cursor)
+
+    def execute(self, sql, parameters=()):
+        if self.recorder is None:
+            return sqlite3.Connection.execute(self, sql, parameters)
+        return self.cursor(TimedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.recorder is None:
+            return sqlite3.Connection.executemany(self, sql, seq_of_parameters)
+        return self.cursor(TimedCursor).executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def _really_close(self):
+        sqlite3.Connection.close(self)
+#=======================PooledConnection=======================#
+
+
+#=======================ConnectionPool=======================#
+class ConnectionPool:
+    """Fixed-size pool of configured SQLite connections shared by a process.
+
+    Connections are created lazily up to ``size``; once that many are checked
+    out, callers wait up to ``timeout`` seconds for one to come back.
+    """
+
+    def __init__(self, database, size=8, timeout=10.0, journal_mode='WAL',
+                 synchronous='NORMAL', cache_size=-16000, mmap_size=268435456,
+                 busy_timeout=5000, health_check_interval=30.0):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()  #<- reuse the warmest connection first
+        self._lock = threading.Lock()
+        self._created = 0
+        self._on_connect = []
+        self._stats = {
+            'checkouts': 0,     # total connections handed out
+            'hits': 0,          # served from an idle pooled connection
+            'misses': 0,        # had to open a new connection
+            'waits': 0,         # pool exhausted, caller had to wait
+            'wait_time': 0.0,   # total seconds spent waiting
+            'timeouts': 0,      # waited longer than `timeout`
+            'health_checks': 0,
+            'discarded': 0,     # failed a health check and was replaced
+        }
+
+    def on_connect(self, func):
+        """Register ``func(conn)`` to run once on every new pooled connection."""
+        self._on_connect.append(func)
+        return func
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            factory=PooledConnection,
+            timeout=self.busy_timeout / 1000.0,
+            check_same_thread=False  #<- connections move between request threads
+        )
+        conn.row_factory = sqlite3.Row
+        # these only need to be applied once per physical connection
+        conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        for func in self._on_connect:
+            func(conn)
+        conn.commit()
+        conn._pool_last_used = time.monotonic()
+        return conn
+
+    def _is_healthy(self, conn):
+        with self._lock:
+            self._stats['health_checks'] += 1
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+            hit = True
+        except queue.Empty:
+            hit = False
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.monotonic()
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                    hit = True
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise RuntimeError(
+                        f'Timed out after {self.timeout}s waiting for a database connection '
+                        f'(pool size {self.size})'
+                    )
+                finally:
+                    with self._lock:
+                        self._stats['wait_time'] += time.monotonic() - started
+
+        # connections that sat idle for a while get a cheap liveness probe
+        if hit and time.monotonic() - conn._pool_last_used > self.health_check_interval:
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self._stats['discarded'] += 1
+                try:
+                    conn._really_close()
+                except sqlite3.Error:
+                    pass
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1  #<- the discarded connection's slot
+                    raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['hits' if hit else 'misses'] += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # a broken connection is not worth keeping around
+            with self._lock:
+                self._created -= 1
+                self._stats['discarded'] += 1
+            return
+        conn._pool_last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn._really_close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+            stats['idle'] = self._idle.qsize()
+            stats['in_use'] = self._created - stats['idle']
+        stats['hit_rate'] = round(stats['hits'] / stats['checkouts'], 4) if stats['checkouts'] else None
+        return stats
+#=======================ConnectionPool=======================#
+
+
+#=======================Transactions=======================#
+WRITE_ATTEMPTS = 5
+WRITE_BACKOFF = 0.02  #<- seconds, doubled per attempt
+
+
+class DatabaseBusy(Exception):
+    """Every attempt at a write transaction found the database locked."""
+
+
+def is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_immediate(conn, func, *args, attempts=WRITE_ATTEMPTS, backoff=WRITE_BACKOFF):
+    """Run func(conn, *args) in a BEGIN IMMEDIATE transaction and commit it.
+
+    Retries on SQLITE_BUSY with exponential, jittered backoff; raises
+    DatabaseBusy when every attempt found the database locked. Must be called
+    with no transaction open on conn.
+    """
+    if conn.in_transaction:
+        raise RuntimeError('run_immediate() needs a connection with no open transaction')
+    for attempt in range(attempts):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+        else:
+            try:
+                result = func(conn, *args)
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                if not is_busy(e):
+                    raise
+            except BaseException:
+                conn.rollback()
+                raise
+        if attempt + 1 < attempts:
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+    raise DatabaseBusy('The database is busy right now, please try again')
+#=======================Transactions=======================#
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set pool defaults on ``app.config`` and release connections on teardown."""
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10.0)
+    app.config.setdefault('DB_JOURNAL_MODE', 'WAL')
+    app.config.setdefault('DB_SYNCHRONOUS', 'NORMAL')
+    app.config.setdefault('DB_CACHE_SIZE', -16000)      #<- negative = KiB, so ~16MB page cache
+    app.config.setdefault('DB_MMAP_SIZE', 268435456)    #<- 256MB
+    app.config.setdefault('DB_BUSY_TIMEOUT', 5000)      #<- milliseconds
+    app.config.setdefault('DB_HEALTH_CHECK_INTERVAL', 30.0)
+    app.extensions['db_pool'] = None
+    app.extensions['db_pool_hooks'] = []
+    app.teardown_appcontext(release_connection)
+
+
+def on_connect(app, func):
+    """Register a per-connection setup hook (schema checks, functions, ...)."""
+    app.extensions['db_pool_hooks'].append(func)
+    pool = app.extensions.get('db_pool')
+    if pool is not None:
+        pool.on_connect(func)
+    return func
+
+
+_pool_lock = threading.Lock()  #<- one pool per app, even when the first requests arrive together
+
+
+def get_pool(app):
+    pool = app.extensions.get('db_pool')
+    if pool is not None and pool.database == app.config['DATABASE']:
+        return pool
+    with _pool_lock:
+        pool = app.extensions.get('db_pool')
+        if pool is not None and pool.database == app.config['DATABASE']:
+            return pool  #<- another thread built it while this one waited
+        if pool is not None:
+            pool.close_all()
+        pool = ConnectionPool(
+            app.config['DATABASE'],
+            size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            journal_mode=app.config['DB_JOURNAL_MODE'],
+            synchronous=app.config['DB_SYNCHRONOUS'],
+            cache_size=app.config['DB_CACHE_SIZE'],
+            mmap_size=app.config['DB_MMAP_SIZE'],
+            busy_timeout=app.config['DB_BUSY_TIMEOUT'],
+            health_check_interval=app.config['DB_HEALTH_CHECK_INTERVAL'],
+        )
+        for func in app.extensions['db_pool_hooks']:
+            pool.on_connect(func)
+        app.extensions['db_pool'] = pool
+        return pool
+
+
+def get_connection(app):
+    """Return the connection bound to the current app context, checking one out if needed."""
+    if 'db_conn' not in g:
+        pool = get_pool(app)
+        g.db_conn = pool.acquire()
+        g.db_pool = pool
+        g.db_conn.recorder = g.get('sql_recorder')  #<- set by profiling.py for this request
+    return g.db_conn
+
+
+def release_connection(exc=None):
+    conn = g.pop('db_conn', None)
+    pool = g.pop('db_pool', None)
+    if conn is not None:
+        conn.recorder = None
+    if conn is not None and pool is not None:
+        pool.release(conn)
+#=======================Flask binding=======================#
@@ -0,0 +1,207 @@
+import argparse
+import csv
+import io
+import json
+import pathlib
+import sqlite3
+import sys
+
+from seller_analytics import normalize_day
+
+# Streaming exports of Orders, Product_Listings and Requests.
+#
+#   python exporter.py orders|listings|requests [--format csv|jsonl|columns]
+#       [--seller EMAIL] [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--status S]
+#       [--db database.db] [--out FILE]
+#
+# Every export reads from its own read-only connection inside one read
+# transaction, so it sees a consistent snapshot and, in WAL mode, never
+# blocks writers (nor is blocked by them). Rows are pulled with fetchmany()
+# and written out chunk by chunk, so memory stays flat whatever the size
+# of the table.
+#
+# "columns" is a columnar JSONL format: one line per chunk of rows, holding
+# each column's values as an array, e.g.
+#   {"columns": ["order_id", ...], "rows": 5000, "data": {"order_id": [1, 2, ...], ...}}
+
+CHUNK_SIZE = 5000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'columns': 'application/x-ndjson',
+}
+
+# dataset -> base query, key column for stable order, and the column each filter applies to
+DATASETS = {
+    'orders': {
+        'sql': '''SELECT order_id, seller_email, listing_id, buyer_email, date, quantity, payment
+                  FROM Orders''',
+        'order_by': 'order_id',
+        'seller': 'seller_email',
+        'date': 'date',
+        'status': None,
+    },
+    'listings': {
+        'sql': '''SELECT seller_email, listing_id, category, product_title, product_name,
+                         product_description, quantity, product_price, status
+                  FROM Product_Listings''',
+        'order_by': 'listing_id',
+        'seller': 'seller_email',
+        'date': None,
+        'status': 'status',
+    },
+    'requests': {
+        'sql': '''SELECT request_id, sender_email, helpdesk_staff_email, request_type,
+                         request_desc, request_status
+                  FROM Requests''',
+        'order_by': 'request_id',
+        'seller': 'sender_email',
+        'date': None,
+        'status': 'request_status',
+    },
+}
+
+
+class ExportError(ValueError):
+    """Bad export parameters; str(e) is safe to return to the caller."""
+
+
+def build_query(dataset, seller=None, date_from=None, date_to=None, status=None):
+    """Return (sql, params) for one dataset with the given filters."""
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    spec = DATASETS[dataset]
+    where, params = [], []
+
+    if seller:
+        where.append(f"{spec['seller']} = ?")
+        params.append(seller)
+
+    if date_from or date_to:
+        if not spec['date']:
+            raise ExportError(f'{dataset} can not be filtered by date')
+        # Orders.date mixes 2011/1/5 and 2011-01-05; compare normalized ISO dates
+        for bound, op in ((date_from, '>='), (date_to, '<=')):
+            if bound:
+                iso = normalize_day(bound)
+                if not iso:
+                    raise ExportError(f'Invalid date {bound!r}; use YYYY-MM-DD')
+                where.append(f"iso_date({spec['date']}) {op} ?")
+                params.append(iso)
+
+    if status not in (None, ''):
+        if not spec['status']:
+            raise ExportError(f'{dataset} can not be filtered by status')
+        where.append(f"{spec['status']} = ?")
+        params.append(str(status))
+
+    sql = spec['sql']
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f" ORDER BY {spec['order_by']}"
+    return sql, params
+
+
+def open_snapshot(database):
+    """Read-only connection with a read transaction already open."""
+    uri = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.create_function('iso_date', 1, normalize_day, deterministic=True)
+    conn.execute('BEGIN')
+    conn.execute('SELECT 1 FROM sqlite_master LIMIT 1')  #<- the snapshot starts at the first read
+    return conn
+
+
+def _csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(columns, batches):
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in batch)
+
+
+def _columnar_chunks(columns, batches):
+    for batch in batches:
+        data = {name: [row[i] for row in batch] for i, name in enumerate(columns)}
+        yield json.dumps({'columns': columns, 'rows': len(batch), 'data': data}, default=str) + '\n'
+
+
+_WRITERS = {'csv': _csv_chunks, 'jsonl': _jsonl_chunks, 'columns': _columnar_chunks}
+
+
+def stream(database, dataset, fmt='csv', chunk_size=CHUNK_SIZE, **filters):
+    """Yield the export as text chunks. Parameters are checked before the first yield.
+
+    The snapshot connection is opened lazily and closed when the generator
+    finishes or is closed (e.g. the client disconnects).
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    sql, params = build_query(dataset, **filters)
+
+    def generate():
+        conn = open_snapshot(database)
+        try:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+
+            def batches():
+                while True:
+                    batch = cursor.fetchmany(chunk_size)
+                    if not batch:
+                        return
+                    yield batch
+
+            yield from _WRITERS[fmt](columns, batches())
+        finally:
+            conn.close()
+
+    return generate()
+
+
+def filename(dataset, fmt):
+    return f"{dataset}.{'csv' if fmt == 'csv' else 'jsonl'}"
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Stream an export of orders, listings or requests.')
+    parser.add_argument('dataset', choices=DATASETS)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--seller')
+    parser.add_argument('--from', dest='date_from')
+    parser.add_argument('--to', dest='date_to')
+    parser.add_argument('--status')
+    parser.add_argument('--db', default='database.db')
+    parser.add_argument('--out', help='output file (default: stdout)')
+    opts = parser.parse_args(args)
+
+    try:
+        chunks = stream(opts.db, opts.dataset, opts.format, seller=opts.seller,
+                        date_from=opts.date_from, date_to=opts.date_to, status=opts.status)
+    except ExportError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+    out = open(opts.out, 'w', encoding='utf-8', newline='') if opts.out else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if opts.out:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Role resolution and a per-process identity cache.
+#
+# A user's account, role and profile live in four tables (Users plus one of
+# Buyer / Sellers / Helpdesk). lookup() reads all of it with a single LEFT
+# JOIN on the email primary keys instead of one query per table.
+#
+# The result, minus the password hash, is kept in a small LRU keyed by
+# email so dashboards don't re-read the same profile row on every page
+# load. Entries expire after IDENTITY_CACHE_TTL seconds, which bounds how
+# stale another worker process can be; the process that makes a profile
+# change calls invalidate() right after committing it.
+#
+# Sellers.balance changes with every sale, so it is deliberately not part
+# of the cached profile; read it live where it's shown.
+
+LOOKUP_SQL = '''
+    SELECT u.email, u.password,
+           h.email IS NOT NULL AS is_helpdesk,
+           b.email IS NOT NULL AS is_buyer,
+           s.email IS NOT NULL AS is_seller,
+           h.position,
+           b.business_name AS buyer_business_name, b.buyer_address_id,
+           s.business_name AS seller_business_name, s.business_address_id,
+           s.bank_routing_number, s.bank_account_number
+    FROM Users u
+    LEFT JOIN Helpdesk h ON h.email = u.email
+    LEFT JOIN Buyer b ON b.email = u.email
+    LEFT JOIN Sellers s ON s.email = u.email
+    WHERE u.email = ?
+'''
+
+ROLE_ORDER = ('helpdesk', 'buyer', 'seller')  #<- an account in several tables logs in as the first
+
+
+def lookup(conn, email):
+    """Return the identity for ``email`` straight from the database, or None.
+
+    The dict holds the password hash, ``user_type`` (None if the account has
+    no role row), the set of ``roles`` and one profile dict per role held.
+    """
+    row = conn.execute(LOOKUP_SQL, (email,)).fetchone()
+    if row is None:
+        return None
+    identity = {
+        'email': row['email'],
+        'password': row['password'],
+        'roles': {role for role in ROLE_ORDER if row[f'is_{role}']},
+        'helpdesk': None,
+        'buyer': None,
+        'seller': None,
+    }
+    if row['is_helpdesk']:
+        identity['helpdesk'] = {'email': row['email'], 'position': row['position']}
+    if row['is_buyer']:
+        identity['buyer'] = {
+            'email': row['email'],
+            'business_name': row['buyer_business_name'],
+            'buyer_address_id': row['buyer_address_id'],
+        }
+    if row['is_seller']:
+        identity['seller'] = {
+            'email': row['email'],
+            'business_name': row['seller_business_name'],
+            'business_address_id': row['business_address_id'],
+            'bank_routing_number': row['bank_routing_number'],
+            'bank_account_number': row['bank_account_number'],
+        }
+    identity['user_type'] = next((role for role in ROLE_ORDER if role in identity['roles']), None)
+    return identity
+
+
+#=======================IdentityCache=======================#
+class IdentityCache:
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  #<- email -> (expires_at, identity), oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize, ttl):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, identity):
+        """Cache ``identity`` (as returned by lookup) without its password hash."""
+        if not self.maxsize or identity is None:
+            return
+        cached = {key: value for key, value in identity.items() if key != 'password'}
+        with self._lock:
+            self._entries[identity['email']] = (time.monotonic() + self.ttl, cached)
+            self._entries.move_to_end(identity['email'])
+            self._trim()
+
+    def get(self, conn, email):
+        """Return the cached identity for ``email``, loading it on a miss or expiry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        identity = lookup(conn, email)
+        if identity is None:
+            # unknown emails are never cached, so a signup is visible immediately
+            self.invalidate(email)
+            return None
+        self.put(identity)
+        return {key: value for key, value in identity.items() if key != 'password'}
+
+    def profile(self, conn, email, role):
+        """The cached Buyer / Sellers / Helpdesk profile dict for ``email``, or None."""
+        identity = self.get(conn, email)
+        return identity[role] if identity else None
+
+    def invalidate(self, email=None):
+        """Drop one email's entry, or every entry when ``email`` is None."""
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(email, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+#=======================IdentityCache=======================#
+
+
+cache = IdentityCache()
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set cache defaults on ``app.config`` and size the process-wide cache from them."""
+    app.config.setdefault('IDENTITY_CACHE_SIZE', 1024)
+    app.config.setdefault('IDENTITY_CACHE_TTL', 300.0)
+    cache.configure(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+#=======================Flask binding=======================#
@@ -0,0 +1,291 @@
+import json
+import logging
+import sqlite3
+import statistics
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:  #<- optional; the stdlib path below gives the same numbers, just slower
+    numpy = None
+
+import taxonomy
+
+# Marketplace-wide figures for "MarketAnalysis" helpdesk requests.
+#
+# view_request shows a report with sale amount statistics (mean, median,
+# quartiles), revenue per category subtree, the top sellers and the review
+# rating distribution. The report is kept as JSON snapshots in
+# Market_Snapshots, one row per section, each stamped with the watermark of
+# the data it was computed from:
+#
+#   sales       count, revenue, mean     max Orders.order_id
+#   quantiles   median and quartiles     max Orders.order_id
+#   categories  revenue per subtree      max Orders.order_id + categories version
+#   sellers     top sellers by revenue   max Orders.order_id + reviews version
+#   ratings     1-5 star distribution    reviews version
+#
+# get_report() compares watermarks (a few primary key lookups) and only
+# recomputes sections whose inputs moved. Sales totals and category revenue
+# are additive, so they are brought forward by aggregating just the orders
+# past the watermark. Quantiles aren't, and need every payment, so they are
+# OFFLINE: get_report() only reads their last snapshot, and
+# `python market_analysis.py refresh` (run it from cron) recomputes them in
+# one pass over the payment column, vectorized with numpy when it's
+# installed. Top sellers and ratings read the Seller_Sales_Totals /
+# Listing_Ratings rollups rather than Orders and Reviews.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Market_Snapshots (
+    section TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    refreshed_at TEXT NOT NULL
+);
+INSERT OR IGNORE INTO Cache_Versions (name, version) VALUES ('reviews', 0);
+'''
+
+logger = logging.getLogger(__name__)
+
+REVIEWS_KEY = 'reviews'
+SECTIONS = ('sales', 'quantiles', 'categories', 'sellers', 'ratings')
+OFFLINE = frozenset({'quantiles'})  #<- never recomputed on the request path
+TOP_SELLERS = 10
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def bump_reviews(conn):
+    """Mark the ratings snapshot stale. Call inside the review's write transaction."""
+    conn.execute(
+        'UPDATE Cache_Versions SET version = version + 1 WHERE name = ?',
+        (REVIEWS_KEY,)
+    )
+
+
+def _version(conn, name):
+    row = conn.execute('SELECT version FROM Cache_Versions WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def watermarks(conn):
+    return {
+        'orders': conn.execute('SELECT COALESCE(MAX(order_id), 0) FROM Orders').fetchone()[0],
+        'categories': _version(conn, taxonomy.VERSION_KEY),
+        'reviews': _version(conn, REVIEWS_KEY),
+    }
+
+
+# which watermarks each section depends on
+DEPENDS = {
+    'sales': ('orders',),
+    'quantiles': ('orders',),
+    'categories': ('orders', 'categories'),
+    'sellers': ('orders', 'reviews'),
+    'ratings': ('reviews',),
+}
+
+
+#=======================Sections=======================#
+def distribution(values):
+    """Mean, median, quartiles, p90, min and max of a sequence of numbers."""
+    if len(values) == 0:
+        return {'count': 0, 'total': 0.0, 'mean': None, 'median': None, 'p25': None,
+                'p75': None, 'p90': None, 'min': None, 'max': None}
+    if numpy is not None:
+        array = numpy.asarray(values, dtype=float)
+        p25, median, p75, p90 = numpy.percentile(array, [25, 50, 75, 90])
+        return {'count': int(array.size), 'total': float(array.sum()), 'mean': float(array.mean()),
+                'median': float(median), 'p25': float(p25), 'p75': float(p75), 'p90': float(p90),
+                'min': float(array.min()), 'max': float(array.max())}
+    ordered = sorted(float(v) for v in values)
+
+    def pct(p):  #<- linear interpolation, same as numpy.percentile's default
+        k = (len(ordered) - 1) * p / 100
+        lo = int(k)
+        hi = min(lo + 1, len(ordered) - 1)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+    return {'count': len(ordered), 'total': sum(ordered), 'mean': statistics.fmean(ordered),
+            'median': statistics.median(ordered), 'p25': pct(25), 'p75': pct(75), 'p90': pct(90),
+            'min': ordered[0], 'max': ordered[-1]}
+
+
+def _sales(conn, previous, since):
+    # like _categories: the old totals plus the orders past the watermark
+    row = conn.execute(
+        '''SELECT COUNT(*), COALESCE(SUM(payment), 0), COALESCE(SUM(quantity), 0), MIN(payment), MAX(payment)
+           FROM Orders WHERE order_id > ?''',
+        (since if previous else 0,)
+    ).fetchone()
+    count, total, units = row[0], row[1], row[2]
+    low, high = row[3], row[4]
+    if previous and previous['count']:
+        count += previous['count']
+        total += previous['total']
+        units += previous['units']
+        low = previous['min'] if low is None else min(low, previous['min'])
+        high = previous['max'] if high is None else max(high, previous['max'])
+    return {'count': count, 'total': total, 'units': units, 'mean': total / count if count else None,
+            'min': low, 'max': high, 'incremental': previous is not None}
+
+
+def _quantiles(conn, previous, since):
+    payments = [row[0] for row in conn.execute('SELECT payment FROM Orders')]
+    stats = distribution(payments)
+    return {key: stats[key] for key in ('count', 'median', 'p25', 'p75', 'p90')}
+
+
+def _categories(conn, previous, since):
+    # previous is only passed when the category tree hasn't changed, so the
+    # old per-subtree sums stay valid and just the new orders are added
+    totals = {row['category']: row for row in previous['subtrees']} if previous else {}
+    rows = conn.execute(
+        '''SELECT cc.ancestor AS category, SUM(o.payment) AS revenue,
+                  COUNT(*) AS orders, SUM(o.quantity) AS units
+           FROM Orders o
+           JOIN Product_Listings pl ON pl.listing_id = o.listing_id
+           JOIN Category_Closure cc ON cc.descendant = pl.category
+           WHERE o.order_id > ?
+           GROUP BY cc.ancestor''',
+        (since if previous else 0,)
+    ).fetchall()
+    for row in rows:
+        entry = totals.setdefault(row['category'], {'category': row['category'], 'revenue': 0.0,
+                                                    'orders': 0, 'units': 0})
+        entry['revenue'] += row['revenue'] or 0.0
+        entry['orders'] += row['orders']
+        entry['units'] += row['units'] or 0
+    subtrees = sorted(totals.values(), key=lambda e: (-e['revenue'], e['category']))
+    return {'subtrees': subtrees, 'incremental': previous is not None}
+
+
+def _sellers(conn, previous, since):
+    rows = conn.execute(
+        '''SELECT t.seller_email, s.business_name, t.revenue, t.orders, t.units,
+                  CASE WHEN t.rating_count > 0 THEN 1.0 * t.rating_sum / t.rating_count END AS avg_rating
+           FROM Seller_Sales_Totals t
+           LEFT JOIN Sellers s ON s.email = t.seller_email
+           ORDER BY t.revenue DESC
+           LIMIT ?''',
+        (TOP_SELLERS,)
+    ).fetchall()
+    return {'top': [dict(row) for row in rows]}
+
+
+def _ratings(conn, previous, since):
+    row = conn.execute(
+        '''SELECT COALESCE(SUM(stars_1), 0), COALESCE(SUM(stars_2), 0), COALESCE(SUM(stars_3), 0),
+                  COALESCE(SUM(stars_4), 0), COALESCE(SUM(stars_5), 0),
+                  COALESCE(SUM(rating_sum), 0), COALESCE(SUM(rating_count), 0)
+           FROM Listing_Ratings'''
+    ).fetchone()
+    stars = list(row[:5])
+    count = row[6]
+    return {'stars': stars, 'count': count, 'mean': row[5] / count if count else None}
+
+
+BUILDERS = {'sales': _sales, 'quantiles': _quantiles, 'categories': _categories, 'sellers': _sellers, 'ratings': _ratings}
+#=======================Sections=======================#
+
+
+def _load(conn):
+    return {
+        row[0]: (json.loads(row[1]), json.loads(row[2]), row[3])
+        for row in conn.execute('SELECT section, watermark, payload, refreshed_at FROM Market_Snapshots')
+    }
+
+
+def refresh(conn, force=False, offline=False):
+    """Bring every stale section up to date and store it. Returns the report dict.
+
+    OFFLINE sections are only recomputed when ``offline`` is set; otherwise
+    their last snapshot is returned as it is, with ``stale`` set if orders
+    have come in since. The caller's transaction is committed. If the
+    snapshot can't be written (e.g. the database is locked) the freshly
+    computed report is still returned.
+    """
+    marks = watermarks(conn)
+    stored = _load(conn)
+    report, updates = {}, []
+    for section in SECTIONS:
+        wanted = {key: marks[key] for key in DEPENDS[section]}
+        old = stored.get(section)
+        if old and not force and old[0] == wanted:
+            report[section] = dict(old[1], refreshed_at=old[2], stale=False)
+            continue
+        if section in OFFLINE and not offline:
+            payload = old[1] if old else {'count': 0, 'median': None, 'p25': None, 'p75': None, 'p90': None}
+            report[section] = dict(payload, refreshed_at=old[2] if old else None, stale=True)
+            continue
+        # incremental only when nothing but the order watermark moved forward
+        previous = None
+        if old and not force and all(old[0].get(k) == v for k, v in wanted.items() if k != 'orders') \
+                and old[0].get('orders', 0) <= wanted.get('orders', 0):
+            previous = old[1]
+        started = time.perf_counter()
+        payload = BUILDERS[section](conn, previous, old[0].get('orders', 0) if old else 0)
+        payload['took_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        payload.setdefault('incremental', False)
+        refreshed_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        report[section] = dict(payload, refreshed_at=refreshed_at, stale=False)
+        updates.append((section, json.dumps(wanted), json.dumps(payload), refreshed_at))
+
+    if updates:
+        try:
+            conn.executemany(
+                '''INSERT INTO Market_Snapshots (section, watermark, payload, refreshed_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (section) DO UPDATE SET
+                       watermark = excluded.watermark, payload = excluded.payload,
+                       refreshed_at = excluded.refreshed_at''',
+                updates
+            )
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            logger.warning('Market snapshot not saved: %s', e)
+    report['refreshed'] = [u[0] for u in updates]
+    return report
+
+
+def get_report(conn):
+    """The current market report; only stale sections are recomputed, and never the OFFLINE ones."""
+    return refresh(conn)
+
+
+def invalidate(conn):
+    """Drop every snapshot so the next report recomputes it in full. Doesn't commit."""
+    conn.execute('DELETE FROM Market_Snapshots')
+
+
+def rebuild(conn):
+    """Recompute every section from scratch and store it."""
+    invalidate(conn)
+    return refresh(conn, force=True, offline=True)
+
+
+if __name__ == '__main__':
+    # python market_analysis.py refresh|rebuild [path/to/database.db]
+    if len(sys.argv) < 2 or sys.argv[1] not in ('refresh', 'rebuild'):
+        print('usage: python market_analysis.py refresh|rebuild [database]')
+        sys.exit(1)
+    database = sys.argv[2] if len(sys.argv) > 2 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    report = rebuild(conn) if sys.argv[1] == 'rebuild' else refresh(conn, offline=True)
+    conn.close()
+    sales = report['sales']
+    print(f"{sales['count']} orders, mean {sales['mean'] or 0:.2f}, median {report['quantiles']['median'] or 0:.2f} "
+          f"(numpy {'on' if numpy is not None else 'off'})")
+    for section in SECTIONS:
+        if section not in report['refreshed']:
+            print(f"{section:<11} up to date (computed {report[section]['refreshed_at']})")
+        else:
+            print(f"{section:<11} {report[section]['took_ms']:>8.2f} ms "
+                  f"{'incremental' if report[section]['incremental'] else 'full'}")
@@ -0,0 +1,165 @@
+import sqlite3
+import sys
+import time
+
+import cart
+import catalog_cache
+import market_analysis
+import ratings
+import request_queue
+import routing
+import search
+import seller_analytics
+import taxonomy
+
+# Versioned schema migrations.
+#
+# Each migration is (version, name, func(conn)). Applied versions are recorded
+# in Schema_Migrations; migrate() runs whatever is missing, in order, on the
+# first pooled connection of each process. Migrations must be idempotent
+# (IF NOT EXISTS, existence checks) because two workers may start at once.
+
+def _rating_summaries(conn):
+    ratings.ensure_schema(conn)
+
+
+def _listing_search_index(conn):
+    search.ensure_schema(conn)
+
+
+def _category_cache_and_hierarchy(conn):
+    taxonomy.ensure_schema(conn)
+
+
+def _hot_path_indexes(conn):
+    # Indexes for the query shapes app.py issues on every dashboard/search hit;
+    # see query_audit.py for the plans they fix.
+    conn.executescript('''
+        -- product pages, checkout and order joins look listings up by id alone,
+        -- which the (seller_email, listing_id) primary key can't serve
+        CREATE INDEX IF NOT EXISTS idx_listings_listing_id
+            ON Product_Listings(listing_id);
+        -- featured/recent/newest: active listings walked by id
+        CREATE INDEX IF NOT EXISTS idx_listings_status_listing
+            ON Product_Listings(status, listing_id);
+        -- category filter and price sort within a category
+        CREATE INDEX IF NOT EXISTS idx_listings_category_price
+            ON Product_Listings(category, product_price);
+        -- reviews for a listing: Reviews -> Orders by listing, newest first
+        CREATE INDEX IF NOT EXISTS idx_orders_listing_date
+            ON Orders(listing_id, date);
+        -- order history newest first; order_id rides along as the rowid, so these
+        -- also cover (email, date, order_id) keyset paging. They replace the
+        -- single-column buyer/seller indexes.
+        CREATE INDEX IF NOT EXISTS idx_orders_buyer_date
+            ON Orders(buyer_email, date);
+        CREATE INDEX IF NOT EXISTS idx_orders_seller_date
+            ON Orders(seller_email, date);
+        DROP INDEX IF EXISTS idx_orders_buyer;
+        DROP INDEX IF EXISTS idx_orders_seller;
+        -- helpdesk tabs: one staff member's requests in one status, newest first
+        CREATE INDEX IF NOT EXISTS idx_requests_staff_status
+            ON Requests(helpdesk_staff_email, request_status, request_id);
+        -- buyer dashboard / checkout payment methods
+        CREATE INDEX IF NOT EXISTS idx_credit_cards_owner
+            ON Credit_Cards(owner_email);
+    ''')
+    conn.execute('ANALYZE')
+
+
+def _seller_sales_rollups(conn):
+    seller_analytics.ensure_schema(conn)
+
+
+def _shopping_carts(conn):
+    cart.ensure_schema(conn)
+
+
+def _request_queue_counts(conn):
+    request_queue.ensure_schema(conn)
+
+
+def _request_routing(conn):
+    routing.ensure_schema(conn)
+
+
+def _market_snapshots(conn):
+    market_analysis.ensure_schema(conn)
+
+
+def _catalog_versions(conn):
+    catalog_cache.ensure_schema(conn)
+
+
+def _category_closure_descendant_index(conn):
+    # part of taxonomy.CLOSURE_SCHEMA now; databases that ran migration 3
+    # before it was added get it here
+    conn.executescript(taxonomy.CLOSURE_SCHEMA)
+
+
+MIGRATIONS = [
+    (1, 'listing rating summaries', _rating_summaries),
+    (2, 'listing full-text search index', _listing_search_index),
+    (3, 'category cache versions and closure table', _category_cache_and_hierarchy),
+    (4, 'hot path indexes', _hot_path_indexes),
+    (5, 'seller sales rollups', _seller_sales_rollups),
+    (6, 'server-side shopping carts', _shopping_carts),
+    (7, 'helpdesk request queue counts', _request_queue_counts),
+    (8, 'helpdesk request routing state', _request_routing),
+    (9, 'market analysis snapshots', _market_snapshots),
+    (10, 'catalog versions for HTTP caching', _catalog_versions),
+    (11, 'category closure descendant index', _category_closure_descendant_index),
+]
+
+
+def _applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Schema_Migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    return {row[0] for row in conn.execute('SELECT version FROM Schema_Migrations')}
+
+
+def pending(conn):
+    applied = _applied_versions(conn)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def migrate(conn, verbose=False):
+    """Apply every pending migration. Returns the list of versions applied."""
+    done = []
+    for version, name, func in pending(conn):
+        started = time.perf_counter()
+        func(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO Schema_Migrations (version, name, applied_at) VALUES (?, ?, datetime('now'))",
+            (version, name)
+        )
+        conn.commit()
+        done.append(version)
+        if verbose:
+            print(f'Applied migration {version}: {name} ({time.perf_counter() - started:.2f}s)')
+    return done
+
+
+if __name__ == '__main__':
+    # python migrations.py [--status] [path/to/database.db]
+    args = sys.argv[1:]
+    status_only = '--status' in args
+    args = [a for a in args if a != '--status']
+    database = args[0] if args else 'database.db'
+
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    if status_only:
+        applied = _applied_versions(conn)
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>4}  {'applied' if version in applied else 'pending':<8} {name}")
+    else:
+        applied = migrate(conn, verbose=True)
+        if not applied:
+            print('Database is up to date.')
+    conn.close()
@@ -0,0 +1,68 @@
+import base64
+import json
+
+# Keyset-paginated order history for the buyer and seller dashboards.
+#
+# Pages are ordered newest first by (date, order_id) and a page boundary is a
+# single row-value comparison, so every page costs the same however long the
+# history is. idx_orders_buyer_date / idx_orders_seller_date (migration 4)
+# serve both the filter and the order: order_id is the rowid, so it rides
+# along at the end of each index.
+
+# has_review is a primary key probe on Reviews, once per row on the page
+HAS_REVIEW = 'EXISTS (SELECT 1 FROM Reviews r WHERE r.order_id = o.order_id)'
+
+ROLES = ('buyer', 'seller')
+
+
+def build_page_query(role, email, after=None, limit=20):
+    """Return (sql, params) for one page of a buyer's or seller's orders.
+
+    ``after`` is the (date, order_id) pair from decode_cursor(); the query
+    asks for limit + 1 rows so the caller can tell whether a next page exists.
+    """
+    if role not in ROLES:
+        raise ValueError(f'unknown order history role: {role}')
+    sql = f'''
+        SELECT o.*, pl.Product_Title, pl.Product_Description, pl.Product_Price,
+               {HAS_REVIEW} AS has_review
+        FROM Orders o
+        JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
+        WHERE o.{role}_email = ?'''
+    params = [email]
+    if after is not None:
+        sql += ' AND (o.date, o.order_id) < (?, ?)'
+        params.extend(after)
+    sql += ' ORDER BY o.date DESC, o.order_id DESC LIMIT ?'
+    params.append(int(limit) + 1)
+    return sql, params
+
+
+def get_page(conn, role, email, after=None, limit=20):
+    """Return (orders, next_cursor) with at most ``limit`` orders."""
+    sql, params = build_page_query(role, email, after, limit)
+    rows = conn.execute(sql, params).fetchmany(int(limit) + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def encode_cursor(row):
+    payload = json.dumps([row['date'], row['order_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the (date, order_id) pair from a page token, or None if it is unusable."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        order_date, order_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(order_date, str) or not isinstance(order_id, int):
+        return None
+    return [order_date, order_id]
@@ -0,0 +1,288 @@
+import cProfile
+import collections
+import os
+import random
+import re
+import threading
+import time
+
+from flask import g, request, template_rendered, before_render_template
+
+# Request profiling: per-route latency, SQL and template timings.
+#
+# Every request gets a Recorder in flask.g. db.get_connection() hands it to
+# the pooled connection, whose TimedCursor (db.py) reports each statement's
+# execute + fetch time and row count to it; Flask's template signals time
+# rendering. When the request ends, the recorder is folded into the
+# process-wide Metrics:
+#
+#   routes      per endpoint: request count, errors, and histograms of wall
+#               time, SQL time, statements per request and template time
+#   statements  per normalized SQL text: calls, total/max time, rows
+#   slow        the last SLOW_LOG_SIZE statements slower than
+#               PROFILE_SLOW_QUERY_MS, also written to app.logger
+#
+# /metrics serves these as JSON, or in the Prometheus text format with
+# ?format=prometheus.
+#
+# cProfile is opt-in per endpoint: PROFILE_CPROFILE = {'product_search': 0.05}
+# profiles about 5% of product_search requests and writes each one to
+# PROFILE_CPROFILE_DIR/<endpoint>-<time>.prof (view with `python -m pstats`).
+
+SLOW_LOG_SIZE = 100
+MAX_STATEMENTS = 500  #<- distinct SQL texts tracked; beyond this new ones are counted as "other"
+
+# bucket upper bounds
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement from different call sites groups together."""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+#=======================Histogram=======================#
+class Histogram:
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  #<- last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate from the buckets: the upper bound of the bucket holding the q-th value."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound if bound != float('inf') else self.bounds[-1]
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {('+Inf' if i == len(self.bounds) else str(self.bounds[i])): n
+                        for i, n in enumerate(self.counts)},
+        }
+#=======================Histogram=======================#
+
+
+#=======================Recorder=======================#
+class Recorder:
+    """What one request did. TimedCursor updates the [sql, seconds, rows] entries in place."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []
+        self.template_time = 0.0
+        self._template_started = None
+
+    def statement(self, sql):
+        entry = [sql, 0.0, 0]
+        self.statements.append(entry)
+        return entry
+#=======================Recorder=======================#
+
+
+#=======================Metrics=======================#
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.statements = {}
+            self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+            self.profiles = 0
+            self.started = time.time()
+
+    def _route(self, endpoint):
+        route = self.routes.get(endpoint)
+        if route is None:
+            route = self.routes[endpoint] = {
+                'requests': 0,
+                'errors': 0,
+                'wall_seconds': Histogram(SECONDS_BUCKETS),
+                'sql_seconds': Histogram(SECONDS_BUCKETS),
+                'sql_statements': Histogram(COUNT_BUCKETS),
+                'template_seconds': Histogram(SECONDS_BUCKETS),
+            }
+        return route
+
+    def record(self, endpoint, status, recorder, slow_threshold):
+        """Fold one finished request in. Returns the statements slower than the threshold."""
+        wall = time.perf_counter() - recorder.started
+        sql_time = sum(entry[1] for entry in recorder.statements)
+        slow = [entry for entry in recorder.statements if entry[1] >= slow_threshold]
+        with self._lock:
+            route = self._route(endpoint)
+            route['requests'] += 1
+            if status >= 500:
+                route['errors'] += 1
+            route['wall_seconds'].observe(wall)
+            route['sql_seconds'].observe(sql_time)
+            route['sql_statements'].observe(len(recorder.statements))
+            route['template_seconds'].observe(recorder.template_time)
+            for sql, seconds, rows in recorder.statements:
+                key = normalize_sql(sql)
+                stat = self.statements.get(key)
+                if stat is None:
+                    if len(self.statements) >= MAX_STATEMENTS:
+                        key = '(other)'
+                        stat = self.statements.get(key)
+                    if stat is None:
+                        stat = self.statements[key] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                       'rows': 0, 'routes': set()}
+                stat['calls'] += 1
+                stat['seconds'] += seconds
+                stat['max_seconds'] = max(stat['max_seconds'], seconds)
+                stat['rows'] += rows
+                stat['routes'].add(endpoint)
+            for sql, seconds, rows in slow:
+                self.slow.append({'endpoint': endpoint, 'sql': normalize_sql(sql),
+                                  'ms': round(seconds * 1000, 3), 'rows': rows,
+                                  'at': time.strftime('%Y-%m-%d %H:%M:%S')})
+        return slow
+
+    def snapshot(self, top=50):
+        with self._lock:
+            routes = {
+                endpoint: {
+                    'requests': r['requests'],
+                    'errors': r['errors'],
+                    'wall_seconds': r['wall_seconds'].to_dict(),
+                    'sql_seconds': r['sql_seconds'].to_dict(),
+                    'sql_statements': r['sql_statements'].to_dict(),
+                    'template_seconds': r['template_seconds'].to_dict(),
+                }
+                for endpoint, r in sorted(self.routes.items())
+            }
+            statements = sorted(self.statements.items(), key=lambda item: -item[1]['seconds'])[:top]
+            return {
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'routes': routes,
+                'statements': [
+                    {'sql': sql, 'calls': s['calls'], 'seconds': round(s['seconds'], 6),
+                     'avg_ms': round(s['seconds'] / s['calls'] * 1000, 3),
+                     'max_ms': round(s['max_seconds'] * 1000, 3), 'rows': s['rows'],
+                     'routes': sorted(s['routes'])}
+                    for sql, s in statements
+                ],
+                'slow_queries': list(self.slow),
+                'profiles_written': self.profiles,
+            }
+
+    def prometheus(self):
+        """The route histograms in the Prometheus text exposition format."""
+        lines = []
+        names = {
+            'wall_seconds': 'nittany_request_duration_seconds',
+            'sql_seconds': 'nittany_request_sql_seconds',
+            'sql_statements': 'nittany_request_sql_statements',
+            'template_seconds': 'nittany_request_template_seconds',
+        }
+        with self._lock:
+            for key, name in names.items():
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, route in sorted(self.routes.items()):
+                    hist = route[key]
+                    cumulative = 0
+                    for i, n in enumerate(hist.counts):
+                        cumulative += n
+                        le = '+Inf' if i == len(hist.bounds) else repr(hist.bounds[i])
+                        lines.append(f'{name}_bucket{{route="{endpoint}",le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{route="{endpoint}"}} {hist.sum:.6f}')
+                    lines.append(f'{name}_count{{route="{endpoint}"}} {hist.count}')
+            lines.append('# TYPE nittany_request_errors_total counter')
+            for endpoint, route in sorted(self.routes.items()):
+                lines.append(f'nittany_request_errors_total{{route="{endpoint}"}} {route["errors"]}')
+        return '\n'.join(lines) + '\n'
+#=======================Metrics=======================#
+
+
+metrics = Metrics()
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set profiling defaults on ``app.config`` and install the request hooks."""
+    app.config.setdefault('PROFILING', True)
+    app.config.setdefault('PROFILE_SLOW_QUERY_MS', 100.0)
+    app.config.setdefault('PROFILE_CPROFILE', {})  #<- endpoint -> fraction of requests to profile
+    app.config.setdefault('PROFILE_CPROFILE_DIR', 'profiles')
+
+    @app.before_request
+    def _start_profiling():
+        if not app.config['PROFILING']:
+            return
+        g.sql_recorder = Recorder()
+        rate = app.config['PROFILE_CPROFILE'].get(request.endpoint, 0)
+        if rate and random.random() < rate:
+            g.cprofile = cProfile.Profile()
+            g.cprofile.enable()
+
+    @app.after_request
+    def _finish_profiling(response):
+        recorder = g.pop('sql_recorder', None)
+        if recorder is None:
+            return response
+        conn = g.get('db_conn')
+        if conn is not None:
+            conn.recorder = None  #<- anything after this (teardown) isn't part of the route
+        profile = g.pop('cprofile', None)
+        if profile is not None:
+            profile.disable()
+            _write_profile(app, profile, request.endpoint)
+        endpoint = request.endpoint or '(unmatched)'
+        slow = metrics.record(endpoint, response.status_code, recorder,
+                              app.config['PROFILE_SLOW_QUERY_MS'] / 1000.0)
+        for sql, seconds, rows in slow:
+            app.logger.warning('Slow query (%.1f ms, %d rows) in %s: %s',
+                               seconds * 1000, rows, endpoint, normalize_sql(sql))
+        return response
+
+    def _template_starting(sender, template, context, **extra):
+        recorder = g.get('sql_recorder')
+        if recorder is not None:
+            recorder._template_started = time.perf_counter()
+
+    def _template_done(sender, template, context, **extra):
+        recorder = g.get('sql_recorder')
+        if recorder is not None and recorder._template_started is not None:
+            recorder.template_time += time.perf_counter() - recorder._template_started
+            recorder._template_started = None
+
+    before_render_template.connect(_template_starting, app, weak=False)
+    template_rendered.connect(_template_done, app, weak=False)
+
+
+def _write_profile(app, profile, endpoint):
+    directory = app.config['PROFILE_CPROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-'
+                                   f'{random.randrange(1 << 16):04x}.prof')
+    profile.dump_stats(path)
+    with metrics._lock:
+        metrics.profiles += 1
+    app.logger.info('cProfile for %s written to %s', endpoint, path)
+#=======================Flask binding=======================#
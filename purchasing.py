@@ -0,0 +1,132 @@
+import cart
+import catalog_cache
+import db
+import seller_analytics
+
+# Contention-safe order placement.
+#
+# The whole purchase is one BEGIN IMMEDIATE transaction: the write lock is
+# taken up front, so two buyers can't both read the same stock and then both
+# write it back. Inventory is decremented with a conditional UPDATE
+# (quantity >= ?), so the stock check and the write are one statement and a
+# listing can never go negative. If the lock is still held after the
+# connection's busy_timeout, the attempt is retried with jittered backoff
+# (db.run_immediate).
+
+
+class CheckoutError(Exception):
+    """The order can't be placed; str(e) is safe to flash to the buyer."""
+
+
+class OutOfStock(CheckoutError):
+    pass
+
+
+class CheckoutBusy(CheckoutError, db.DatabaseBusy):
+    pass
+
+
+def _buy(conn, buyer_email, listing_id, quantity):
+    # status is stored as text; comparing with 1 / assigning 1 keeps it '1'/'2'
+    product = conn.execute(
+        '''UPDATE Product_Listings
+           SET Quantity = Quantity - ?,
+               Status = CASE WHEN Quantity - ? > 0 THEN 1 ELSE 2 END
+           WHERE Listing_ID = ? AND Status = 1 AND Quantity >= ?
+           RETURNING Seller_Email, Product_Price''',
+        (quantity, quantity, listing_id, quantity)
+    ).fetchone()
+    if product is None:
+        raise OutOfStock('Not enough stock left for this product')
+
+    seller_email, price = product[0], float(product[1])
+    payment = price * quantity
+    order = conn.execute(
+        '''INSERT INTO Orders (Seller_Email, Listing_ID, Buyer_Email, Date, Quantity, Payment)
+           VALUES (?, ?, ?, date('now'), ?, ?)
+           RETURNING Order_ID, Date''',
+        (seller_email, listing_id, buyer_email, quantity, payment)
+    ).fetchone()
+    conn.execute(
+        'UPDATE Sellers SET balance = balance + ? WHERE email = ?',
+        (payment, seller_email)
+    )
+    seller_analytics.record_order(conn, seller_email, listing_id, order[1], quantity, payment)
+    catalog_cache.bump(conn, [listing_id])  #<- stock (and maybe status) changed
+    return order[0]
+
+
+def _buy_cart(conn, buyer_email):
+    lines = conn.execute(
+        'SELECT listing_id, quantity FROM Cart_Items WHERE buyer_email = ? ORDER BY listing_id',
+        (buyer_email,)
+    ).fetchall()
+    if not lines:
+        raise CheckoutError('Your cart is empty')
+
+    orders, credits, sales = [], {}, []
+    for listing_id, quantity in lines:
+        product = conn.execute(
+            """UPDATE Product_Listings
+               SET Quantity = Quantity - ?,
+                   Status = CASE WHEN Quantity - ? > 0 THEN 1 ELSE 2 END
+               WHERE Listing_ID = ? AND Status = 1 AND Quantity >= ?
+               RETURNING Seller_Email, Product_Price""",
+            (quantity, quantity, listing_id, quantity)
+        ).fetchone()
+        if product is None:
+            # nothing has been committed; the whole cart rolls back
+            title = conn.execute(
+                'SELECT Product_Title FROM Product_Listings WHERE Listing_ID = ?', (listing_id,)
+            ).fetchone()
+            raise OutOfStock(f"Not enough stock left for {title[0] if title else f'product #{listing_id}'}")
+        seller_email, payment = product[0], float(product[1]) * quantity
+        orders.append((seller_email, listing_id, buyer_email, quantity, payment))
+        credits[seller_email] = credits.get(seller_email, 0.0) + payment
+        sales.append((seller_email, listing_id, quantity, payment))
+
+    first_order = conn.execute('SELECT COALESCE(MAX(Order_ID), 0) FROM Orders').fetchone()[0]
+    conn.executemany(
+        """INSERT INTO Orders (Seller_Email, Listing_ID, Buyer_Email, Date, Quantity, Payment)
+           VALUES (?, ?, ?, date('now'), ?, ?)""",
+        orders
+    )
+    # one balance update per seller, however many of their products were bought
+    conn.executemany(
+        'UPDATE Sellers SET balance = balance + ? WHERE email = ?',
+        [(amount, seller_email) for seller_email, amount in credits.items()]
+    )
+    today = conn.execute("SELECT date('now')").fetchone()[0]
+    for seller_email, listing_id, quantity, payment in sales:
+        seller_analytics.record_order(conn, seller_email, listing_id, today, quantity, payment)
+    catalog_cache.bump(conn, [line[0] for line in lines])
+    cart.clear(conn, buyer_email)
+    return [r[0] for r in conn.execute(
+        'SELECT Order_ID FROM Orders WHERE Order_ID > ? ORDER BY Order_ID', (first_order,)
+    ).fetchall()]
+
+
+def run_immediate(conn, func, *args, **retry):
+    """db.run_immediate(), raising CheckoutBusy so the checkout views can flash it."""
+    try:
+        return db.run_immediate(conn, func, *args, **retry)
+    except db.DatabaseBusy:
+        raise CheckoutBusy('The store is busy right now, please try again') from None
+
+
+def place_order(conn, buyer_email, listing_id, quantity, **retry):
+    """Buy `quantity` of a listing atomically. Returns the new Order_ID.
+
+    Raises OutOfStock if the listing is inactive or has fewer than
+    `quantity` units left, CheckoutBusy if the write lock can't be had.
+    """
+    return run_immediate(conn, _buy, buyer_email, listing_id, int(quantity), **retry)
+
+
+def place_cart_order(conn, buyer_email, **retry):
+    """Buy everything in the buyer's cart in one transaction and empty it.
+
+    Returns the new Order_IDs. Either every line is bought or none is:
+    raises OutOfStock naming the first product that can't be filled.
+    """
+    return run_immediate(conn, _buy_cart, buyer_email, **retry)
@@ -0,0 +1,246 @@
+import sqlite3
+import sys
+
+import app
+import catalog_cache
+import identity
+import migrations
+import order_history
+import request_queue
+import routing
+import search
+
+# EXPLAIN QUERY PLAN audit for the queries app.py issues.
+#
+#   python query_audit.py [database]            report every plan
+#   python query_audit.py --apply [database]    run pending migrations first
+#   python query_audit.py --check [database]    exit 1 on any unexpected full
+#                                               scan or temp B-tree (CI/regression use)
+#
+# A finding is "expected" when it is listed in ALLOWED with the reason it is
+# acceptable; everything else fails --check.
+
+E = 'someone@nittybiz.com'
+
+QUERIES = [
+    ('login: account, roles and profile', identity.LOOKUP_SQL, (E,)),
+    ('seller_dashboard: balance', 'SELECT balance FROM Sellers WHERE email = ?', (E,)),
+
+    ('buyer_dashboard: address',
+     '''SELECT a.*, z.city, z.state FROM Address a
+        JOIN Zipcode_Info z ON a.zipcode = z.zipcode WHERE a.address_id = ?''', (1,)),
+    ('buyer_dashboard: payment methods',
+     'SELECT * FROM Credit_Cards WHERE Owner_email = ?', (E,)),
+    ('buyer_dashboard: featured + recent products', app.ACTIVE_LISTING_BLOCKS_SQL, ()),
+    ('buyer_dashboard: profile stats',
+     '''SELECT COUNT(*) AS order_count,
+           COALESCE(SUM(EXISTS (SELECT 1 FROM Reviews r WHERE r.Order_ID = o.Order_ID)), 0) AS review_count
+        FROM Orders o WHERE o.Buyer_Email = ?''', (E,)),
+
+    ('product_detail: listing',
+     '''SELECT pl.*, s.business_name AS seller_name, s.email AS seller_email
+        FROM Product_Listings pl JOIN Sellers s ON pl.Seller_Email = s.email
+        WHERE pl.Listing_ID = ?''', (1,)),
+    ('product_detail: reviews',
+     '''SELECT r.*, o.Buyer_Email, o.Date FROM Reviews r JOIN Orders o ON r.Order_ID = o.Order_ID
+        WHERE o.Listing_ID = ? ORDER BY o.Date DESC''', (1,)),
+    ('product_detail: rating summary',
+     'SELECT * FROM Listing_Ratings WHERE listing_id = ?', (1,)),
+
+    ('submit_review: order',
+     'SELECT * FROM Orders WHERE Order_ID = ? AND Buyer_Email = ?', (1, E)),
+    ('submit_review: existing review', 'SELECT * FROM Reviews WHERE Order_ID = ?', (1,)),
+    ('submit_review: rating summary update',
+     'UPDATE Listing_Ratings SET rating_sum = rating_sum + 1 WHERE listing_id = ?', (1,)),
+
+    ('view_order: seller view',
+     '''SELECT o.*, pl.Product_Title, b.business_name AS buyer_name
+        FROM Orders o JOIN Product_Listings pl ON o.Listing_ID = pl.Listing_ID
+        JOIN Buyer b ON o.Buyer_Email = b.email
+        WHERE o.Order_ID = ? AND pl.Seller_Email = ?''', (1, E)),
+
+    ('checkout: listing',
+     '''SELECT pl.*, s.business_name AS seller_name, s.email AS seller_email
+        FROM Product_Listings pl JOIN Sellers s ON pl.Seller_Email = s.email
+        WHERE pl.Listing_ID = ? AND pl.Status = 1''', (1,)),
+    ('checkout: conditional inventory decrement',
+     '''UPDATE Product_Listings SET Quantity = Quantity - ?, Status = CASE WHEN Quantity - ? > 0 THEN 1 ELSE 2 END
+        WHERE Listing_ID = ? AND Status = 1 AND Quantity >= ? RETURNING Seller_Email, Product_Price''',
+     (1, 1, 1, 1)),
+    ('checkout: seller credit', 'UPDATE Sellers SET balance = balance + ? WHERE email = ?', (1, E)),
+
+    ('cart: items',
+     '''SELECT c.listing_id, c.quantity, pl.Product_Title, pl.Product_Price, pl.Quantity, s.business_name
+        FROM Cart_Items c
+        LEFT JOIN Product_Listings pl ON pl.Listing_ID = c.listing_id
+        LEFT JOIN Sellers s ON s.email = pl.Seller_Email
+        WHERE c.buyer_email = ? ORDER BY c.added_at, c.listing_id''', (E,)),
+    ('cart: place order lines',
+     'SELECT listing_id, quantity FROM Cart_Items WHERE buyer_email = ? ORDER BY listing_id', (E,)),
+
+    ('seller_dashboard: product counts',
+     '''SELECT COUNT(*) AS product_count, COALESCE(SUM(Status = '1'), 0) AS active_product_count
+        FROM Product_Listings WHERE Seller_Email = ?''', (E,)),
+    ('seller_dashboard: products page',
+     'SELECT * FROM Product_Listings WHERE Seller_Email = ? AND Listing_ID < ? ORDER BY Listing_ID DESC LIMIT ?',
+     (E, 1 << 62, 51)),
+    ('seller_dashboard: sales totals',
+     'SELECT * FROM Seller_Sales_Totals WHERE seller_email = ?', (E,)),
+    ('seller_dashboard: monthly series',
+     '''SELECT month AS period, SUM(units), SUM(revenue), SUM(orders) FROM Seller_Sales_Monthly
+        WHERE seller_email = ? GROUP BY month ORDER BY month DESC LIMIT ?''', (E, 12)),
+    ('seller_analytics: daily series for one listing',
+     '''SELECT day AS period, SUM(units), SUM(revenue), SUM(orders) FROM Seller_Sales_Daily
+        WHERE seller_email = ? AND listing_id = ? GROUP BY day ORDER BY day DESC LIMIT ?''', (E, 1, 30)),
+    ('seller_dashboard: top listings',
+     '''SELECT t.listing_id, t.units, t.revenue, t.orders, pl.Product_Title, lr.avg_rating
+        FROM Listing_Sales_Totals t
+        LEFT JOIN Product_Listings pl ON pl.Seller_Email = t.seller_email AND pl.Listing_ID = t.listing_id
+        LEFT JOIN Listing_Ratings lr ON lr.seller_email = t.seller_email AND lr.listing_id = t.listing_id
+        WHERE t.seller_email = ? ORDER BY t.revenue DESC LIMIT ?''', (E, 5)),
+    ('add_product: next listing id',
+     'SELECT COALESCE(MAX(Listing_ID), 0) + 1 FROM Product_Listings', ()),
+
+    ('helpdesk_dashboard: queue counts',
+     '''SELECT staff_email, request_status, requests FROM Request_Queue_Counts
+        WHERE (staff_email = ? AND request_status = ?)
+           OR (staff_email = ? AND request_status IN (?, ?))''',
+     (request_queue.POOL_EMAIL, '0', E, '1', '2')),
+    ('claim_request: conditional update',
+     '''UPDATE Requests SET helpdesk_staff_email = ?, request_status = ?
+        WHERE request_id = ? AND helpdesk_staff_email = ? AND request_status = ?''',
+     (E, '1', 1, request_queue.POOL_EMAIL, '0')),
+
+    ('submit_request: routing candidates', routing.CANDIDATES_SQL, ('1', request_queue.POOL_EMAIL)),
+    ('complete_request: oldest pooled request',
+     '''SELECT request_id FROM Requests WHERE helpdesk_staff_email = ? AND request_status = ?
+        ORDER BY request_id LIMIT 1''', (request_queue.POOL_EMAIL, '0')),
+    ('view_request: market watermark', 'SELECT COALESCE(MAX(order_id), 0) FROM Orders', ()),
+    ('view_request: market sales totals since watermark',
+     '''SELECT COUNT(*), COALESCE(SUM(payment), 0), COALESCE(SUM(quantity), 0), MIN(payment), MAX(payment)
+        FROM Orders WHERE order_id > ?''', (1000,)),
+    ('view_request: market category revenue since watermark',
+     '''SELECT cc.ancestor AS category, SUM(o.payment) AS revenue, COUNT(*) AS orders, SUM(o.quantity) AS units
+        FROM Orders o
+        JOIN Product_Listings pl ON pl.listing_id = o.listing_id
+        JOIN Category_Closure cc ON cc.descendant = pl.category
+        WHERE o.order_id > ? GROUP BY cc.ancestor''', (1000,)),
+    ('categories: cache version',
+     "SELECT version FROM Cache_Versions WHERE name = 'categories'", ()),
+    ('catalog: versions changed since last sync', catalog_cache.CHANGED_SINCE_SQL, (0, 100, 100000)),
+    ('catalog: bumped listing categories and ancestors',
+     catalog_cache.ANCESTORS_SQL.format(changed=catalog_cache.LISTING_CATEGORIES_SQL.format(ids='?')),
+     (1, '["Makeup"]')),
+    ('catalog: seller categories and ancestors',
+     catalog_cache.ANCESTORS_SQL.format(changed=catalog_cache.SELLER_CATEGORIES_SQL), (E,)),
+]
+
+for _sort in ('relevance', 'price_low', 'price_high', 'rating', 'newest'):
+    for _label, _kwargs in (('keyword', {'query': 'mixing bowl'}),
+                            ('category', {'category': 'Makeup'}),
+                            ('browse', {})):
+        _sql, _params = search.build_search_query(sort_by=_sort, limit=25, **_kwargs)
+        QUERIES.append((f'product_search: {_label}, {_sort}', _sql, tuple(_params)))
+_sql, _params = search.build_count_query(cap=1000)
+QUERIES.append(('product_search: capped count', _sql, tuple(_params)))
+
+for _tab in request_queue.TABS:
+    for _after in (None, 1000):
+        _sql, _params = request_queue.build_page_query(_tab, E, _after)
+        QUERIES.append((f"helpdesk_dashboard: {_tab} page{' (after)' if _after else ''}", _sql, tuple(_params)))
+
+for _role in order_history.ROLES:
+    for _label, _after in (('first page', None), ('next page', ['2020/01/01', 1])):
+        _sql, _params = order_history.build_page_query(_role, E, _after)
+        QUERIES.append((f'{_role}_dashboard: order history, {_label}', _sql, tuple(_params)))
+
+# (query name or name prefix, plan detail substring) -> why it is acceptable
+ALLOWED = {
+    ('product_search: browse, rating', 'USE TEMP B-TREE'):
+        'rating sort spans two tables (Listing_Ratings and Product_Listings)',
+    ('product_search: browse, relevance', 'USE TEMP B-TREE'):
+        'no keyword means relevance falls back to rating order',
+    ('product_search: browse, price_low', 'USE TEMP B-TREE'):
+        'catalog-wide price sort; the category variant uses idx_listings_category_price',
+    ('product_search: browse, price_high', 'USE TEMP B-TREE'):
+        'catalog-wide price sort; the category variant uses idx_listings_category_price',
+    ('product_search: keyword,', 'USE TEMP B-TREE'):
+        'the FTS match set is sorted after matching; it is bounded by the match, not the catalog',
+    ('product_search: category,', 'USE TEMP B-TREE'):
+        'a category subtree spans several category values, so no single index order applies',
+    ('cart: items', 'USE TEMP B-TREE FOR ORDER BY'):
+        'sorts one buyer\'s cart, which is capped at cart.MAX_LINES rows',
+    ('buyer_dashboard: featured + recent products', 'USE TEMP B-TREE FOR ORDER BY'):
+        'rating sort spans two tables (Listing_Ratings and Product_Listings)',
+    ('view_request: market category revenue since watermark', 'USE TEMP B-TREE FOR GROUP BY'):
+        'groups only the orders placed since the last snapshot',
+    ('submit_request: routing candidates', 'SCAN h'):
+        'every staff member is a candidate; Helpdesk is one row per staff member',
+    ('catalog: ', 'SCAN changed'):
+        'walks the few categories just changed, materialized from an indexed lookup',
+    ('catalog: seller categories', 'USE TEMP B-TREE FOR DISTINCT'):
+        'de-duplicates the categories of one seller\'s listings',
+}
+
+
+def _is_finding(detail):
+    if detail.startswith('SCAN'):
+        # virtual tables (FTS), constant rows and subquery results are not table scans
+        return not (' VIRTUAL TABLE' in detail or 'CONSTANT ROW' in detail
+                    or detail.startswith('SCAN (subquery'))
+    return 'USE TEMP B-TREE' in detail
+
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def audit(conn):
+    """Return [(name, plan lines, findings, unexpected findings)] for every query."""
+    results = []
+    for name, sql, params in QUERIES:
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            results.append((name, [f'ERROR: {e}'], [f'ERROR: {e}'], [f'ERROR: {e}']))
+            continue
+        findings = [line for line in plan if _is_finding(line)]
+        unexpected = [
+            line for line in findings
+            if not any(name.startswith(key_name) and key_detail in line for key_name, key_detail in ALLOWED)
+        ]
+        results.append((name, plan, findings, unexpected))
+    return results
+
+
+def main(args):
+    check = '--check' in args
+    apply = '--apply' in args
+    args = [a for a in args if not a.startswith('--')]
+    database = args[0] if args else 'database.db'
+
+    conn = sqlite3.connect(database)
+    if apply:
+        migrations.migrate(conn, verbose=True)
+    elif migrations.pending(conn):
+        print('Note: pending migrations; run with --apply to audit the migrated schema.\n')
+
+    failures = 0
+    for name, plan, findings, unexpected in audit(conn):
+        if check and not findings:
+            continue
+        status = 'FAIL' if unexpected else ('ok*' if findings else 'ok')
+        print(f'[{status:>4}] {name}')
+        if not check or unexpected:
+            for line in plan:
+                marker = '!!' if line in unexpected else ('~ ' if line in findings else '  ')
+                print(f'        {marker} {line}')
+        failures += bool(unexpected)
+    conn.close()
+
+    print(f'\n{len(QUERIES)} queries audited, {failures} with unexpected full scans or temp B-trees.')
+    return 1 if (check and failures) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
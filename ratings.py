@@ -0,0 +1,128 @@
+import sqlite3
+import sys
+
+# Denormalized per-listing review summary. Every listing page and rating sort
+# reads one row from here instead of running AVG/COUNT over Reviews JOIN Orders.
+#
+# Rows are keyed by the listing's owner (Product_Listings.seller_email), and
+# reviews are matched to listings through Orders.listing_id, the same way the
+# old correlated subqueries did.
+
+STARS = range(1, 6)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Listing_Ratings (
+    seller_email TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    avg_rating REAL,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_email, listing_id)
+);
+CREATE INDEX IF NOT EXISTS idx_listing_ratings_listing ON Listing_Ratings(listing_id);
+CREATE INDEX IF NOT EXISTS idx_listing_ratings_sort ON Listing_Ratings(avg_rating DESC, rating_count DESC);
+'''
+
+
+def ensure_schema(conn):
+    """Create the summary table if it is missing and backfill it once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Listing_Ratings'"
+    ).fetchone()
+    if exists:
+        return
+    conn.executescript(SCHEMA)
+    rebuild(conn)
+    conn.commit()
+
+
+def rebuild(conn):
+    """Recompute every listing's summary from Reviews (used for backfill/repair)."""
+    conn.execute('DELETE FROM Listing_Ratings')
+    conn.execute('''
+        INSERT INTO Listing_Ratings
+            (seller_email, listing_id, rating_sum, rating_count, avg_rating,
+             stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT pl.seller_email, pl.listing_id,
+               SUM(r.rating), COUNT(r.rating), AVG(r.rating),
+               SUM(r.rating = 1), SUM(r.rating = 2), SUM(r.rating = 3),
+               SUM(r.rating = 4), SUM(r.rating = 5)
+        FROM Reviews r
+        JOIN Orders o ON r.order_id = o.order_id
+        JOIN Product_Listings pl ON pl.listing_id = o.listing_id
+        WHERE r.rating IS NOT NULL
+        GROUP BY pl.seller_email, pl.listing_id
+    ''')
+    return conn.execute('SELECT COUNT(*) FROM Listing_Ratings').fetchone()[0]
+
+
+def apply_review(conn, listing_id, new_rating, old_rating=None):
+    """Fold one inserted (old_rating None) or edited review into the summary.
+
+    Runs inside the caller's transaction so the review and its summary
+    commit together.
+    """
+    new_rating = int(new_rating)
+    old_rating = int(old_rating) if old_rating is not None else None
+    d_sum = new_rating - (old_rating or 0)
+    d_count = 0 if old_rating is not None else 1
+
+    conn.execute(
+        '''INSERT OR IGNORE INTO Listing_Ratings (seller_email, listing_id)
+           SELECT seller_email, listing_id FROM Product_Listings WHERE listing_id = ?''',
+        (listing_id,)
+    )
+
+    star_updates = []
+    params = [d_sum, d_count, d_sum, d_count]
+    for star in STARS:
+        delta = (star == new_rating) - (star == old_rating)
+        if delta:
+            star_updates.append(f'stars_{star} = stars_{star} + ?')
+            params.append(delta)
+    params.append(listing_id)
+
+    # SET expressions see the pre-update row, so the average is recomputed from old + delta
+    conn.execute(
+        f'''UPDATE Listing_Ratings
+            SET rating_sum = rating_sum + ?,
+                rating_count = rating_count + ?,
+                avg_rating = (rating_sum + ?) * 1.0 / NULLIF(rating_count + ?, 0)
+                {''.join(', ' + s for s in star_updates)}
+            WHERE listing_id = ?''',
+        params
+    )
+
+
+def get_summary(conn, listing_id):
+    """Return {'average', 'count', 'histogram'} for a listing (zeros if unreviewed)."""
+    row = conn.execute(
+        'SELECT * FROM Listing_Ratings WHERE listing_id = ?',
+        (listing_id,)
+    ).fetchone()
+    if row is None or not row['rating_count']:
+        return {'average': 0.0, 'count': 0, 'histogram': {star: 0 for star in STARS}}
+    return {
+        'average': row['avg_rating'],
+        'count': row['rating_count'],
+        'histogram': {star: row[f'stars_{star}'] for star in STARS},
+    }
+
+
+if __name__ == '__main__':
+    # python ratings.py rebuild [path/to/database.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('usage: python ratings.py rebuild [database]')
+        sys.exit(1)
+    database = sys.argv[2] if len(sys.argv) > 2 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.executescript(SCHEMA)
+    count = rebuild(conn)
+    conn.commit()
+    conn.close()
+    print(f'Rebuilt rating summaries for {count} listings.')
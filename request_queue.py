@@ -0,0 +1,168 @@
+import sqlite3
+import sys
+
+# Helpdesk request queue: paged tabs, maintained counts and atomic claims.
+#
+# Each dashboard tab is one (helpdesk_staff_email, request_status) bucket,
+# which idx_requests_staff_status (migration 4) covers together with
+# request_id, so a page is an index range scan walked newest first and
+# bounded by LIMIT, however many tickets the bucket holds.
+#
+# Request_Queue_Counts holds one row per bucket and is kept current by
+# triggers on Requests, so the summary cards are a couple of primary key
+# lookups instead of COUNT(*) over every ticket a staff member ever closed.
+#
+# Claiming is a single conditional UPDATE ... RETURNING: the WHERE clause
+# only matches while the ticket is still in the shared pool, so when two
+# staff members claim the same request exactly one of them gets a row back.
+
+POOL_EMAIL = 'helpdeskteam@nittybiz.com'  #<- pseudo staff member that owns unclaimed tickets
+
+UNASSIGNED = '0'
+ASSIGNED = '1'
+COMPLETED = '2'
+
+# tab -> request_status; the unassigned tab reads the pool, the others the current staff member
+TABS = {
+    'unassigned': UNASSIGNED,
+    'assigned': ASSIGNED,
+    'completed': COMPLETED,
+}
+
+COLUMNS = 'request_id, sender_email, helpdesk_staff_email, request_type, request_desc, request_status'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Request_Queue_Counts (
+    staff_email TEXT NOT NULL,
+    request_status TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (staff_email, request_status)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_count_insert
+AFTER INSERT ON Requests
+BEGIN
+    INSERT INTO Request_Queue_Counts (staff_email, request_status, requests)
+    VALUES (NEW.helpdesk_staff_email, NEW.request_status, 1)
+    ON CONFLICT (staff_email, request_status) DO UPDATE SET requests = requests + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_count_delete
+AFTER DELETE ON Requests
+BEGIN
+    UPDATE Request_Queue_Counts SET requests = requests - 1
+    WHERE staff_email = OLD.helpdesk_staff_email AND request_status = OLD.request_status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_requests_count_update
+AFTER UPDATE OF helpdesk_staff_email, request_status ON Requests
+WHEN OLD.helpdesk_staff_email IS NOT NEW.helpdesk_staff_email
+  OR OLD.request_status IS NOT NEW.request_status
+BEGIN
+    UPDATE Request_Queue_Counts SET requests = requests - 1
+    WHERE staff_email = OLD.helpdesk_staff_email AND request_status = OLD.request_status;
+    INSERT INTO Request_Queue_Counts (staff_email, request_status, requests)
+    VALUES (NEW.helpdesk_staff_email, NEW.request_status, 1)
+    ON CONFLICT (staff_email, request_status) DO UPDATE SET requests = requests + 1;
+END;
+'''
+
+
+def ensure_schema(conn):
+    """Create the counts table and its triggers, and backfill the counts once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Request_Queue_Counts'"
+    ).fetchone()
+    conn.executescript(SCHEMA)
+    if not exists:
+        rebuild(conn)
+    conn.commit()
+
+
+def rebuild(conn):
+    """Recount every bucket from Requests. Returns the number of requests counted.
+
+    Needed after writes that skip the triggers, e.g. INSERT OR REPLACE, whose
+    implicit deletes don't fire delete triggers.
+    """
+    conn.execute('DELETE FROM Request_Queue_Counts')
+    conn.execute(
+        '''INSERT INTO Request_Queue_Counts (staff_email, request_status, requests)
+           SELECT helpdesk_staff_email, request_status, COUNT(*)
+           FROM Requests
+           GROUP BY helpdesk_staff_email, request_status'''
+    )
+    return conn.execute('SELECT COALESCE(SUM(requests), 0) FROM Request_Queue_Counts').fetchone()[0]
+
+
+def _bucket(tab, staff_email):
+    if tab not in TABS:
+        raise ValueError(f'unknown request queue tab: {tab}')
+    return (POOL_EMAIL if tab == 'unassigned' else staff_email), TABS[tab]
+
+
+def build_page_query(tab, staff_email, after=None, limit=20):
+    """Return (sql, params) for one page of a tab, asking for limit + 1 rows."""
+    owner, status = _bucket(tab, staff_email)
+    sql = f'''SELECT {COLUMNS} FROM Requests
+              WHERE helpdesk_staff_email = ? AND request_status = ?'''
+    params = [owner, status]
+    if after is not None:
+        sql += ' AND request_id < ?'
+        params.append(int(after))
+    sql += ' ORDER BY request_id DESC LIMIT ?'
+    params.append(int(limit) + 1)
+    return sql, params
+
+
+def get_page(conn, tab, staff_email, after=None, limit=20):
+    """Return (requests, next_after) for one tab, newest first.
+
+    ``after`` is the request_id the previous page ended on; ``next_after``
+    is None on the last page.
+    """
+    sql, params = build_page_query(tab, staff_email, after, limit)
+    rows = conn.execute(sql, params).fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1]['request_id']
+    return rows, next_after
+
+
+def get_counts(conn, staff_email):
+    """The three summary card numbers for ``staff_email``, from the maintained counts."""
+    rows = conn.execute(
+        '''SELECT staff_email, request_status, requests FROM Request_Queue_Counts
+           WHERE (staff_email = ? AND request_status = ?)
+              OR (staff_email = ? AND request_status IN (?, ?))''',
+        (POOL_EMAIL, UNASSIGNED, staff_email, ASSIGNED, COMPLETED)
+    ).fetchall()
+    found = {(row['staff_email'], row['request_status']): row['requests'] for row in rows}
+    return {tab: found.get(_bucket(tab, staff_email), 0) for tab in TABS}
+
+
+def claim(conn, request_id, staff_email):
+    """Move an unclaimed request to ``staff_email``. Returns the request row, or None
+    if it doesn't exist or someone else got it first. The caller commits."""
+    return conn.execute(
+        f'''UPDATE Requests
+            SET helpdesk_staff_email = ?, request_status = ?
+            WHERE request_id = ? AND helpdesk_staff_email = ? AND request_status = ?
+            RETURNING {COLUMNS}''',
+        (staff_email, ASSIGNED, request_id, POOL_EMAIL, UNASSIGNED)
+    ).fetchone()
+
+
+if __name__ == '__main__':
+    # python request_queue.py rebuild [path/to/database.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('usage: python request_queue.py rebuild [database]')
+        sys.exit(1)
+    database = sys.argv[2] if len(sys.argv) > 2 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.executescript(SCHEMA)
+    count = rebuild(conn)
+    conn.commit()
+    conn.close()
+    print(f'Rebuilt helpdesk queue counts from {count} requests.')
@@ -0,0 +1,191 @@
+import re
+import sqlite3
+import sys
+
+import db
+import request_queue
+
+# Automatic assignment of new helpdesk requests.
+#
+# submit_request() used to park every ticket on the shared pool account and
+# wait for staff to claim it. submit() picks a staff member as the request is
+# written instead:
+#
+#   1. skills - the request type maps to the positions that handle it
+#      (ROUTES); other staff can still take it, but count as SKILL_PENALTY
+#      requests busier than they are, so specialists are preferred until
+#      they fall that far behind everyone else
+#   2. load - the fewest open (assigned, not completed) requests, read from
+#      the trigger-maintained Request_Queue_Counts, so it costs one indexed
+#      lookup per staff member whatever the size of Requests
+#   3. fairness - among equally loaded staff, whoever was routed to least
+#      recently (Helpdesk_Routing.last_request_id), i.e. round-robin
+#
+# Staff already holding max_open open requests are skipped; if that leaves
+# nobody, the request goes to the pool as before. pull() hands the oldest
+# pooled request to a staff member as soon as they have room again (the app
+# calls it when a request is completed), so the pool drains without anyone
+# polling the unassigned tab; it can still be claimed by hand too.
+#
+# MAX_OPEN defaults to 1: benchmarks/routing_sim.py shows that handing work
+# out only when someone is free (one shared FIFO queue) keeps the latency
+# tail far shorter than queueing several requests behind each staff member,
+# since a long request then only ever delays itself.
+# The choice and the insert share one BEGIN IMMEDIATE transaction, so two
+# submissions can't both see the same staff member as least loaded.
+
+# normalized request type -> position keywords (case-insensitive substrings)
+ROUTES = {
+    'changeid': ('dba', 'systems administrator'),
+    'addnewcategory': ('dba', 'it support'),
+    'addcategory': ('dba', 'it support'),
+    'marketanalysis': ('dba',),
+    'technicalsupport': ('technical support', 'it support', 'systems administrator'),
+}
+
+MAX_OPEN = 1  #<- open requests per staff member; beyond this new requests wait in the pool
+SKILL_PENALTY = 2  #<- extra open requests charged to staff outside the request type's positions
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Helpdesk_Routing (
+    staff_email TEXT PRIMARY KEY,
+    last_request_id INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+CANDIDATES_SQL = '''
+    SELECT h.email, h.position,
+           COALESCE(q.requests, 0) AS open_requests,
+           COALESCE(r.last_request_id, 0) AS last_request_id
+    FROM Helpdesk h
+    LEFT JOIN Request_Queue_Counts q
+      ON q.staff_email = h.email AND q.request_status = ?
+    LEFT JOIN Helpdesk_Routing r ON r.staff_email = h.email
+    WHERE h.email != ?
+'''
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def normalize_type(request_type):
+    """'Add New Category', 'AddCategory', 'add-new-category' -> 'addnewcategory' etc."""
+    return re.sub(r'[^a-z]', '', str(request_type or '').lower())
+
+
+def is_skilled(candidate, request_type):
+    """True when the candidate's position handles ``request_type`` (or nobody's does)."""
+    keywords = ROUTES.get(normalize_type(request_type))
+    if not keywords:
+        return True
+    return any(k in str(candidate['position'] or '').lower() for k in keywords)
+
+
+def choose(conn, request_type, max_open=MAX_OPEN, skill_penalty=SKILL_PENALTY):
+    """Return the staff email the next ``request_type`` request should go to, or None."""
+    candidates = conn.execute(
+        CANDIDATES_SQL, (request_queue.ASSIGNED, request_queue.POOL_EMAIL)
+    ).fetchall()
+    open_slots = [c for c in candidates if c['open_requests'] < max_open]
+    if not open_slots:
+        return None
+
+    def cost(c):
+        penalty = 0 if is_skilled(c, request_type) else skill_penalty
+        return (c['open_requests'] + penalty, c['last_request_id'], c['email'])
+
+    return min(open_slots, key=cost)['email']
+
+
+def _submit(conn, sender_email, request_type, request_desc, max_open):
+    staff_email = choose(conn, request_type, max_open)
+    request_id = conn.execute(
+        '''INSERT INTO Requests
+           (sender_email, helpdesk_staff_email, request_type, request_desc, request_status)
+           VALUES (?, ?, ?, ?, ?)
+           RETURNING request_id''',
+        (sender_email, staff_email or request_queue.POOL_EMAIL, request_type, request_desc,
+         request_queue.ASSIGNED if staff_email else request_queue.UNASSIGNED)
+    ).fetchone()[0]
+    if staff_email:
+        conn.execute(
+            '''INSERT INTO Helpdesk_Routing (staff_email, last_request_id) VALUES (?, ?)
+               ON CONFLICT (staff_email) DO UPDATE SET last_request_id = excluded.last_request_id''',
+            (staff_email, request_id)
+        )
+    return request_id, staff_email
+
+
+def pull(conn, staff_email, max_open=MAX_OPEN):
+    """Assign the oldest pooled request to ``staff_email`` if they are under
+    ``max_open``. Returns the request row or None. The caller commits."""
+    open_requests = conn.execute(
+        'SELECT requests FROM Request_Queue_Counts WHERE staff_email = ? AND request_status = ?',
+        (staff_email, request_queue.ASSIGNED)
+    ).fetchone()
+    if open_requests and open_requests[0] >= max_open:
+        return None
+    oldest = conn.execute(
+        '''SELECT request_id FROM Requests
+           WHERE helpdesk_staff_email = ? AND request_status = ?
+           ORDER BY request_id LIMIT 1''',
+        (request_queue.POOL_EMAIL, request_queue.UNASSIGNED)
+    ).fetchone()
+    if oldest is None:
+        return None
+    claimed = request_queue.claim(conn, oldest[0], staff_email)
+    if claimed is not None:
+        conn.execute(
+            '''INSERT INTO Helpdesk_Routing (staff_email, last_request_id) VALUES (?, ?)
+               ON CONFLICT (staff_email) DO UPDATE SET last_request_id = excluded.last_request_id''',
+            (staff_email, claimed['request_id'])
+        )
+    return claimed
+
+
+def submit(conn, sender_email, request_type, request_desc, max_open=MAX_OPEN, **retry):
+    """Insert a request and assign it in one transaction.
+
+    Returns (request_id, staff_email); staff_email is None when the request
+    was left in the pool. Raises db.DatabaseBusy if the write lock can't be
+    had.
+    """
+    return db.run_immediate(
+        conn, _submit, sender_email, request_type, request_desc, max_open, **retry
+    )
+
+
+def staff_load(conn):
+    """Open and completed request counts per staff member, for the stats route."""
+    rows = conn.execute(
+        f'''SELECT h.email, h.position,
+                   COALESCE(a.requests, 0) AS open_requests,
+                   COALESCE(d.requests, 0) AS completed_requests,
+                   COALESCE(r.last_request_id, 0) AS last_request_id
+            FROM Helpdesk h
+            LEFT JOIN Request_Queue_Counts a
+              ON a.staff_email = h.email AND a.request_status = '{request_queue.ASSIGNED}'
+            LEFT JOIN Request_Queue_Counts d
+              ON d.staff_email = h.email AND d.request_status = '{request_queue.COMPLETED}'
+            LEFT JOIN Helpdesk_Routing r ON r.staff_email = h.email
+            WHERE h.email != ?
+            ORDER BY h.email''',
+        (request_queue.POOL_EMAIL,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+if __name__ == '__main__':
+    # python routing.py [path/to/database.db]  - show where each request type would go next
+    database = sys.argv[1] if len(sys.argv) > 1 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    for request_type in ('ChangeID', 'Add New Category', 'Market Analysis', 'Technical Support', 'Other'):
+        print(f'{request_type:<20} -> {choose(conn, request_type) or request_queue.POOL_EMAIL}')
+    for row in staff_load(conn):
+        print(f"{row['email']:<30} {row['position'] or '':<24} open={row['open_requests']} "
+              f"completed={row['completed_requests']}")
+    conn.close()
@@ -0,0 +1,282 @@
+import base64
+import json
+import re
+import sqlite3
+import sys
+
+import taxonomy
+
+# FTS5 index over listings for /product/search.
+#
+# One row per listing, rowid = Listing_ID (listing ids are unique across
+# sellers in this app). seller_email is stored unindexed so results can be
+# joined back to Product_Listings on its primary key.
+
+SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS Listing_Search USING fts5(
+    title,
+    name,
+    description,
+    seller_name,
+    category_path,
+    seller_email UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+'''
+
+# bm25() column weights, same order as the table columns above
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 3.0, 2.0, 0.0)
+
+
+def ensure_schema(conn):
+    """Create the search index if it is missing and populate it once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Listing_Search'"
+    ).fetchone()
+    if exists:
+        return
+    conn.executescript(SCHEMA)
+    rebuild(conn)
+    conn.commit()
+
+
+def _category_paths(conn):
+    parents = dict(conn.execute('SELECT category_name, parent_category FROM Categories').fetchall())
+    paths = {}
+    for name in parents:
+        chain = [name]
+        parent = parents.get(name)
+        while parent and parent not in chain and len(chain) < 32:  #<- guard against cycles
+            chain.append(parent)
+            parent = parents.get(parent)
+        paths[name] = ' > '.join(reversed(chain))
+    return paths
+
+
+def _category_path(conn, category):
+    chain = [category]
+    while len(chain) < 32:
+        row = conn.execute(
+            'SELECT parent_category FROM Categories WHERE category_name = ?',
+            (chain[-1],)
+        ).fetchone()
+        if not row or not row[0] or row[0] in chain:
+            break
+        chain.append(row[0])
+    return ' > '.join(reversed(chain))
+
+
+_LISTING_ROWS = '''
+    SELECT pl.listing_id, pl.product_title, pl.product_name, pl.product_description,
+           s.business_name, pl.category, pl.seller_email
+    FROM Product_Listings pl
+    LEFT JOIN Sellers s ON s.email = pl.seller_email
+'''
+
+_INSERT = '''
+    INSERT INTO Listing_Search
+        (rowid, title, name, description, seller_name, category_path, seller_email)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def rebuild(conn):
+    """Re-index every listing. Returns the number of rows indexed."""
+    paths = _category_paths(conn)
+    conn.execute('DELETE FROM Listing_Search')
+    rows = conn.execute(_LISTING_ROWS)
+    count = 0
+    while True:
+        batch = rows.fetchmany(5000)
+        if not batch:
+            break
+        conn.executemany(_INSERT, [
+            (r[0], r[1], r[2], r[3], r[4], paths.get(r[5], r[5]), r[6]) for r in batch
+        ])
+        count += len(batch)
+    return count
+
+
+def index_listing(conn, listing_id):
+    """(Re)index one listing after it is added or edited."""
+    conn.execute('DELETE FROM Listing_Search WHERE rowid = ?', (listing_id,))
+    row = conn.execute(_LISTING_ROWS + ' WHERE pl.listing_id = ?', (listing_id,)).fetchone()
+    if row:
+        conn.execute(_INSERT, (row[0], row[1], row[2], row[3], row[4],
+                               _category_path(conn, row[5]), row[6]))
+
+
+def index_seller(conn, seller_email):
+    """Re-index all of a seller's listings (their business name is indexed)."""
+    listing_ids = [r[0] for r in conn.execute(
+        'SELECT listing_id FROM Product_Listings WHERE seller_email = ?',
+        (seller_email,)
+    ).fetchall()]
+    for listing_id in listing_ids:
+        index_listing(conn, listing_id)
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 MATCH string: every word, prefix matched.
+
+    Words are quoted so user input can't inject FTS operators. Returns None
+    when the query has nothing searchable in it.
+    """
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _bm25():
+    return f"bm25(Listing_Search, {', '.join(str(w) for w in BM25_WEIGHTS)})"
+
+
+# Keyset ordering per sort_by mode: (sort key expressions, direction).
+# Every key list ends in Listing_ID so the order is total and a page boundary
+# can be expressed as one row-value comparison.
+_SORT_KEYS = {
+    'price_low': (['pl.Product_Price', 'pl.Listing_ID'], 'ASC'),
+    'price_high': (['pl.Product_Price', 'pl.Listing_ID'], 'DESC'),
+    'rating': (['COALESCE(lr.avg_rating, -1)', 'COALESCE(lr.rating_count, 0)', 'pl.Listing_ID'], 'DESC'),
+    'newest': (['pl.Listing_ID'], 'DESC'),
+    'relevance': ([_bm25(), 'pl.Listing_ID'], 'ASC'),  #<- bm25 is negative, lower is better
+}
+
+
+def _sort_mode(sort_by, match):
+    if sort_by in _SORT_KEYS and sort_by != 'relevance':
+        return sort_by
+    # relevance only means something with a keyword; otherwise order by rating
+    return 'relevance' if match else 'rating'
+
+
+def _filters(query, category, min_price, max_price):
+    """Shared FROM/WHERE for the page and count queries. Returns (sql, params, match)."""
+    match = match_expression(query) if query else None
+    params = []
+
+    if match:
+        sql = '''
+            FROM Listing_Search ls
+            JOIN Product_Listings pl
+              ON pl.Seller_Email = ls.seller_email AND pl.Listing_ID = ls.rowid
+            JOIN Sellers s ON pl.Seller_Email = s.email
+            LEFT JOIN Listing_Ratings lr
+              ON lr.seller_email = pl.Seller_Email AND lr.listing_id = pl.Listing_ID
+            WHERE Listing_Search MATCH ? AND pl.Status = 1
+        '''
+        params.append(match)
+    else:
+        sql = '''
+            FROM Product_Listings pl
+            JOIN Sellers s ON pl.Seller_Email = s.email
+            LEFT JOIN Listing_Ratings lr
+              ON lr.seller_email = pl.Seller_Email AND lr.listing_id = pl.Listing_ID
+            WHERE pl.Status = 1
+        '''
+        if query:
+            sql += ' AND 0'  #<- a query with nothing searchable in it ('!!!') matches nothing, it isn't a browse
+
+    if category:
+        # a parent category matches its whole subtree (Category_Closure, taxonomy.py)
+        sql += ' AND ' + taxonomy.SUBTREE_FILTER
+        params.extend([category, category])
+
+    if min_price and min_price.isdigit():
+        sql += ' AND pl.Product_Price >= ?'
+        params.append(float(min_price))
+
+    if max_price and max_price.isdigit():
+        sql += ' AND pl.Product_Price <= ?'
+        params.append(float(max_price))
+
+    return sql, params, match
+
+
+def build_search_query(query='', category='', min_price='', max_price='', sort_by='relevance',
+                       after=None, limit=None):
+    """Build the listing search SQL. Returns (sql, params).
+
+    ``after`` is the list of sort key values from decode_cursor(); rows are
+    returned strictly after that position. Each row carries its own key
+    values as sort_k0..sort_kN for encode_cursor().
+    """
+    filters, params, match = _filters(query, category, min_price, max_price)
+    keys, direction = _SORT_KEYS[_sort_mode(sort_by, match)]
+
+    sql = '''
+        SELECT pl.*, s.business_name AS seller_name,
+            lr.avg_rating AS avg_rating,
+            COALESCE(lr.rating_count, 0) AS review_count'''
+    if match:
+        sql += f',\n            {_bm25()} AS relevance'
+    for i, key in enumerate(keys):
+        sql += f',\n            {key} AS sort_k{i}'
+    sql += filters
+
+    if after is not None and len(after) == len(keys):
+        op = '>' if direction == 'ASC' else '<'
+        sql += f" AND ({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})"
+        params.extend(after)
+
+    sql += ' ORDER BY ' + ', '.join(f'{key} {direction}' for key in keys)
+
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+
+    return sql, params
+
+
+def build_count_query(query='', category='', min_price='', max_price='', cap=None):
+    """Count matching listings, stopping early at ``cap + 1`` when a cap is given.
+
+    A capped count never touches more than cap + 1 rows, so broad queries
+    stay cheap; callers show "cap+" when the result exceeds the cap.
+    """
+    filters, params, _ = _filters(query, category, min_price, max_price)
+    if cap is None:
+        return 'SELECT COUNT(*)' + filters, params
+    return f'SELECT COUNT(*) FROM (SELECT 1 {filters} LIMIT ?)', params + [int(cap) + 1]
+
+
+def encode_cursor(sort_by, row):
+    """Opaque page token holding the last row's sort key values."""
+    values = []
+    i = 0
+    while f'sort_k{i}' in row.keys():
+        values.append(row[f'sort_k{i}'])
+        i += 1
+    payload = json.dumps([sort_by, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by):
+    """Return the sort key values from a page token, or None if it is unusable."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    # a token from a different sort order points somewhere meaningless
+    if token_sort != sort_by or not isinstance(values, list):
+        return None
+    return values
+
+
+if __name__ == '__main__':
+    # python search.py rebuild [path/to/database.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('usage: python search.py rebuild [database]')
+        sys.exit(1)
+    database = sys.argv[2] if len(sys.argv) > 2 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.executescript(SCHEMA)
+    count = rebuild(conn)
+    conn.commit()
+    conn.close()
+    print(f'Indexed {count} listings.')
@@ -0,0 +1,233 @@
+import re
+import sqlite3
+import sys
+from datetime import date
+
+# Incremental sales rollups for the seller dashboard.
+#
+# checkout() calls record_order() and submit_review() calls record_review()
+# inside their own transactions, so the dashboard reads totals from one row
+# and time series from a bounded number of rollup rows instead of summing the
+# seller's whole order history. Revenue is Orders.payment (what the buyer was
+# charged), not the listing's current price.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Seller_Sales_Daily (
+    seller_email TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_email, day, listing_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS Seller_Sales_Monthly (
+    seller_email TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_email, month, listing_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS Listing_Sales_Totals (
+    seller_email TEXT NOT NULL,
+    listing_id INTEGER NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (seller_email, listing_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_listing_sales_totals_revenue
+    ON Listing_Sales_Totals(seller_email, revenue DESC);
+CREATE TABLE IF NOT EXISTS Seller_Sales_Totals (
+    seller_email TEXT PRIMARY KEY,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+_TABLES = ('Seller_Sales_Daily', 'Seller_Sales_Monthly', 'Listing_Sales_Totals', 'Seller_Sales_Totals')
+
+
+def ensure_schema(conn):
+    """Create the rollup tables if they are missing and backfill them once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Seller_Sales_Totals'"
+    ).fetchone()
+    if exists:
+        return
+    conn.executescript(SCHEMA)
+    rebuild(conn)
+    conn.commit()
+
+
+def normalize_day(value):
+    """Orders.date holds both '2011/11/23' (imported) and '2024-05-01' (checkout)."""
+    parts = re.split(r'[-/]', str(value or '').strip().split(' ')[0])
+    try:
+        return date(int(parts[0]), int(parts[1]), int(parts[2])).isoformat()
+    except (ValueError, IndexError):
+        return None
+
+
+def rebuild(conn):
+    """Recompute every rollup from Orders and Reviews. Returns the number of orders read.
+
+    The grouping happens in SQLite, so memory stays flat however many orders
+    there are; only the date normalization (once per order) calls back into Python.
+    """
+    for table in _TABLES:
+        conn.execute(f'DELETE FROM {table}')
+    conn.create_function('normalize_day', 1, normalize_day, deterministic=True)
+
+    conn.execute('''
+        INSERT INTO Seller_Sales_Daily (seller_email, listing_id, day, units, revenue, orders)
+        SELECT seller_email, listing_id, day, SUM(COALESCE(quantity, 0)), TOTAL(payment), COUNT(*)
+        FROM (SELECT seller_email, listing_id, normalize_day(date) AS day, quantity, payment
+              FROM Orders LIMIT -1)  --<- LIMIT keeps the subquery from being flattened into 3 calls per row
+        WHERE day IS NOT NULL
+        GROUP BY seller_email, day, listing_id
+    ''')
+    # months, listing and seller totals roll up from what is already summed
+    conn.execute('''
+        INSERT INTO Seller_Sales_Monthly (seller_email, listing_id, month, units, revenue, orders)
+        SELECT seller_email, listing_id, substr(day, 1, 7), SUM(units), SUM(revenue), SUM(orders)
+        FROM Seller_Sales_Daily
+        GROUP BY seller_email, substr(day, 1, 7), listing_id
+    ''')
+    # totals also count orders whose date couldn't be read, so they come from Orders
+    conn.execute('''
+        INSERT INTO Listing_Sales_Totals (seller_email, listing_id, units, revenue, orders)
+        SELECT seller_email, listing_id, SUM(COALESCE(quantity, 0)), TOTAL(payment), COUNT(*)
+        FROM Orders
+        GROUP BY seller_email, listing_id
+    ''')
+    conn.execute('''
+        INSERT INTO Seller_Sales_Totals (seller_email, units, revenue, orders)
+        SELECT seller_email, SUM(units), SUM(revenue), SUM(orders)
+        FROM Listing_Sales_Totals
+        GROUP BY seller_email
+    ''')
+    # seller rating follows the order's seller, as the dashboard always has
+    conn.execute('''
+        INSERT INTO Seller_Sales_Totals (seller_email, rating_sum, rating_count)
+        SELECT o.seller_email, SUM(r.rating), COUNT(r.rating)
+        FROM Reviews r JOIN Orders o ON r.order_id = o.order_id
+        WHERE r.rating IS NOT NULL
+        GROUP BY o.seller_email
+        ON CONFLICT(seller_email) DO UPDATE SET
+            rating_sum = excluded.rating_sum,
+            rating_count = excluded.rating_count
+    ''')
+    return conn.execute('SELECT COUNT(*) FROM Orders').fetchone()[0]
+
+
+def record_order(conn, seller_email, listing_id, order_date, quantity, payment):
+    """Fold one new order into every rollup. Runs in the caller's transaction."""
+    day = normalize_day(order_date)
+    units = int(quantity)
+    revenue = float(payment)
+    upsert = '''
+        INSERT INTO {table} ({keys}, units, revenue, orders) VALUES ({marks}, ?, ?, 1)
+        ON CONFLICT DO UPDATE SET
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue,
+            orders = orders + 1
+    '''
+    targets = [
+        ('Listing_Sales_Totals', ('seller_email', 'listing_id'), (seller_email, listing_id)),
+        ('Seller_Sales_Totals', ('seller_email',), (seller_email,)),
+    ]
+    if day:
+        targets += [
+            ('Seller_Sales_Daily', ('seller_email', 'listing_id', 'day'), (seller_email, listing_id, day)),
+            ('Seller_Sales_Monthly', ('seller_email', 'listing_id', 'month'), (seller_email, listing_id, day[:7])),
+        ]
+    for table, keys, values in targets:
+        conn.execute(
+            upsert.format(table=table, keys=', '.join(keys), marks=', '.join('?' * len(keys))),
+            values + (units, revenue)
+        )
+
+
+def record_review(conn, seller_email, new_rating, old_rating=None):
+    """Fold an inserted (old_rating None) or edited review into the seller's rating."""
+    d_sum = int(new_rating) - (int(old_rating) if old_rating is not None else 0)
+    d_count = 0 if old_rating is not None else 1
+    conn.execute(
+        '''INSERT INTO Seller_Sales_Totals (seller_email, rating_sum, rating_count) VALUES (?, ?, ?)
+           ON CONFLICT(seller_email) DO UPDATE SET
+               rating_sum = rating_sum + excluded.rating_sum,
+               rating_count = rating_count + excluded.rating_count''',
+        (seller_email, d_sum, d_count)
+    )
+
+
+def get_totals(conn, seller_email):
+    row = conn.execute(
+        'SELECT * FROM Seller_Sales_Totals WHERE seller_email = ?',
+        (seller_email,)
+    ).fetchone()
+    if row is None:
+        return {'units': 0, 'revenue': 0.0, 'orders': 0, 'avg_rating': None, 'review_count': 0}
+    return {
+        'units': row['units'],
+        'revenue': row['revenue'],
+        'orders': row['orders'],
+        'avg_rating': row['rating_sum'] / row['rating_count'] if row['rating_count'] else None,
+        'review_count': row['rating_count'],
+    }
+
+
+def get_series(conn, seller_email, granularity='month', periods=12, listing_id=None):
+    """Most recent `periods` buckets of units/revenue/orders, oldest first."""
+    table, column = (('Seller_Sales_Daily', 'day') if granularity == 'day'
+                     else ('Seller_Sales_Monthly', 'month'))
+    sql = f'''SELECT {column} AS period, SUM(units) AS units, SUM(revenue) AS revenue, SUM(orders) AS orders
+              FROM {table} WHERE seller_email = ?'''
+    params = [seller_email]
+    if listing_id is not None:
+        sql += ' AND listing_id = ?'
+        params.append(listing_id)
+    sql += f' GROUP BY {column} ORDER BY {column} DESC LIMIT ?'
+    params.append(int(periods))
+    rows = conn.execute(sql, params).fetchall()
+    return [
+        {'period': r['period'], 'units': r['units'], 'revenue': round(r['revenue'], 2), 'orders': r['orders']}
+        for r in reversed(rows)
+    ]
+
+
+def get_top_listings(conn, seller_email, limit=5):
+    """Best-selling listings by revenue, with their average rating."""
+    return conn.execute(
+        '''SELECT t.listing_id, t.units, t.revenue, t.orders,
+                  pl.Product_Title, lr.avg_rating, COALESCE(lr.rating_count, 0) AS review_count
+           FROM Listing_Sales_Totals t
+           LEFT JOIN Product_Listings pl
+             ON pl.Seller_Email = t.seller_email AND pl.Listing_ID = t.listing_id
+           LEFT JOIN Listing_Ratings lr
+             ON lr.seller_email = t.seller_email AND lr.listing_id = t.listing_id
+           WHERE t.seller_email = ?
+           ORDER BY t.revenue DESC
+           LIMIT ?''',
+        (seller_email, limit)
+    ).fetchall()
+
+
+if __name__ == '__main__':
+    # python seller_analytics.py rebuild [path/to/database.db]
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('usage: python seller_analytics.py rebuild [database]')
+        sys.exit(1)
+    database = sys.argv[2] if len(sys.argv) > 2 else 'database.db'
+    conn = sqlite3.connect(database)
+    conn.executescript(SCHEMA)
+    count = rebuild(conn)
+    conn.commit()
+    conn.close()
+    print(f'Rebuilt seller rollups from {count} orders.')
@@ -0,0 +1,67 @@
+// Shared by the buyer and seller dashboards: tab switching, lazy loading of
+// the tabs the server didn't render, and flash message auto-dismiss.
+
+// Only the active tab is rendered server-side; the others are fetched from
+// `${tabUrl}/${tabId}` the first time they are opened. bindTabContent, if
+// given, is called with each tab's element once its markup is in place.
+function initDashboardTabs(tabUrl, bindTabContent) {
+    const bind = bindTabContent || function () {};
+    const tabs = document.querySelectorAll('.tab');
+    const tabContents = document.querySelectorAll('.tab-content');
+
+    function loadTab(tabId) {
+        const content = document.getElementById(`${tabId}-content`);
+        if (content.dataset.loaded === 'true') {
+            return;
+        }
+        content.dataset.loaded = 'true';
+        content.innerHTML = '<div class="empty-state"><i class="fas fa-spinner fa-spin"></i><p>Loading...</p></div>';
+        fetch(`${tabUrl}/${tabId}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(data => {
+                content.innerHTML = data.html;
+                bind(content);
+            })
+            .catch(() => {
+                content.dataset.loaded = 'false';
+                content.innerHTML = '<div class="empty-state"><p>Could not load this tab. Please refresh the page.</p></div>';
+            });
+    }
+
+    tabs.forEach(tab => {
+        tab.addEventListener('click', () => {
+            // Remove active class from all tabs and contents
+            tabs.forEach(t => t.classList.remove('active'));
+            tabContents.forEach(c => c.classList.remove('active'));
+
+            // Add active class to clicked tab and corresponding content
+            tab.classList.add('active');
+            const tabId = tab.getAttribute('data-tab');
+            document.getElementById(`${tabId}-content`).classList.add('active');
+            loadTab(tabId);
+
+            // Update URL without reloading the page
+            history.pushState({}, '', `?tab=${tabId}`);
+        });
+    });
+
+    tabContents.forEach(content => bind(content));
+}
+
+// Flash Message Auto-dismiss
+function dismissFlashMessages() {
+    const flashMessages = document.querySelectorAll('.flash-message');
+    flashMessages.forEach(message => {
+        setTimeout(() => {
+            message.style.opacity = '0';
+            setTimeout(() => {
+                message.style.display = 'none';
+            }, 500);
+        }, 5000);
+    });
+}
@@ -0,0 +1,59 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // Review Modal Functionality
+    const modal = document.getElementById('review-modal');
+    const closeModal = document.querySelector('.close-modal');
+
+    // Handlers for markup inside a tab; re-run after a tab is lazy-loaded
+    function bindTabContent(root) {
+        // Category Tree Toggle
+        root.querySelectorAll('.toggle-btn').forEach(btn => {
+            btn.addEventListener('click', (e) => {
+                e.stopPropagation();
+                const listItem = btn.parentElement;
+                listItem.classList.toggle('expanded');
+            });
+        });
+
+        root.querySelectorAll('.review-btn').forEach(btn => {
+            btn.addEventListener('click', () => {
+                const orderId = btn.getAttribute('data-order');
+                const productName = btn.getAttribute('data-product');
+
+                document.getElementById('order_id').value = orderId;
+                document.getElementById('review-product-name').textContent = productName;
+                modal.style.display = 'block';
+            });
+        });
+    }
+
+    initDashboardTabs('/buyer_dashboard/tab', bindTabContent);
+
+    closeModal.addEventListener('click', () => {
+        modal.style.display = 'none';
+    });
+
+    window.addEventListener('click', (e) => {
+        if (e.target === modal) {
+            modal.style.display = 'none';
+        }
+    });
+
+    // Star Rating Functionality
+    const starButtons = document.querySelectorAll('.star-btn');
+    starButtons.forEach(btn => {
+        btn.addEventListener('click', () => {
+            const rating = btn.getAttribute('data-rating');
+            document.getElementById('rating').value = rating;
+
+            // Reset all stars
+            starButtons.forEach(s => s.classList.remove('active'));
+
+            // Activate stars up to selected rating
+            for (let i = 0; i < rating; i++) {
+                starButtons[i].classList.add('active');
+            }
+        });
+    });
+
+    dismissFlashMessages();
+});
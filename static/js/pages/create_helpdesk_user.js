@@ -0,0 +1,24 @@
+const form = document.getElementById('create-helpdesk-form');
+const passwordInput = document.getElementById('password');
+const confirmPasswordInput = document.getElementById('confirm_password');
+
+function validatePasswordMatch() {
+    if (passwordInput.value !== confirmPasswordInput.value) {
+        confirmPasswordInput.setCustomValidity("Passwords do not match."); // Use browser validation API
+    } else {
+        confirmPasswordInput.setCustomValidity(""); // Clear error if they match
+    }
+}
+
+passwordInput.addEventListener('change', validatePasswordMatch);
+confirmPasswordInput.addEventListener('keyup', validatePasswordMatch); // Check as they type in confirm field
+
+// Also check on form submit as a fallback
+form.addEventListener('submit', function (event) {
+    if (passwordInput.value !== confirmPasswordInput.value) {
+        event.preventDefault(); 
+        confirmPasswordInput.setCustomValidity("Passwords do not match.");
+        alert('Passwords do not match!'); 
+        confirmPasswordInput.reportValidity(); 
+    }
+});
@@ -0,0 +1,85 @@
+document.addEventListener('DOMContentLoaded', function () {
+    initDashboardTabs('/seller_dashboard/tab');
+    dismissFlashMessages();
+});
+
+// The category list is the same for every seller and long, so it is
+// fetched once, when a product form first opens
+let categoryOptions = null;
+
+function loadCategoryOptions() {
+    if (!categoryOptions) {
+        categoryOptions = fetch('/seller/category_options')
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(data => {
+                document.getElementById('category').innerHTML = data.html;
+                document.getElementById('edit_category').innerHTML = data.html;
+            })
+            .catch(error => {
+                categoryOptions = null;
+                throw error;
+            });
+    }
+    return categoryOptions;
+}
+
+// Modal Functions
+function openAddProductModal() {
+    document.getElementById('add-product-modal').style.display = 'block';
+    loadCategoryOptions().catch(error => {
+        console.error('Error fetching categories:', error);
+        alert('Failed to load categories. Please try again.');
+    });
+}
+
+function openEditProductModal(listingId) {
+    // Fetch product details
+    Promise.all([
+        fetch(`/seller/product/${listingId}`).then(response => response.json()),
+        loadCategoryOptions()
+    ])
+        .then(([product]) => {
+            // Populate form fields
+            document.getElementById('edit_listing_id').value = product.Listing_ID;
+            document.getElementById('edit_product_title').value = product.Product_Title;
+            document.getElementById('edit_product_description').value = product.Product_Description;
+            document.getElementById('edit_category').value = product.Category;
+            document.getElementById('edit_product_price').value = product.Product_Price;
+            document.getElementById('edit_quantity').value = product.Quantity;
+            document.getElementById('edit_status').value = product.Status;
+
+            // Show modal
+            document.getElementById('edit-product-modal').style.display = 'block';
+        })
+        .catch(error => {
+            console.error('Error fetching product details:', error);
+            alert('Failed to load product details. Please try again.');
+        });
+}
+
+function closeModal(modalId) {
+    document.getElementById(modalId).style.display = 'none';
+}
+
+// Close modal if clicking outside of it
+window.onclick = function (event) {
+    if (event.target.classList.contains('modal')) {
+        event.target.style.display = 'none';
+    }
+};
+
+// Product Actions
+function deactivateProduct(listingId) {
+    if (confirm('Are you sure you want to deactivate this product?')) {
+        window.location.href = `/seller/deactivate_product/${listingId}`;
+    }
+}
+
+function activateProduct(listingId) {
+    window.location.href = `/seller/activate_product/${listingId}`;
+}
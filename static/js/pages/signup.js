@@ -0,0 +1,48 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // Get all radio buttons
+    const radioButtons = document.querySelectorAll('input[name="user_type"]');
+
+    // Get all dynamic field containers
+    const buyerFields = document.getElementById('buyer-fields');
+    const sellerFields = document.getElementById('seller-fields');
+    const helpdeskFields = document.getElementById('helpdesk-fields');
+
+    // Function to show the appropriate fields based on selection
+    function toggleFields() {
+        // Hide all fields first
+        buyerFields.style.display = 'none';
+        sellerFields.style.display = 'none';
+        helpdeskFields.style.display = 'none';
+
+        // Show the selected type's fields
+        if (document.getElementById('buyer').checked) {
+            buyerFields.style.display = 'block';
+        } else if (document.getElementById('seller').checked) {
+            sellerFields.style.display = 'block';
+        } else if (document.getElementById('helpdesk').checked) {
+            helpdeskFields.style.display = 'block';
+        }
+    }
+
+    // Add event listeners to all radio buttons
+    radioButtons.forEach(function (radio) {
+        radio.addEventListener('change', toggleFields);
+    });
+
+    // Call the function on page load to set initial state
+    toggleFields();
+
+    // Form validation
+    const form = document.getElementById('signup-form');
+
+    form.addEventListener('submit', function (event) {
+        const password = document.getElementById('password').value;
+        const confirmPassword = document.getElementById('confirm_password').value;
+
+        // Check if passwords match
+        if (password !== confirmPassword) {
+            event.preventDefault();
+            alert('Passwords do not match!');
+        }
+    });
+});
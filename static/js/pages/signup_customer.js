@@ -0,0 +1,98 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // --- Field Toggling ---
+    const radioButtons = document.querySelectorAll('input[name="user_type"]');
+    const buyerFields = document.getElementById('buyer-fields');
+    const sellerFields = document.getElementById('seller-fields');
+    const allDynamicFields = [buyerFields, sellerFields]; // Array of field containers
+
+    function toggleFields() {
+        const selectedType = document.querySelector('input[name="user_type"]:checked');
+        const buyerRequired = selectedType && selectedType.value === 'buyer';
+        const sellerRequired = selectedType && selectedType.value === 'seller';
+
+        // Hide all dynamic sections first
+        allDynamicFields.forEach(fields => fields.style.display = 'none');
+
+        // Show the selected one
+        if (selectedType) {
+            if (selectedType.value === 'buyer') {
+                buyerFields.style.display = 'block';
+            } else if (selectedType.value === 'seller') {
+                sellerFields.style.display = 'block';
+            }
+        }
+
+        // --- Manage Required Attributes ---
+        // Function to set/remove required attribute for a group of fields
+        const manageRequired = (container, isRequired) => {
+            if (container) {
+                // Select inputs and selects within the container that should be required
+                // Exclude optional fields like buyer_business_name
+                container.querySelectorAll('input:not([name="buyer_business_name"]), select').forEach(input => {
+                    if (isRequired) {
+                        input.setAttribute('required', '');
+                    } else {
+                        input.removeAttribute('required');
+                    }
+                });
+            }
+        };
+
+        // Set required based on selection
+        manageRequired(buyerFields, buyerRequired);
+        manageRequired(sellerFields, sellerRequired);
+    }
+
+    radioButtons.forEach(radio => radio.addEventListener('change', toggleFields));
+    toggleFields(); // Initial call on page load
+
+    // --- Password Confirmation ---
+    const form = document.getElementById('signup-form');
+    const passwordInput = document.getElementById('password');
+    const confirmPasswordInput = document.getElementById('confirm_password');
+    const passwordError = document.getElementById('password-error');
+
+    form.addEventListener('submit', function (event) {
+        const password = passwordInput.value;
+        const confirmPassword = confirmPasswordInput.value;
+        let isValid = true;
+
+        // Check if passwords match
+        if (password !== confirmPassword) {
+            passwordError.style.display = 'block'; // Show error message
+            confirmPasswordInput.classList.add('is-invalid'); // Add error style
+            confirmPasswordInput.focus(); // Focus the field
+            isValid = false; // Mark form as invalid
+        } else {
+            passwordError.style.display = 'none'; // Hide error message
+            confirmPasswordInput.classList.remove('is-invalid'); // Remove error style
+        }
+
+        // Prevent form submission if not valid
+        if (!isValid) {
+            event.preventDefault();
+        }
+
+    });
+
+    // Real-time password match check (optional but good UX)
+    confirmPasswordInput.addEventListener('input', function () {
+        if (passwordInput.value !== confirmPasswordInput.value) {
+            passwordError.style.display = 'block';
+            confirmPasswordInput.classList.add('is-invalid');
+        } else {
+            passwordError.style.display = 'none';
+            confirmPasswordInput.classList.remove('is-invalid');
+        }
+    });
+    passwordInput.addEventListener('input', function () {
+        if (confirmPasswordInput.value && passwordInput.value !== confirmPasswordInput.value) {
+            passwordError.style.display = 'block';
+            confirmPasswordInput.classList.add('is-invalid');
+        } else {
+            passwordError.style.display = 'none';
+            confirmPasswordInput.classList.remove('is-invalid');
+        }
+    });
+
+});
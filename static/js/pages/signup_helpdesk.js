@@ -0,0 +1,49 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // --- Password Confirmation ---
+    const form = document.getElementById('signup-form');
+    const passwordInput = document.getElementById('password');
+    const confirmPasswordInput = document.getElementById('confirm_password');
+    const passwordError = document.getElementById('password-error');
+
+    form.addEventListener('submit', function (event) {
+        const password = passwordInput.value;
+        const confirmPassword = confirmPasswordInput.value;
+        let isValid = true;
+
+        // Check if passwords match
+        if (password !== confirmPassword) {
+            passwordError.style.display = 'block'; // Show error
+            confirmPasswordInput.classList.add('is-invalid'); // Add style
+            confirmPasswordInput.focus();
+            isValid = false; // Mark invalid
+        } else {
+            passwordError.style.display = 'none'; // Hide error
+            confirmPasswordInput.classList.remove('is-invalid'); // Remove style
+        }
+
+        // Prevent form submission if not valid
+        if (!isValid) {
+            event.preventDefault();
+        }
+    });
+
+    // Real-time password match check
+    confirmPasswordInput.addEventListener('input', function () {
+        if (passwordInput.value !== confirmPasswordInput.value) {
+            passwordError.style.display = 'block';
+            confirmPasswordInput.classList.add('is-invalid');
+        } else {
+            passwordError.style.display = 'none';
+            confirmPasswordInput.classList.remove('is-invalid');
+        }
+    });
+    passwordInput.addEventListener('input', function () {
+        if (confirmPasswordInput.value && passwordInput.value !== confirmPasswordInput.value) {
+            passwordError.style.display = 'block';
+            confirmPasswordInput.classList.add('is-invalid');
+        } else {
+            passwordError.style.display = 'none';
+            confirmPasswordInput.classList.remove('is-invalid');
+        }
+    });
+});
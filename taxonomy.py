@@ -0,0 +1,167 @@
+import threading
+
+# In-process, versioned cache of the Categories table.
+#
+# Categories only change when a helpdesk user completes an "Add New Category"
+# request, so every worker keeps the list (and the parent/child tree) in
+# memory. A version counter row in Cache_Versions is bumped in the same
+# transaction as the write; each read costs one primary-key lookup to compare
+# versions, which also invalidates the cache in every other worker process.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Cache_Versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO Cache_Versions (name, version) VALUES ('categories', 0);
+'''
+
+# Materialized hierarchy: one row per (ancestor, descendant) pair, including
+# each category paired with itself at depth 0. "Everything under X" is then a
+# primary-key range scan on ancestor = X instead of a recursive walk; the
+# (descendant, ancestor) index answers the reverse, "every category above X",
+# which rolls order revenue up the tree.
+CLOSURE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS Category_Closure (
+    ancestor TEXT NOT NULL,
+    descendant TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor, descendant)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_category_closure_descendant
+    ON Category_Closure(descendant, ancestor);
+'''
+
+VERSION_KEY = 'categories'
+
+# SQL fragment for "listing category is `?` or anything beneath it". The
+# trailing SELECT keeps an exact match working for a category that has no
+# Categories row.
+SUBTREE_FILTER = '''pl.Category IN (
+    SELECT descendant FROM Category_Closure WHERE ancestor = ?
+    UNION ALL SELECT ?
+)'''
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Category_Closure'"
+    ).fetchone()
+    if not exists:
+        conn.executescript(CLOSURE_SCHEMA)
+        rebuild_hierarchy(conn)
+        conn.commit()
+
+
+def rebuild_hierarchy(conn):
+    """Recompute Category_Closure from Categories.parent_category.
+
+    The table is tiny (categories x depth), so a full rebuild inside the
+    transaction that adds a category is simpler and safer than patching it.
+    """
+    parents = dict(conn.execute('SELECT category_name, parent_category FROM Categories').fetchall())
+    pairs = []
+    for name in parents:
+        pairs.append((name, name, 0))
+        seen = {name}
+        parent = parents.get(name)
+        depth = 1
+        while parent and parent not in seen:  #<- a bad parent loop must not hang the rebuild
+            pairs.append((parent, name, depth))
+            seen.add(parent)
+            parent = parents.get(parent)
+            depth += 1
+    conn.execute('DELETE FROM Category_Closure')
+    conn.executemany(
+        'INSERT INTO Category_Closure (ancestor, descendant, depth) VALUES (?, ?, ?)',
+        pairs
+    )
+    return len(pairs)
+
+
+def bump_version(conn):
+    """Invalidate every worker's cached categories. Call inside the write transaction."""
+    conn.execute(
+        'UPDATE Cache_Versions SET version = version + 1 WHERE name = ?',
+        (VERSION_KEY,)
+    )
+
+
+class CategoryTree:
+    """Immutable snapshot of the Categories table."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        # plain dicts so templates can use category.category_name / category['category_name']
+        self.rows = [
+            {'category_name': name, 'parent_category': parent}
+            for parent, name in sorted(rows, key=lambda r: r[1])
+        ]
+        names = {row['category_name'] for row in self.rows}
+        self.parents = {row['category_name']: row['parent_category'] for row in self.rows}
+        self.children = {}
+        for row in self.rows:
+            if row['parent_category'] is not None:
+                self.children.setdefault(row['parent_category'], []).append(row['category_name'])
+        # roots: no parent, or a parent that isn't itself a category
+        self.roots = [row['category_name'] for row in self.rows
+                      if row['parent_category'] is None or row['parent_category'] not in names]
+        # the first level under the root(s) is what the dashboards list as top-level
+        self.top_level = sorted(child for root in self.roots for child in self.children.get(root, [])) \
+            or list(self.roots)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class CategoryCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn):
+        """Return the current CategoryTree, reloading only if the version moved."""
+        row = conn.execute(
+            'SELECT version FROM Cache_Versions WHERE name = ?',
+            (VERSION_KEY,)
+        ).fetchone()
+        version = row[0] if row else None
+        tree = self._tree
+        if tree is not None and version is not None and tree.version == version:
+            with self._lock:
+                self.hits += 1
+            return tree
+
+        rows = conn.execute(
+            'SELECT parent_category, category_name FROM Categories'
+        ).fetchall()
+        tree = CategoryTree(version, [tuple(r) for r in rows])
+        with self._lock:
+            self.misses += 1
+            self._tree = tree
+        return tree
+
+    def invalidate(self):
+        with self._lock:
+            self._tree = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'version': self._tree.version if self._tree else None,
+                'size': len(self._tree) if self._tree else 0,
+            }
+
+
+cache = CategoryCache()
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from flask import request, url_for
+from jinja2 import FileSystemBytecodeCache
+
+import compression
+
+# Template pipeline: fingerprinted static assets and precompiled templates.
+#
+# Styling and scripts live in static/ rather than inline in every page:
+#
+#   css/app.css             header, navigation and user menu of the logged-in pages
+#   css/dashboard.css       layout, tabs and cards shared by the three dashboards
+#   css/pages/<page>.css    the rest of each template's own styling
+#   js/dashboard.js         lazy tab loading and flash dismissal for the dashboards
+#   js/pages/<page>.js      each template's own script
+#
+# Templates link them with asset_url('css/app.css'). After a build
+# (`python templating.py build`) that is the file's copy under a content
+# hashed name, static/dist/css/app.<fingerprint>.css, listed in
+# static/dist/manifest.json; the build also writes .br/.gz copies for
+# compression.py to serve. Without a build, or when the source has changed
+# since, it is the source file with ?v=<fingerprint> appended. Either way a
+# response for the current fingerprint is sent
+# `public, max-age=ASSET_MAX_AGE, immutable`, so browsers reuse it without
+# revalidating; any other v gets Flask's default (revalidate), so a changed
+# file is never served from a stale copy.
+#
+# At startup every template is compiled once (TEMPLATE_PRECOMPILE), so no
+# request pays for it, and the compiled code is kept in Jinja's bytecode
+# cache (TEMPLATE_BYTECODE_CACHE_DIR, default a per-user temp directory) so
+# the next process and the other workers load it instead of re-parsing.
+# Entries are keyed by the template's source checksum, so an edited template
+# is simply compiled again.
+
+FINGERPRINT_LENGTH = 12
+DIST = 'dist'  #<- build output, under the static folder
+MANIFEST = 'manifest.json'
+
+
+#=======================Fingerprints=======================#
+def fingerprint_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def hashed_name(path, fingerprint):
+    """Where the build puts ``path`` (relative to static/): css/app.css -> dist/css/app.<fingerprint>.css."""
+    stem, ext = os.path.splitext(path)
+    return f'{DIST}/{stem}.{fingerprint}{ext}'
+
+
+class Fingerprints:
+    """Content hashes of static files, re-read only when a file's size or mtime changes."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._entries = {}  #<- path -> (mtime_ns, size, fingerprint)
+
+    def get(self, path):
+        try:
+            stat = os.stat(os.path.join(self.folder, path))
+        except OSError:
+            return None
+        entry = self._entries.get(path)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+        fingerprint = fingerprint_file(os.path.join(self.folder, path))
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+        return fingerprint
+#=======================Fingerprints=======================#
+
+
+#=======================Build=======================#
+def load_manifest(static_folder):
+    """The build's {source path: hashed path} map, or {} if there hasn't been one."""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(static_folder, min_size=compression.MIN_SIZE):
+    """Copy every static file to dist/ under its hashed name, precompress it and write the manifest.
+
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy can still load what they link. Returns the manifest.
+    """
+    manifest = {}
+    for folder, dirs, files in os.walk(static_folder):
+        if folder == static_folder:
+            dirs[:] = [name for name in dirs if name != DIST]
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(tuple(compression.SUFFIXES.values()) + ('.tmp',)):
+                continue
+            source = os.path.join(folder, name)
+            path = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            target = hashed_name(path, fingerprint_file(source))
+            full_target = os.path.join(static_folder, *target.split('/'))
+            if not os.path.exists(full_target):
+                os.makedirs(os.path.dirname(full_target), exist_ok=True)
+                shutil.copyfile(source, full_target + '.tmp')
+                os.replace(full_target + '.tmp', full_target)
+            if compression.is_compressible(path):
+                compression.precompress(full_target, min_size)
+            manifest[path] = target
+    manifest_path = os.path.join(static_folder, DIST, MANIFEST)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)  #<- last, so it never lists a missing file
+    return manifest
+#=======================Build=======================#
+
+
+def precompile(app):
+    """Compile every template into the environment's cache now. Returns how many."""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+#=======================Flask binding=======================#
+def init_app(app):
+    """Set pipeline defaults on ``app.config``, register asset_url() and compile the templates."""
+    app.config.setdefault('ASSET_MAX_AGE', 365 * 24 * 3600)  #<- fingerprinted URLs never change content
+    app.config.setdefault('TEMPLATE_PRECOMPILE', True)
+    app.config.setdefault('TEMPLATE_BYTECODE_CACHE', True)
+    app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', None)
+
+    fingerprints = Fingerprints(app.static_folder)
+    app.extensions['asset_fingerprints'] = fingerprints
+    manifest = load_manifest(app.static_folder)  #<- read once; a new build takes effect on restart
+    built = frozenset(manifest.values())
+
+    urls = {}  #<- (script root, path, fingerprint) -> URL; url_for() is most of the cost
+
+    def asset_url(path):
+        """URL of a file under static/, fingerprinted so it can be cached for good."""
+        fingerprint = fingerprints.get(path)
+        key = (request.script_root, path, fingerprint)
+        url = urls.get(key)
+        if url is None:
+            if fingerprint is None:
+                url = url_for('static', filename=path)
+            elif manifest.get(path) == hashed_name(path, fingerprint):  #<- built from this very content
+                url = url_for('static', filename=manifest[path])
+            else:
+                url = url_for('static', filename=path, v=fingerprint)
+            urls[key] = url
+        return url
+
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.after_request
+    def _cache_fingerprinted_assets(response):
+        if request.endpoint != 'static' or response.status_code not in (200, 304):
+            return response
+        filename = request.view_args['filename']
+        version = request.args.get('v')
+        if filename in built or (version and version == fingerprints.get(filename)):
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['ASSET_MAX_AGE']
+            response.cache_control.immutable = True
+        return response
+
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_CACHE_DIR'])
+    if app.config['TEMPLATE_PRECOMPILE']:
+        started = time.perf_counter()
+        count = precompile(app)
+        app.logger.info('Compiled %d templates in %.0f ms', count, (time.perf_counter() - started) * 1000)
+#=======================Flask binding=======================#
+
+
+if __name__ == '__main__':
+    # python templating.py build [path/to/static]
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print('usage: python templating.py build [static folder]')
+        sys.exit(1)
+    folder = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    started = time.perf_counter()
+    manifest = build(folder)
+    print(f'Built {len(manifest)} files into {os.path.join(folder, DIST)} '
+          f'in {(time.perf_counter() - started) * 1000:.0f} ms')